@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Параллельная выгрузка писем за период через пул IMAP-соединений
+"""
+
+import argparse
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from seven_months_extractor import (
+    IMAP_SERVER,
+    IMAP_PORT,
+    IMAP_USER,
+    IMAP_PASSWORD,
+    RobustIMAPConnection,
+    fetch_emails_range_robust,
+    save_records_csv,
+)
+from src.cli import parse_dates
+
+# Настройки пула
+DEFAULT_CONNECTIONS = 4  # одновременных IMAP-соединений
+SHARD_DAYS = {'day': 1, 'week': 7}
+
+
+class IMAPConnectionPool:
+    """Ограниченный пул устойчивых IMAP-соединений
+
+    Соединения открываются лениво и переиспользуются между шардами, поэтому
+    одновременно к серверу открыто не больше size соединений.
+    """
+
+    def __init__(self, size: int, server=IMAP_SERVER, port=IMAP_PORT,
+                 user=IMAP_USER, password=IMAP_PASSWORD):
+        self.size = max(1, size)
+        self.server = server
+        self.port = port
+        self.user = user
+        self.password = password
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._all = []
+        self._lock = threading.Lock()
+
+    def acquire(self) -> RobustIMAPConnection:
+        """Берёт свободное соединение или открывает новое в пределах лимита"""
+        self._slots.acquire()
+
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        imap_conn = RobustIMAPConnection(self.server, self.port, self.user, self.password)
+        if not imap_conn.connect():
+            self._slots.release()
+            raise ConnectionError("Не удалось открыть IMAP-соединение для пула")
+
+        with self._lock:
+            self._all.append(imap_conn)
+        return imap_conn
+
+    def release(self, imap_conn: RobustIMAPConnection):
+        """Возвращает соединение в пул"""
+        self._idle.put(imap_conn)
+        self._slots.release()
+
+    def close_all(self):
+        """Закрывает все открытые соединения"""
+        with self._lock:
+            for imap_conn in self._all:
+                imap_conn.close()
+            self._all.clear()
+
+
+def split_into_shards(dt_start: datetime, dt_end: datetime, shard: str = 'day') -> list:
+    """Делит период на шарды по дням или неделям (границы включительно)"""
+
+    step = SHARD_DAYS[shard]
+    shards = []
+    current = dt_start
+
+    while current <= dt_end:
+        shard_end = min(current + timedelta(days=step - 1), dt_end)
+        shards.append((current, shard_end))
+        current = shard_end + timedelta(days=1)
+
+    return shards
+
+
+def harvest_range(from_date: str, to_date: str, shard: str = 'day',
+                  connections: int = DEFAULT_CONNECTIONS) -> tuple:
+    """Выгружает письма за период параллельно, результат упорядочен по датам шардов
+
+    Ошибка одного шарда не отменяет остальные: возвращаются (письма успешных
+    шардов, список (начало, конец) неудавшихся шардов) - их можно выгрузить
+    повторно. Шард считается неудавшимся и тогда, когда fetch_emails_range_robust
+    не смог выполнить поиск за день или загрузить хотя бы одно письмо; его
+    частичные письма не попадают в результат, чтобы повтор не дал дублей.
+    """
+
+    dt_start = datetime.strptime(from_date, '%Y-%m-%d')
+    dt_end = datetime.strptime(to_date, '%Y-%m-%d')
+    shards = split_into_shards(dt_start, dt_end, shard)
+
+    print(f"📅 Период {from_date} - {to_date}: {len(shards)} шардов ({shard}), соединений: {connections}")
+
+    pool = IMAPConnectionPool(min(connections, len(shards)))
+
+    def harvest_shard(shard_range):
+        shard_start, shard_end = shard_range
+        imap_conn = pool.acquire()
+        failed = []
+        try:
+            records = fetch_emails_range_robust(imap_conn, shard_start, shard_end, failed=failed)
+        finally:
+            pool.release(imap_conn)
+
+        if failed:
+            failed_days = sorted({day for day, _ in failed})
+            failed_searches = sum(1 for _, msg_id in failed if msg_id is None)
+            raise RuntimeError(
+                f"неудачных поисков: {failed_searches}, не загружено писем: {len(failed) - failed_searches} "
+                f"(дни: {', '.join(failed_days)})"
+            )
+        return records
+
+    results = {}
+    failed_shards = []
+    try:
+        with ThreadPoolExecutor(max_workers=pool.size) as executor:
+            futures = {executor.submit(harvest_shard, shard_range): index
+                       for index, shard_range in enumerate(shards)}
+            for future in as_completed(futures):
+                index = futures[future]
+                shard_start, shard_end = shards[index]
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    print(f"   ❌ Шард {shard_start:%Y-%m-%d} - {shard_end:%Y-%m-%d} не выгружен: {e}")
+                    failed_shards.append(shards[index])
+                    continue
+                print(f"   ✅ Шард {shard_start:%Y-%m-%d} - {shard_end:%Y-%m-%d}: {len(results[index])} писем")
+    finally:
+        pool.close_all()
+
+    # Слияние в порядке шардов, то есть по датам
+    all_records = []
+    for index in sorted(results):
+        all_records.extend(results[index])
+
+    return all_records, sorted(failed_shards)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Параллельная выгрузка писем за период")
+
+    parser.add_argument(
+        '--from-date',
+        help='Дата начала в формате YYYY-MM-DD (по умолчанию: вчера)'
+    )
+    parser.add_argument(
+        '--to-date',
+        help='Дата окончания в формате YYYY-MM-DD (по умолчанию: равна from-date)'
+    )
+    parser.add_argument(
+        '--shard',
+        choices=sorted(SHARD_DAYS),
+        default='day',
+        help='Размер шарда периода (по умолчанию: day)'
+    )
+    parser.add_argument(
+        '--connections',
+        type=int,
+        default=DEFAULT_CONNECTIONS,
+        help=f'Максимум одновременных IMAP-соединений (по умолчанию: {DEFAULT_CONNECTIONS})'
+    )
+    parser.add_argument(
+        '--output',
+        help='Имя CSV-файла (по умолчанию: emails_<from>_<to>.csv)'
+    )
+
+    args = parser.parse_args()
+
+    from_date, to_date = parse_dates(args.from_date, args.to_date)
+    output = args.output or f"emails_{from_date}_{to_date}.csv"
+
+    print("🚀 ПАРАЛЛЕЛЬНАЯ ВЫГРУЗКА ПИСЕМ")
+    print("=" * 70)
+
+    started = time.time()
+    records, failed_shards = harvest_range(from_date, to_date, args.shard, args.connections)
+    elapsed = time.time() - started
+
+    filename = save_records_csv(records, output)
+
+    print("=" * 70)
+    print(f"💾 Файл создан: {filename}")
+    print(f"📧 Всего писем: {len(records):,}")
+    print(f"⏱️ Время: {elapsed:.1f} сек")
+
+    if failed_shards:
+        print(f"⚠️ Не выгружено шардов: {len(failed_shards)} - повторите для периодов:")
+        for shard_start, shard_end in failed_shards:
+            print(f"   --from-date {shard_start:%Y-%m-%d} --to-date {shard_end:%Y-%m-%d}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
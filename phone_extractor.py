@@ -12,6 +12,9 @@ from typing import List
 import phonenumbers
 import time
 
+from src.imap_fetch import fetch_rfc822_cached, get_uidvalidity
+from src.message_cache import MessageCache
+
 load_dotenv()
 
 class PhoneExtractorFinalFixed:
@@ -23,6 +26,9 @@ class PhoneExtractorFinalFixed:
         self.imap_user = os.environ.get('IMAP_USER')
         self.imap_password = os.environ.get('IMAP_PASSWORD')
         
+        # Локальный кэш сырых писем (MESSAGE_CACHE_DIR в .env)
+        self.message_cache = MessageCache.from_env()
+        
         # Мобильные коды России
         self.mobile_codes = set([
             '910', '912', '913', '914', '915', '916', '917', '918', '919',
@@ -346,13 +352,14 @@ class PhoneExtractorFinalFixed:
             mailbox.starttls(ssl.create_default_context())
             mailbox.login(self.imap_user, self.imap_password)
             mailbox.select('INBOX')
+            uidvalidity = get_uidvalidity(mailbox, 'INBOX')
             
             # Поиск писем
             dt = datetime.strptime(date_str, '%Y-%m-%d')
             imap_date = dt.strftime('%d-%b-%Y')
             criteria = f'(ON "{imap_date}")'
             
-            status, data = mailbox.search(None, criteria)
+            status, data = mailbox.uid('SEARCH', None, criteria)
             mail_ids = data[0].split() if status == 'OK' else []
             
             total_emails = len(mail_ids)
@@ -381,11 +388,10 @@ class PhoneExtractorFinalFixed:
             
             for i, mail_id in enumerate(mail_ids, 1):
                 try:
-                    status, msg_data = mailbox.fetch(mail_id, '(RFC822)')
-                    if status != 'OK':
+                    raw_email = fetch_rfc822_cached(mailbox, mail_id, self.message_cache, 'INBOX', uidvalidity)
+                    if raw_email is None:
                         continue
                     
-                    raw_email = msg_data[0][1]
                     msg = email.message_from_bytes(raw_email)
                     
                     # Извлекаем заголовки
@@ -14,6 +14,9 @@ import logging
 import sys
 from collections import defaultdict
 
+from src.imap_fetch import fetch_rfc822_cached, get_uidvalidity
+from src.message_cache import MessageCache
+
 load_dotenv()
 
 log_filename = 'fixed_position_extractor_log.txt'
@@ -38,6 +41,9 @@ class FixedPositionExtractor:
         self.imap_user = os.environ.get('IMAP_USER')
         self.imap_password = os.environ.get('IMAP_PASSWORD')
         
+        # Локальный кэш сырых писем (MESSAGE_CACHE_DIR в .env)
+        self.message_cache = MessageCache.from_env()
+        
         self.names_data = self._load_names_data()
         
         # Усиленные фильтры мусора
@@ -649,12 +655,13 @@ class FixedPositionExtractor:
             mailbox.starttls(ssl.create_default_context())
             mailbox.login(self.imap_user, self.imap_password)
             mailbox.select('INBOX')
+            uidvalidity = get_uidvalidity(mailbox, 'INBOX')
             
             dt = datetime.strptime(date_str, '%Y-%m-%d')
             imap_date = dt.strftime('%d-%b-%Y')
             criteria = f'(ON "{imap_date}")'
             
-            status, data = mailbox.search(None, criteria)
+            status, data = mailbox.uid('SEARCH', None, criteria)
             mail_ids = data[0].split() if status == 'OK' else []
             
             total_emails = len(mail_ids)
@@ -678,11 +685,10 @@ class FixedPositionExtractor:
             
             for i, mail_id in enumerate(mail_ids, 1):
                 try:
-                    status, msg_data = mailbox.fetch(mail_id, '(RFC822)')
-                    if status != 'OK':
+                    raw_email = fetch_rfc822_cached(mailbox, mail_id, self.message_cache, 'INBOX', uidvalidity)
+                    if raw_email is None:
                         continue
                     
-                    raw_email = msg_data[0][1]
                     msg = email.message_from_bytes(raw_email)
                     
                     subject = self._decode_header_clean(msg.get('Subject', 'Без темы'))
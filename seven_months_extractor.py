@@ -16,6 +16,19 @@ import random
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+from src.imap_bodystructure import (
+    BODYSTRUCTURE_ITEMS,
+    decode_part,
+    find_text_parts,
+    parse_bodystructure_response,
+    parse_fetch_literals,
+    section_fetch_items,
+)
+from src.imap_fetch import get_uidvalidity, parse_fetch_response
+from src.message_cache import MessageCache
+from src.message_store import MessageStore
+from src.email_archive import write_archive
+
 load_dotenv()
 
 # Настройки подключения
@@ -29,6 +42,19 @@ MAX_RETRIES = 3
 RETRY_DELAY = 5  # секунд между попытками
 BATCH_SIZE = 50  # писем за раз перед переподключением
 REQUEST_DELAY = 0.5  # пауза между запросами
+TEXT_PARTS_ONLY = os.getenv('TEXT_PARTS_ONLY', '') == '1'  # качать только текстовые части, без вложений
+
+# Общий для всех соединений кэш сырых писем (MESSAGE_CACHE_DIR в .env)
+MESSAGE_CACHE = MessageCache.from_env()
+
+# Архив писем с произвольным доступом для повторной обработки (MESSAGE_STORE_DIR в .env)
+MESSAGE_STORE = MessageStore.from_env()
+
+# Формат выгрузки: csv или parquet (сжатый колоночный архив, нужен pyarrow из requirements-parquet.txt)
+ARCHIVE_FORMAT = os.getenv('ARCHIVE_FORMAT', 'csv')
+
+# Поля CSV-выгрузки
+CSV_FIELDS = ['month', 'date', 'from', 'to', 'subject', 'char_count', 'body']
 
 # Названия месяцев
 MONTHS_RU = {
@@ -40,13 +66,15 @@ MONTHS_RU = {
 class RobustIMAPConnection:
     """Устойчивое IMAP-соединение с автоматическим переподключением"""
     
-    def __init__(self, server, port, user, password):
+    def __init__(self, server, port, user, password, message_cache=MESSAGE_CACHE):
         self.server = server
         self.port = port
         self.user = user
         self.password = password
         self.mail = None
         self.last_connect_time = 0
+        self.message_cache = message_cache
+        self.uidvalidity = None
         
     def connect(self):
         """Подключение к серверу с обработкой ошибок"""
@@ -66,6 +94,7 @@ class RobustIMAPConnection:
                 self.mail.starttls(ssl.create_default_context())
                 self.mail.login(self.user, self.password)
                 self.mail.select('INBOX')
+                self.uidvalidity = get_uidvalidity(self.mail, 'INBOX')
                 
                 self.last_connect_time = time.time()
                 print(f"   ✅ Подключение успешно")
@@ -90,15 +119,25 @@ class RobustIMAPConnection:
         return True
     
     def safe_fetch(self, msg_id, flags='(RFC822)'):
-        """Безопасное получение письма с повторными попытками"""
+        """Безопасное получение письма по UID с повторными попытками"""
+        
+        use_cache = self.message_cache is not None and flags == '(RFC822)'
+        
+        if use_cache and self.uidvalidity is not None:
+            raw = self.message_cache.get('INBOX', self.uidvalidity, msg_id)
+            if raw is not None:
+                return [(b'', raw)]
         
         for attempt in range(MAX_RETRIES):
             try:
                 # Небольшая пауза между запросами
                 time.sleep(REQUEST_DELAY)
                 
-                status, data = self.mail.fetch(msg_id, flags)
+                status, data = self.mail.uid('FETCH', msg_id, flags)
                 if status == 'OK':
+                    if use_cache and self.uidvalidity is not None:
+                        for _, raw in parse_fetch_response(data)[:1]:
+                            self.message_cache.put('INBOX', self.uidvalidity, msg_id, raw)
                     return data
                 else:
                     raise Exception(f"IMAP fetch returned: {status}")
@@ -124,11 +163,11 @@ class RobustIMAPConnection:
         return None
     
     def safe_search(self, criteria):
-        """Безопасный поиск писем"""
+        """Безопасный поиск писем; None, если поиск не удался после всех попыток"""
         
         for attempt in range(MAX_RETRIES):
             try:
-                status, data = self.mail.search(None, criteria)
+                status, data = self.mail.uid('SEARCH', None, criteria)
                 if status == 'OK':
                     return data[0].split() if data[0] else []
                 else:
@@ -143,9 +182,9 @@ class RobustIMAPConnection:
                         continue
                 else:
                     print(f"      ❌ Поиск не удался")
-                    return []
+                    return None
         
-        return []
+        return None
     
     def close(self):
         """Закрытие соединения"""
@@ -237,6 +276,38 @@ def extract_plain_text(msg, keep_forwards: bool = True) -> str:
     except:
         return ""
 
+def fetch_text_parts_robust(imap_conn: RobustIMAPConnection, msg_id):
+    """Загружает заголовок и только текстовые части письма по BODYSTRUCTURE
+
+    Возвращает (заголовки как Message, текст) с той же склейкой частей, что
+    и extract_plain_text, или None при ошибке.
+    """
+    structure_data = imap_conn.safe_fetch(msg_id, BODYSTRUCTURE_ITEMS)
+    if not structure_data:
+        return None
+
+    structure = parse_bodystructure_response(structure_data).get(int(msg_id))
+    parts = find_text_parts(structure) if structure else []
+
+    fetch_data = imap_conn.safe_fetch(msg_id, section_fetch_items([part.section for part in parts]))
+    if not fetch_data:
+        return None
+
+    fetched = parse_fetch_literals(fetch_data)
+    if not fetched:
+        return None
+
+    text_parts = []
+    for part in parts:
+        chunk = decode_part(fetched[0].get(f'BODY[{part.section}]', b''), part)
+        if part.subtype == 'html':
+            chunk = re.sub(r'<[^>]+>', '', chunk)
+        text_parts.append(chunk)
+
+    msg = email.message_from_bytes(fetched[0].get('BODY[HEADER]', b''))
+    body = '\n'.join(text_parts)[:500_000].strip()
+    return msg, body
+
 def imap_date_str(dt: datetime) -> str:
     """Переводит datetime в формат IMAP"""
     return dt.strftime('%d-%b-%Y')
@@ -256,24 +327,45 @@ def fetch_emails_month_robust(month_info: dict):
 
     dt_start = datetime.strptime(month_info['start_date'], '%Y-%m-%d')
     dt_end   = datetime.strptime(month_info['end_date'], '%Y-%m-%d')
+
+    print(f"📅 Обрабатываю {month_info['description']}")
+    print(f"   Период: {month_info['start_date']} - {month_info['end_date']}")
+    
+    all_records = fetch_emails_range_robust(imap_conn, dt_start, dt_end, month_info['description'])
+
+    imap_conn.close()
+    print(f"   ✅ {month_info['description']} завершен: {len(all_records)} писем")
+    return all_records
+
+def fetch_emails_range_robust(imap_conn: RobustIMAPConnection, dt_start: datetime,
+                              dt_end: datetime, label: str = None, failed: list = None) -> list:
+    """Выгружает письма за период по дням через уже открытое соединение
+
+    label попадает в поле 'month' записей; если не задан, берётся месяц дня письма.
+    В failed (если передан) добавляются (день, UID) не загруженных писем и
+    (день, None) для дней, поиск по которым не удался.
+    """
     
     all_records = []
     current = dt_start
     total_days = (dt_end - dt_start).days + 1
     day_counter = 0
     processed_emails = 0
-
-    print(f"📅 Обрабатываю {month_info['description']}")
-    print(f"   Период: {month_info['start_date']} - {month_info['end_date']}")
     
     while current <= dt_end:
         day_counter += 1
         date_imap = imap_date_str(current)
         date_display = current.strftime('%Y-%m-%d')
+        month_label = label or f"{MONTHS_RU[current.month].title()} {current.year}"
         
         # Поиск писем за день
         criteria = f'(ON "{date_imap}")'
         ids = imap_conn.safe_search(criteria)
+        if ids is None:
+            print(f"   ❌ День {day_counter}/{total_days} ({date_display}): поиск не удался")
+            if failed is not None:
+                failed.append((date_display, None))
+            ids = []
         
         if len(ids) > 0:
             print(f"   📬 День {day_counter}/{total_days} ({date_display}): {len(ids)} писем")
@@ -285,20 +377,37 @@ def fetch_emails_month_robust(month_info: dict):
                 print(f"      🔄 Профилактическое переподключение после {processed_emails} писем...")
                 if not imap_conn.connect():
                     print(f"      ❌ Ошибка переподключения, продолжаем...")
+                    if failed is not None:
+                        failed.append((date_display, msg_id))
                     continue
             
             # Получаем письмо
-            fetch_data = imap_conn.safe_fetch(msg_id)
-            if not fetch_data:
-                continue
+            if TEXT_PARTS_ONLY:
+                fetched = fetch_text_parts_robust(imap_conn, msg_id)
+                if not fetched:
+                    if failed is not None:
+                        failed.append((date_display, msg_id))
+                    continue
+            else:
+                fetch_data = imap_conn.safe_fetch(msg_id)
+                if not fetch_data:
+                    if failed is not None:
+                        failed.append((date_display, msg_id))
+                    continue
             
             try:
-                raw = fetch_data[0][1]
-                msg = email.message_from_bytes(raw)
-                body = extract_plain_text(msg, keep_forwards=True)
+                if TEXT_PARTS_ONLY:
+                    msg, body = fetched
+                else:
+                    raw = fetch_data[0][1]
+                    msg = email.message_from_bytes(raw)
+                    if MESSAGE_STORE is not None:
+                        MESSAGE_STORE.append(msg_id, raw, imap_conn.uidvalidity or 0,
+                                             msg.get('Date', ''), msg.get('From', ''))
+                    body = extract_plain_text(msg, keep_forwards=True)
                 
                 record = {
-                    'month': month_info['description'],
+                    'month': month_label,
                     'date': decode_header_value(msg.get('Date', '')),
                     'from': decode_header_value(msg.get('From', '')),
                     'to': decode_header_value(msg.get('To', '')),
@@ -318,17 +427,23 @@ def fetch_emails_month_robust(month_info: dict):
         # Небольшая пауза между днями
         time.sleep(0.1)
 
-    imap_conn.close()
-    print(f"   ✅ {month_info['description']} завершен: {len(all_records)} писем")
     return all_records
 
 def save_month_csv(records, month_info: dict):
     """Сохраняет данные месяца в CSV"""
     filename = f"emails_{month_info['year']}_{month_info['month_num']:02d}_{month_info['month_name']}.csv"
-    fields = ['month', 'date', 'from', 'to', 'subject', 'char_count', 'body']
+    return save_records_csv(records, filename)
+
+def save_month_archive(records, month_info: dict):
+    """Сохраняет данные месяца в архив Parquet"""
+    filename = f"emails_{month_info['year']}_{month_info['month_num']:02d}_{month_info['month_name']}.parquet"
+    return write_archive(records, filename)
+
+def save_records_csv(records, filename: str):
+    """Сохраняет записи писем в CSV"""
     
     with open(filename, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fields)
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
         writer.writeheader()
         for rec in records:
             writer.writerow(rec)
@@ -389,7 +504,10 @@ def main():
             month_records = fetch_emails_month_robust(month_info)
             
             if month_records:
-                filename = save_month_csv(month_records, month_info)
+                if ARCHIVE_FORMAT == 'parquet':
+                    filename = save_month_archive(month_records, month_info)
+                else:
+                    filename = save_month_csv(month_records, month_info)
                 print(f"   💾 Файл создан: {filename}")
                 
                 month_tokens = estimate_month_costs(month_records, month_info['description'])
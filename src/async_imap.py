@@ -0,0 +1,267 @@
+import re
+import ssl
+import asyncio
+import logging
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+from imap_fetch import FETCH_UID_RE, compress_uid_set, iter_uid_batches
+
+logger = logging.getLogger(__name__)
+
+LITERAL_RE = re.compile(rb'\{(\d+)\}$')
+TAGGED_RE = re.compile(rb'^(\S+) (OK|NO|BAD) ?(.*)$')
+UIDVALIDITY_RE = re.compile(rb'\[UIDVALIDITY (\d+)\]')
+
+DEFAULT_TIMEOUT = 180
+DEFAULT_MAX_IN_FLIGHT = 4
+
+
+class AsyncIMAPError(Exception):
+    """Ошибка выполнения IMAP-команды (ответ NO/BAD или обрыв соединения)"""
+
+
+def _quote(value: str) -> str:
+    return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class AsyncIMAPConnection:
+    """Минимальный IMAP4rev1-клиент на asyncio с конвейерной отправкой команд
+
+    Ответы на UID FETCH раскладываются по UID, поэтому несколько команд могут
+    одновременно находиться в полёте. Данные FETCH отдаются в том же виде,
+    что и у imaplib, и разбираются общими функциями imap_fetch.
+    """
+
+    def __init__(self, host: str, port: int, timeout: float = DEFAULT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.uidvalidity: Optional[int] = None
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+        self._tag_counter = 0
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._fetched: Dict[int, list] = {}
+        self._search_results: List[bytes] = []
+        self._write_lock = asyncio.Lock()
+        # Причина остановки фонового чтения: после неё новые команды сразу завершаются ошибкой
+        self._closed_error: Optional[AsyncIMAPError] = None
+
+    @property
+    def closed(self) -> bool:
+        """Фоновое чтение остановлено: соединение больше не принимает команды"""
+        return self._closed_error is not None
+
+    async def connect(self, starttls: bool = True, ssl_context: Optional[ssl.SSLContext] = None):
+        """Открывает соединение и при необходимости включает STARTTLS"""
+
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        greeting = await asyncio.wait_for(self._reader.readline(), self.timeout)
+        if not greeting.startswith(b'* OK'):
+            raise AsyncIMAPError(f"Неожиданное приветствие сервера: {greeting!r}")
+
+        if starttls:
+            # До запуска фонового чтения: после OK поток переключается на TLS
+            tag = self._next_tag()
+            self._writer.write(f"{tag} STARTTLS\r\n".encode())
+            await self._writer.drain()
+            while True:
+                line = await asyncio.wait_for(self._reader.readline(), self.timeout)
+                if not line:
+                    raise AsyncIMAPError("Соединение закрыто во время STARTTLS")
+                match = TAGGED_RE.match(line.rstrip(b'\r\n'))
+                if match and match.group(1).decode() == tag:
+                    if match.group(2) != b'OK':
+                        raise AsyncIMAPError(f"STARTTLS отклонён: {line!r}")
+                    break
+            await self._writer.start_tls(ssl_context or ssl.create_default_context(), server_hostname=self.host)
+
+        self._read_task = asyncio.create_task(self._read_loop())
+
+    def _next_tag(self) -> str:
+        self._tag_counter += 1
+        return f"A{self._tag_counter:04d}"
+
+    async def _read_response(self, first_line: bytes) -> list:
+        """Читает ответ с литералами {n} в формате imaplib: [(заголовок, литерал), ..., хвост]"""
+
+        items = []
+        line = first_line
+        while True:
+            stripped = line.rstrip(b'\r\n')
+            match = LITERAL_RE.search(stripped)
+            if not match:
+                items.append(stripped)
+                return items
+            literal = await self._reader.readexactly(int(match.group(1)))
+            items.append((stripped, literal))
+            line = await self._reader.readline()
+
+    async def _read_loop(self):
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    raise AsyncIMAPError("Сервер закрыл соединение")
+
+                if line.startswith(b'* '):
+                    self._handle_untagged(await self._read_response(line[2:]))
+                    continue
+
+                if line.startswith(b'+'):
+                    continue
+
+                match = TAGGED_RE.match(line.rstrip(b'\r\n'))
+                if not match:
+                    continue
+                future = self._pending.pop(match.group(1).decode(), None)
+                if future is not None and not future.done():
+                    future.set_result((match.group(2).decode(), match.group(3)))
+
+        except Exception as e:
+            error = e if isinstance(e, AsyncIMAPError) else AsyncIMAPError(f"Ошибка чтения ответа сервера: {e!r}")
+            self._closed_error = error
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._pending.clear()
+
+    def _handle_untagged(self, items: list):
+        head = items[0][0] if isinstance(items[0], tuple) else items[0]
+
+        fetch_match = re.match(rb'^(\d+) FETCH ', head)
+        if fetch_match:
+            # Приводим к виду imaplib: "12 (UID 345 ..." без слова FETCH
+            fixed_head = fetch_match.group(1) + b' ' + head[fetch_match.end():]
+            items[0] = (fixed_head, items[0][1]) if isinstance(items[0], tuple) else fixed_head
+
+            uid = None
+            for item in items:
+                text = item[0] if isinstance(item, tuple) else item
+                match = FETCH_UID_RE.search(text)
+                if match:
+                    uid = int(match.group(1))
+                    break
+            if uid is not None:
+                self._fetched.setdefault(uid, []).extend(items)
+            return
+
+        if head.startswith(b'SEARCH'):
+            self._search_results.extend(head.split()[1:])
+            return
+
+        match = UIDVALIDITY_RE.search(head)
+        if match:
+            self.uidvalidity = int(match.group(1))
+
+    async def command(self, name: str, *args: str) -> bytes:
+        """Отправляет команду и ждёт её тегированного ответа (без блокировки других команд)
+
+        Если фоновое чтение уже остановилось, ответа не будет - ошибка сразу.
+        """
+
+        if self._closed_error is not None:
+            raise AsyncIMAPError(f"{name}: соединение недоступно ({self._closed_error})")
+
+        tag = self._next_tag()
+        future = asyncio.get_running_loop().create_future()
+        self._pending[tag] = future
+
+        line = ' '.join((tag, name) + args) + '\r\n'
+        try:
+            async with self._write_lock:
+                self._writer.write(line.encode())
+                await self._writer.drain()
+        except Exception:
+            self._pending.pop(tag, None)
+            raise
+
+        status, text = await asyncio.wait_for(future, self.timeout)
+        if status != 'OK':
+            raise AsyncIMAPError(f"{name}: {status} {text.decode(errors='replace')}")
+        return text
+
+    async def login(self, user: str, password: str):
+        await self.command('LOGIN', _quote(user), _quote(password))
+
+    async def select(self, folder: str = 'INBOX') -> Optional[int]:
+        """Выбирает папку и возвращает её UIDVALIDITY"""
+        self.uidvalidity = None
+        await self.command('SELECT', _quote(folder))
+        return self.uidvalidity
+
+    async def uid_search(self, criteria: str) -> List[bytes]:
+        self._search_results = []
+        await self.command('UID SEARCH', criteria)
+        return list(self._search_results)
+
+    async def uid_fetch(self, uids: Sequence, items: str) -> list:
+        """UID FETCH для списка UID; возвращает данные в формате imaplib в порядке UID"""
+
+        uid_list = [int(uid) for uid in uids]
+        try:
+            await self.command('UID FETCH', compress_uid_set(uid_list), items)
+        except AsyncIMAPError:
+            # Частичный ответ на отклонённую команду не должен попасть в следующую
+            for uid in uid_list:
+                self._fetched.pop(uid, None)
+            raise
+
+        data = []
+        for uid in uid_list:
+            data.extend(self._fetched.pop(uid, []))
+        return data
+
+    async def logout(self):
+        if self._writer is None:
+            return
+        try:
+            await self.command('LOGOUT')
+        except (AsyncIMAPError, asyncio.TimeoutError, OSError) as e:
+            # Не маскируем исходную ошибку, из-за которой закрываем соединение
+            logger.debug(f"LOGOUT не выполнен: {e}")
+        finally:
+            if self._read_task is not None:
+                self._read_task.cancel()
+            if self._writer is not None:
+                self._writer.close()
+
+
+async def fetch_batches_pipelined(conn: AsyncIMAPConnection, uids: Sequence, items: str,
+                                  batch_size: int, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT
+                                  ) -> AsyncIterator[Tuple[List, Optional[list]]]:
+    """Отдаёт ответы UID FETCH по пачкам в исходном порядке, держа в полёте до max_in_flight команд
+
+    Пачка, на которую сервер ответил NO/BAD, отдаётся с None вместо данных:
+    остальные пачки продолжают загружаться, как в синхронном клиенте.
+    Обрыв соединения по-прежнему прерывает загрузку.
+    """
+
+    batches = list(iter_uid_batches(list(uids), batch_size))
+    in_flight: List[Tuple[List, asyncio.Task]] = []
+    next_batch = 0
+
+    try:
+        while next_batch < len(batches) or in_flight:
+            while next_batch < len(batches) and len(in_flight) < max(1, max_in_flight):
+                batch = batches[next_batch]
+                in_flight.append((batch, asyncio.create_task(conn.uid_fetch(batch, items))))
+                next_batch += 1
+
+            batch, task = in_flight.pop(0)
+            try:
+                fetch_data = await task
+            except AsyncIMAPError as e:
+                if conn.closed:
+                    raise
+                logger.error(f"❌ Ошибка пакетной загрузки {compress_uid_set(batch)}: {e}")
+                fetch_data = None
+            yield batch, fetch_data
+    finally:
+        # Генератор закрыт раньше времени: не оставляем команды в полёте без ожидающего
+        for _, task in in_flight:
+            task.cancel()
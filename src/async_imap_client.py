@@ -0,0 +1,242 @@
+import os
+import sys
+import email
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from typing import List, Optional, Sequence
+
+# Добавляем путь для импорта наших модулей
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from async_imap import DEFAULT_MAX_IN_FLIGHT, AsyncIMAPConnection, AsyncIMAPError, fetch_batches_pipelined
+from contact_processor import FullContactInfo
+from extraction_pool import ExtractionPool
+from imap_client import FETCH_RFC822, IMAP_TIMEOUT, IMAPClient
+from imap_fetch import HEADER_PREFILTER_ITEMS, compress_uid_set, iter_uid_batches
+from sync_state import SyncState
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncIMAPClient(IMAPClient):
+    """IMAP-клиент на asyncio: пачки UID FETCH идут конвейером, разбор писем - параллельно с сетью
+
+    Результат и статистика совпадают с IMAPClient. Поддерживается загрузка
+    писем целиком (RFC822) с локальным кэшем, фильтр по заголовкам и пул
+    процессов извлечения (extraction_workers > 1).
+    """
+
+    def __init__(self, debug: bool = False, max_in_flight: Optional[int] = None,
+                 starttls: bool = True, host: Optional[str] = None, port: Optional[int] = None,
+                 **kwargs):
+        super().__init__(debug=debug, **kwargs)
+
+        if self.fetch_strategy != FETCH_RFC822:
+            raise ValueError(f"Асинхронный клиент не поддерживает стратегию загрузки: {self.fetch_strategy}")
+
+        # Сколько команд UID FETCH одновременно ждут ответа сервера
+        self.max_in_flight = max_in_flight or int(os.environ.get("IMAP_MAX_IN_FLIGHT", DEFAULT_MAX_IN_FLIGHT))
+        self.starttls = starttls
+        if host:
+            self.imap_server = host
+        if port:
+            self.imap_port = port
+
+    def process_emails(self, from_date: str, to_date: str,
+                       sync_state: Optional[SyncState] = None) -> Sequence[FullContactInfo]:
+        """Синхронная обёртка над process_emails_async"""
+        return asyncio.run(self.process_emails_async(from_date, to_date, sync_state))
+
+    async def process_emails_async(self, from_date: str, to_date: str,
+                                   sync_state: Optional[SyncState] = None) -> Sequence[FullContactInfo]:
+        """Обработка писем за период (или после точки синхронизации) с конвейерной загрузкой"""
+
+        processed_contacts = []
+        loop = asyncio.get_running_loop()
+
+        logger.info(f"🔌 Подключаюсь к {self.imap_server}:{self.imap_port} (asyncio)...")
+        conn = AsyncIMAPConnection(self.imap_server, self.imap_port, timeout=IMAP_TIMEOUT)
+
+        pool = None
+        if self.extraction_workers > 1:
+            # Модели загружаются, а воркеры запускаются до подключения и до потока
+            # разбора: fork не должен происходить, пока в процессе работают потоки
+            pool = ExtractionPool(self.extraction_workers, debug=self.debug,
+                                  cache=self.contact_processor.ner_extractor.cache)
+            try:
+                pool.start(spawn=True)
+            except Exception:
+                pool.close()
+                raise
+
+        # Разбор писем и NER - в отдельном потоке, чтобы цикл событий продолжал читать ответы.
+        # С пулом процессов NER уходит в воркеры, а в потоке остаются разбор писем и сбор контактов
+        executor = ThreadPoolExecutor(max_workers=1)
+        pending = deque()
+
+        try:
+            await conn.connect(starttls=self.starttls)
+            await conn.login(self.imap_user, self.imap_password)
+            self.uidvalidity = await conn.select(self.folder)
+
+            logger.info("✅ Успешно подключился к почтовому серверу!")
+
+            search_criteria, period, last_uid = self._search_plan(from_date, to_date, sync_state)
+            message_id_list = self._after_checkpoint(await conn.uid_search(search_criteria), last_uid)
+
+            self.stats['total_emails'] = len(message_id_list)
+            logger.info(f"📬 Найдено писем {period}: {len(message_id_list)}")
+
+            body_id_list = message_id_list
+            if self.header_prefilter:
+                body_id_list = await self._prefilter_by_headers_async(conn, message_id_list)
+
+            total_emails = len(body_id_list)
+            index = 0
+            fetched_uids = set()
+
+            async for msg_id, raw_email in self._fetch_messages_pipelined(conn, body_id_list):
+                index += 1
+                fetched_uids.add(int(msg_id))
+                if pool is None:
+                    await loop.run_in_executor(
+                        executor, self._process_raw_message, msg_id, raw_email, index, total_emails, processed_contacts
+                    )
+                    continue
+
+                prepared = await loop.run_in_executor(
+                    executor, self._prepare_raw_message, msg_id, raw_email, index, total_emails
+                )
+                if prepared is not None:
+                    pending.append((msg_id, pool.submit(prepared)))
+                # Очередь пула ограничена, как в ExtractionPool.imap: загрузка ждёт воркеров
+                while len(pending) >= pool.queue_size:
+                    await self._collect_pooled_async(executor, pool, *pending.popleft(), processed_contacts)
+
+            while pending:
+                await self._collect_pooled_async(executor, pool, *pending.popleft(), processed_contacts)
+
+            processed_contacts = await loop.run_in_executor(executor, self._final_deduplicate, processed_contacts)
+            await loop.run_in_executor(executor, self.contact_processor.save_caches)
+
+            # Сдвигаем точку синхронизации только после успешной обработки
+            self._save_checkpoint(sync_state, message_id_list, last_uid,
+                                  self._unfetched(body_id_list, fetched_uids))
+
+        except Exception as e:
+            logger.error(f"❌ Критическая ошибка асинхронного IMAP-клиента: {e}")
+            raise
+
+        finally:
+            if pool is not None:
+                pool.close()
+            executor.shutdown(wait=True)
+            await conn.logout()
+            logger.info("✅ Соединение с сервером закрыто")
+
+        return processed_contacts
+
+    def _process_raw_message(self, msg_id: bytes, raw_email: bytes, index: int, total_emails: int,
+                             processed_contacts: List[FullContactInfo]):
+        try:
+            msg = email.message_from_bytes(raw_email)
+            self._process_message(msg, index, total_emails, processed_contacts)
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения письма {msg_id}: {e}")
+
+    def _prepare_raw_message(self, msg_id: bytes, raw_email: bytes, index: int, total_emails: int):
+        """Разбирает письмо для пула процессов (см. IMAPClient._prepare_message)"""
+        try:
+            return self._prepare_message(email.message_from_bytes(raw_email), index, total_emails)
+        except Exception as e:
+            logger.error(f"❌ Ошибка получения письма {msg_id}: {e}")
+            return None
+
+    async def _collect_pooled_async(self, executor: ThreadPoolExecutor, pool: ExtractionPool, msg_id: bytes,
+                                    future, processed_contacts: List[FullContactInfo]):
+        """Ждёт задание пула, не блокируя цикл событий, и собирает контакты в потоке разбора"""
+        await asyncio.wait([asyncio.wrap_future(future)])
+        await asyncio.get_running_loop().run_in_executor(
+            executor, self._collect_pooled, *pool.result(msg_id, future), processed_contacts
+        )
+
+    async def _prefilter_by_headers_async(self, conn: AsyncIMAPConnection,
+                                          message_id_list: List[bytes]) -> List[bytes]:
+        """Фильтр по заголовкам (см. IMAPClient._prefilter_by_headers) с конвейерной загрузкой"""
+
+        external_ids = []
+
+        async for batch, fetch_data in fetch_batches_pipelined(
+            conn, message_id_list, HEADER_PREFILTER_ITEMS, self.fetch_batch_size, self.max_in_flight
+        ):
+            if fetch_data is None:
+                # Не удалось проверить заголовки - загрузим тела как раньше
+                external_ids.extend(batch)
+                continue
+            external_ids.extend(self._external_by_headers(batch, fetch_data))
+
+        logger.info(
+            f"📨 Фильтр по заголовкам: тела нужны для {len(external_ids)} из {len(message_id_list)} писем"
+        )
+
+        return external_ids
+
+    async def _fetch_messages_pipelined(self, conn: AsyncIMAPConnection, message_id_list: List[bytes]):
+        """Отдаёт (uid, письмо) в порядке UID, держа в полёте до max_in_flight пачек
+
+        Кэш проверяется по пачкам (как в IMAPClient._fetch_messages_batched):
+        в памяти одновременно только письма пачек в полёте, а не весь период.
+        """
+
+        use_cache = self.message_cache is not None and self.uidvalidity is not None
+        batches = iter_uid_batches(message_id_list, self.fetch_batch_size)
+        in_flight = deque()
+        loop = asyncio.get_running_loop()
+
+        # Кэш (SQLite и файлы писем) читается и пишется в пуле потоков цикла событий,
+        # чтобы не задерживать чтение ответов на команды в полёте
+        async def start_next() -> bool:
+            batch = next(batches, None)
+            if batch is None:
+                return False
+            cached = await loop.run_in_executor(
+                None, self.message_cache.get_many, self.folder, self.uidvalidity, batch
+            ) if use_cache else {}
+            missing = [uid for uid in batch if int(uid) not in cached]
+            task = asyncio.create_task(conn.uid_fetch(missing, '(RFC822)')) if missing else None
+            if self.debug:
+                logger.debug(f"📦 Пачка из {len(batch)} писем: из кэша {len(cached)}, загрузить {len(missing)}")
+            in_flight.append((batch, cached, task))
+            return True
+
+        try:
+            while len(in_flight) < max(1, self.max_in_flight) and await start_next():
+                pass
+
+            while in_flight:
+                batch, cached, task = in_flight.popleft()
+                fetched = {}
+                if task is not None:
+                    try:
+                        fetch_data = await task
+                    except AsyncIMAPError as e:
+                        # NO/BAD на одну пачку не прерывает период: её UID останутся
+                        # в _unfetched и не попадут за точку синхронизации
+                        if conn.closed:
+                            raise
+                        logger.error(f"❌ Ошибка пакетной загрузки {compress_uid_set([uid for uid in batch if int(uid) not in cached])}: {e}")
+                    else:
+                        fetched = await loop.run_in_executor(None, self._store_fetched, fetch_data)
+                await start_next()
+
+                for msg_id in batch:
+                    raw_email = cached.get(int(msg_id)) or fetched.get(int(msg_id))
+                    if raw_email is not None:
+                        yield msg_id, raw_email
+        finally:
+            # Прерванная обработка: не оставляем команды в полёте без ожидающего
+            for _, _, task in in_flight:
+                if task is not None:
+                    task.cancel()
@@ -0,0 +1,591 @@
+#!/usr/bin/env python3
+"""
+Замеры производительности этапов извлечения контактов
+
+Запуск из корня проекта: python src/benchmarks.py <набор> [параметры]
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+import logging
+import statistics
+from typing import Callable, Dict, List
+
+# Добавляем путь для импорта наших модулей
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_CORPUS = ['emails_*.csv']
+
+
+def load_signature_corpus(paths: List[str], limit: int) -> List[str]:
+    """Блоки подписей из выгрузок писем - тот же текст, что получает NER в конвейере"""
+
+    from contact_processor import ContactProcessor
+    from offline_source import iter_offline_messages
+
+    processor = ContactProcessor()
+    signatures = []
+
+    for _, msg, email_body in iter_offline_messages(paths):
+        if email_body is None:
+            continue
+        for block in processor._extract_clean_signatures(email_body):
+            if isinstance(block, str) and len(block.strip()) > 15:
+                signatures.append(block)
+        if len(signatures) >= limit:
+            break
+
+    return signatures[:limit]
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    """Среднее, медиана и 95-й перцентиль в миллисекундах"""
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return {
+        'mean_ms': statistics.fmean(ordered) * 1000,
+        'p50_ms': statistics.median(ordered) * 1000,
+        'p95_ms': p95 * 1000,
+    }
+
+
+def timed(func: Callable, items: List) -> List[float]:
+    samples = []
+    for item in items:
+        started = time.perf_counter()
+        func(item)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def bench_ner_profiles(args):
+    """Задержка extract_entities на одну подпись для каждого профиля анализа"""
+
+    from natasha_models import MODELS, PROFILE_COMPONENTS
+    from ner_extractor import RussianNERExtractor
+
+    signatures = load_signature_corpus(args.corpus, args.limit)
+    print(f"🧪 Профили анализа Natasha: {len(signatures)} подписей")
+
+    # Загрузка моделей не входит в замер
+    MODELS.preload()
+    extractor = RussianNERExtractor()
+
+    reference = None
+    for profile in reversed(list(PROFILE_COMPONENTS)):
+        results = []
+
+        def extract(text):
+            # Ошибки постобработки в конвейере гасит process_email_signature - здесь просто учитываем
+            try:
+                results.append(extractor.extract_entities(text, profile))
+            except Exception as e:
+                results.append(type(e).__name__)
+
+        # Прогрев: первые вызовы заметно медленнее
+        for text in signatures[:5]:
+            extract(text)
+        results.clear()
+
+        samples = timed(extract, signatures)
+        summary = latency_summary(samples)
+
+        if reference is None:
+            reference = results
+        differences = sum(1 for a, b in zip(results, reference) if a != b)
+        errors = sum(1 for result in results if isinstance(result, str))
+
+        print(
+            f"   {profile:<10} среднее {summary['mean_ms']:6.1f} мс, "
+            f"p50 {summary['p50_ms']:6.1f} мс, p95 {summary['p95_ms']:6.1f} мс, "
+            f"отличий от full: {differences}, ошибок: {errors}"
+        )
+
+
+def bench_ner_batch(args):
+    """Пропускная способность extract_entities по одной подписи против extract_entities_batch"""
+
+    from natasha_models import MODELS
+    from ner_extractor import RussianNERExtractor
+
+    signatures = load_signature_corpus(args.corpus, args.limit)
+    print(f"🧪 Пакетный NER: {len(signatures)} подписей, пачки по {args.batch_size}")
+
+    MODELS.preload()
+    extractor = RussianNERExtractor()
+
+    def one_by_one(texts):
+        results = []
+        for text in texts:
+            try:
+                results.append(extractor.extract_entities(text))
+            except Exception as e:
+                results.append(type(e).__name__)
+        return results
+
+    def batched(texts):
+        results = []
+        for start in range(0, len(texts), args.batch_size):
+            chunk = extractor.extract_entities_batch(texts[start:start + args.batch_size], return_exceptions=True)
+            results.extend(type(r).__name__ if isinstance(r, Exception) else r for r in chunk)
+        return results
+
+    # Прогрев
+    one_by_one(signatures[:10])
+    batched(signatures[:10])
+
+    timings = {}
+    outputs = {}
+    for name, func in (('по одной', one_by_one), ('пачкой', batched)):
+        started = time.perf_counter()
+        outputs[name] = func(signatures)
+        timings[name] = time.perf_counter() - started
+        per_signature = timings[name] / max(1, len(signatures)) * 1000
+        print(f"   {name:<9} {timings[name]:6.2f} с, {per_signature:5.2f} мс на подпись")
+
+    differences = sum(1 for a, b in zip(outputs['по одной'], outputs['пачкой']) if a != b)
+    print(f"   ускорение x{timings['по одной'] / timings['пачкой']:.2f}, отличий: {differences}")
+
+
+def bench_ner_cache(args):
+    """Повторный прогон корпуса через extract_entities_batch с кэшем NER и без него"""
+
+    from natasha_models import MODELS
+    from ner_cache import NERCache
+    from ner_extractor import RussianNERExtractor
+
+    signatures = load_signature_corpus(args.corpus, args.limit)
+    print(f"🧪 Кэш NER: {len(signatures)} подписей, {args.passes} прогона")
+
+    MODELS.preload()
+    plain = RussianNERExtractor()
+    cached = RussianNERExtractor(cache=NERCache())
+
+    def run(extractor):
+        results = []
+        for start in range(0, len(signatures), args.batch_size):
+            chunk = extractor.extract_entities_batch(signatures[start:start + args.batch_size], return_exceptions=True)
+            results.extend(type(r).__name__ if isinstance(r, Exception) else r for r in chunk)
+        return results
+
+    # Прогрев
+    plain.extract_entities_batch(signatures[:10], return_exceptions=True)
+
+    for name, extractor in (('без кэша', plain), ('с кэшем', cached)):
+        started = time.perf_counter()
+        outputs = [run(extractor) for _ in range(args.passes)]
+        elapsed = time.perf_counter() - started
+        if name == 'без кэша':
+            reference, baseline = outputs[0], elapsed
+        differences = sum(1 for output in outputs for a, b in zip(output, reference) if a != b)
+        print(f"   {name:<9} {elapsed:6.2f} с, x{baseline / elapsed:.2f}, отличий: {differences}")
+
+    lookups = cached.cache.stats['hits'] + cached.cache.stats['misses']
+    print(
+        f"   попаданий {cached.cache.stats['hits']} из {lookups} "
+        f"({cached.cache.stats['hits'] / max(1, lookups) * 100:.1f}%), записей в кэше: {len(cached.cache)}"
+    )
+
+
+class ModuleLevelPattern:
+    """Паттерн, который при каждом вызове идёт через функции модуля re (как до реестра паттернов)"""
+
+    def __init__(self, regex):
+        self.pattern, self.flags = regex.pattern, regex.flags
+
+    def search(self, string):
+        return re.search(self.pattern, string, self.flags)
+
+    def match(self, string):
+        return re.match(self.pattern, string, self.flags)
+
+    def findall(self, string):
+        return re.findall(self.pattern, string, self.flags)
+
+    def finditer(self, string):
+        return re.finditer(self.pattern, string, self.flags)
+
+    def sub(self, repl, string):
+        return re.sub(self.pattern, repl, string, flags=self.flags)
+
+
+def uncompile_patterns(obj):
+    """Заменяет скомпилированные паттерны объекта на ModuleLevelPattern"""
+
+    for name, value in list(vars(obj).items()):
+        if name.endswith('_regex'):
+            setattr(obj, name, ModuleLevelPattern(value))
+        elif name.endswith('_regexes'):
+            setattr(obj, name, [ModuleLevelPattern(regex) for regex in value])
+
+
+def bench_regex(args):
+    """Разбор подписи регулярными выражениями: скомпилированные таблицы против вызовов модуля re"""
+
+    from contact_processor import ContactProcessor
+
+    signatures = load_signature_corpus(args.corpus, args.limit)
+    print(f"🧪 Регулярные выражения: {len(signatures)} подписей")
+
+    def analyze(processor):
+        def run(text):
+            return (
+                processor.signature_parser.parse_signature(text),
+                processor._extract_phones_improved(text),
+                processor._deep_filter_internal_markers(text),
+                processor._deep_clean_email_body(text),
+                processor._clean_company(text.split('\n')[0]),
+                processor._extract_city_from_address(text),
+            )
+        return run
+
+    compiled = ContactProcessor()
+    module_level = ContactProcessor()
+    uncompile_patterns(module_level)
+    uncompile_patterns(module_level.signature_parser)
+
+    outputs = {}
+    for name, processor in (('модуль re', module_level), ('реестр', compiled)):
+        run = analyze(processor)
+        for text in signatures[:10]:
+            run(text)
+
+        outputs[name] = []
+        samples = timed(lambda text: outputs[name].append(run(text)), signatures)
+        summary = latency_summary(samples)
+        print(
+            f"   {name:<9} среднее {summary['mean_ms'] * 1000:6.1f} мкс, "
+            f"p50 {summary['p50_ms'] * 1000:6.1f} мкс, p95 {summary['p95_ms'] * 1000:6.1f} мкс на подпись"
+        )
+
+    differences = sum(1 for a, b in zip(outputs['модуль re'], outputs['реестр']) if a != b)
+    print(f"   отличий: {differences}")
+
+
+def bench_phones(args):
+    """Поиск телефонов SignatureParser: отдельный finditer на каждый паттерн против одного прохода"""
+
+    from signature_parser import SignatureParser
+
+    signatures = load_signature_corpus(args.corpus, args.limit)
+    print(f"🧪 Поиск телефонов: {len(signatures)} подписей, {len(SignatureParser().phone_patterns)} паттернов")
+
+    parser = SignatureParser()
+    regexes = [re.compile(config['pattern'], re.IGNORECASE) for config in parser.phone_patterns]
+
+    def per_pattern(text):
+        return [[match.groupdict() for match in regex.finditer(text)] for regex in regexes]
+
+    outputs = {}
+    for name, func in (('по паттерну', per_pattern), ('один проход', parser._scan_phone_matches)):
+        for text in signatures[:10]:
+            func(text)
+
+        outputs[name] = []
+        samples = timed(lambda text: outputs[name].append(func(text)), signatures)
+        summary = latency_summary(samples)
+        print(
+            f"   {name:<11} среднее {summary['mean_ms'] * 1000:6.1f} мкс, "
+            f"p50 {summary['p50_ms'] * 1000:6.1f} мкс, p95 {summary['p95_ms'] * 1000:6.1f} мкс на подпись"
+        )
+
+    differences = sum(1 for a, b in zip(outputs['по паттерну'], outputs['один проход']) if a != b)
+    print(f"   отличий в совпадениях: {differences}")
+
+
+def bench_keywords(args):
+    """Проверка строк подписей по спискам слов: any(word in line) против KeywordMatcher"""
+
+    from keyword_matcher import KeywordMatcher
+
+    signatures = load_signature_corpus(args.corpus, args.limit)
+    lines = [line.lower().strip() for text in signatures for line in text.split('\n') if line.strip()]
+
+    words = set()
+    for filename in ('data/company_blacklist.txt', 'data/exclusions.txt', 'data/positions.txt'):
+        try:
+            with open(filename, encoding='utf-8') as f:
+                words.update(line.strip().lower() for line in f if line.strip() and not line.startswith('#'))
+        except FileNotFoundError:
+            continue
+    words = sorted(words)
+    print(f"🧪 Поиск ключевых слов: {len(lines)} строк, до {len(words)} слов из data/*.txt")
+
+    for size in (10, 50, len(words)):
+        keywords = words[:size]
+        matcher = KeywordMatcher(keywords)
+
+        started = time.perf_counter()
+        expected = [any(word in line for word in keywords) for line in lines]
+        scan_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        found = [matcher.contains_any(line) for line in lines]
+        matcher_time = time.perf_counter() - started
+
+        differences = sum(1 for a, b in zip(expected, found) if a != b)
+        print(
+            f"   {len(keywords):>4} слов: any {scan_time / len(lines) * 1e6:6.2f} мкс, "
+            f"автомат {matcher_time / len(lines) * 1e6:6.2f} мкс на строку, отличий: {differences}"
+        )
+
+
+def synthetic_contacts(count: int, distinct: int, seed: int = 42) -> List:
+    """Синтетические контакты: count записей о distinct людях с разными наборами полей"""
+
+    import random
+    from contact_processor import FullContactInfo
+
+    rng = random.Random(seed)
+    surnames = ['Иванов', 'Петров', 'Сидоров', 'Кузнецов', 'Смирнов', 'Попов', 'Волков', 'Соколов']
+    names = ['Иван', 'Пётр', 'Алексей', 'Мария', 'Ольга', 'Елена', 'Сергей', 'Анна']
+    companies = ['ООО «Вектор»', 'АО «СибЛаб»', 'ФБУЗ «Центр гигиены»', 'ООО «БиоТест»']
+    cities = ['Новосибирск', 'Томск', 'Иркутск', 'Барнаул']
+
+    contacts = []
+    for _ in range(count):
+        person = rng.randrange(distinct)
+        contacts.append(FullContactInfo(
+            fio=f"{surnames[person % 8]} {names[person // 8 % 8]} {person}",
+            email=f"user{person}@example{person % 97}.ru",
+            position=rng.choice(['', 'Менеджер', 'Директор']),
+            company=rng.choice(['', companies[person % 4]]),
+            phones=[f"+7 (913) {person % 1000:03d}-{rng.randrange(100):02d}-{person % 100:02d}"],
+            city=rng.choice(['', cities[person % 4]]),
+            confidence_score=rng.choice([0.5, 0.6, 0.7, 0.8]),
+            source='email_signature',
+        ))
+    return contacts
+
+
+def bench_dedup(args):
+    """ContactProcessor.deduplicate_contacts на синтетических контактах разного объёма"""
+
+    from contact_processor import ContactProcessor
+
+    processor = ContactProcessor()
+    print(f"🧪 Дедупликация контактов: до {args.contacts} записей, ~3 записи на человека")
+
+    for count in (args.contacts // 100, args.contacts // 10, args.contacts):
+        contacts = synthetic_contacts(count, max(1, count // 3))
+
+        started = time.perf_counter()
+        unique = processor.deduplicate_contacts(contacts)
+        elapsed = time.perf_counter() - started
+
+        merged_phones = sum(len(contact.phones) for contact in unique)
+        print(
+            f"   {count:>7} контактов → {len(unique):>6} уникальных за {elapsed:6.3f} с "
+            f"({elapsed / max(1, count) * 1e6:5.2f} мкс на контакт), телефонов после слияния: {merged_phones}"
+        )
+
+
+def synthetic_people_records(count: int, seed: int = 42) -> List:
+    """Записи о людях в разном написании: полное ФИО, "Фамилия И.О.", смена email, другой телефон"""
+
+    import random
+    from contact_processor import FullContactInfo
+
+    rng = random.Random(seed)
+    roots = ['Иван', 'Петр', 'Сидор', 'Кузнец', 'Смирн', 'Поп', 'Волк', 'Сокол', 'Лебед', 'Козл',
+             'Новик', 'Морозк', 'Павл', 'Семен', 'Голуб', 'Виноград', 'Богдан', 'Воробь', 'Федор', 'Михайл']
+    middles = ['', 'ин', 'ан', 'ушк', 'енк', 'овск', 'ар', 'ен', 'ол', 'ит']
+    endings = ['ов', 'ев', 'ин', 'ский', 'ых']
+    names = ['Иван', 'Пётр', 'Алексей', 'Мария', 'Ольга', 'Елена', 'Сергей', 'Анна', 'Дмитрий', 'Наталья']
+    patronymics = ['Иванович', 'Петрович', 'Сергеевич', 'Алексеевна', 'Олеговна', 'Андреевич']
+    domains = ['mail.ru', 'yandex.ru', 'gmail.com'] + [f'lab{n}.ru' for n in range(2000)]
+
+    people = max(1, count // 3)
+    contacts = []
+    for _ in range(count):
+        person = rng.randrange(people)
+        person_rng = random.Random(person)
+        surname = (person_rng.choice(roots) + person_rng.choice(middles) + person_rng.choice(endings))
+        name, patronymic = person_rng.choice(names), person_rng.choice(patronymics)
+        domain = person_rng.choice(domains)
+        phone = f"+7 (9{person % 100:02d}) {person // 100 % 1000:03d}-{person % 97:02d}-{person % 89:02d}"
+
+        style = rng.randrange(4)
+        fio = f"{surname} {name} {patronymic}" if style < 2 else f"{surname} {name[0]}.{patronymic[0]}."
+        email = f"{surname.lower()}{person}@{domain}" if style != 3 else f"{name.lower()}{person}@{domain}"
+        phones = [phone] if rng.random() < 0.7 else [f"8 913 {rng.randrange(10 ** 7):07d}"]
+
+        contacts.append(FullContactInfo(
+            fio=fio, email=email, phones=phones,
+            company=rng.choice(['', f'ООО «Лаборатория {person % 500}»']),
+            confidence_score=rng.choice([0.5, 0.6, 0.7, 0.8]),
+            source='email_signature',
+        ))
+    return contacts
+
+
+def bench_fuzzy(args):
+    """ContactMatcher: нечёткие дубли с блокировкой на синтетических записях разного объёма"""
+
+    from contact_matcher import ContactMatcher
+    from contact_processor import ContactProcessor
+
+    processor = ContactProcessor()
+    print(f"🧪 Нечёткие дубли: до {args.contacts * 2} записей, ~3 записи на человека в разном написании")
+
+    for count in (args.contacts // 10, args.contacts, args.contacts * 2):
+        contacts = synthetic_people_records(count)
+        matcher = ContactMatcher()
+
+        started = time.perf_counter()
+        exact = processor.deduplicate_contacts(contacts)
+        exact_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        matched = matcher.deduplicate(exact, processor._merge_contacts)
+        fuzzy_time = time.perf_counter() - started
+
+        print(
+            f"   {count:>7} записей: точных ключей {len(exact):>6} ({exact_time:5.2f} с), "
+            f"после ContactMatcher {len(matched):>6} ({fuzzy_time:5.2f} с, "
+            f"{fuzzy_time / max(1, len(exact)) * 1e6:5.1f} мкс на контакт), "
+            f"пар сравнено {matcher.stats['compared_pairs']}, людей {max(1, count // 3)}"
+        )
+
+
+def bench_excel(args):
+    """ExcelExporter: потоковая запись и объединение с существующей книгой против обычной книги openpyxl"""
+
+    import shutil
+    import tempfile
+    import tracemalloc
+    from openpyxl import Workbook
+    from contact_processor import ContactProcessor
+    from excel_manager import ExcelExporter, EXCEL_COLUMNS, contact_to_row
+
+    processor = ContactProcessor()
+    print(f"🧪 Выгрузка в Excel: до {args.contacts} строк")
+
+    def measure(name, func, rows):
+        # Время и пик памяти - отдельными прогонами: tracemalloc замедляет openpyxl в разы
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(
+            f"   {name:<34} {elapsed:6.2f} с, {elapsed / max(1, rows) * 1e6:5.1f} мкс на строку, "
+            f"пик памяти {peak / 2 ** 20:6.1f} МБ"
+        )
+
+    def stream_contacts(count):
+        # Контакты создаются по ходу записи - в памяти их нет
+        for start in range(0, count, 1000):
+            yield from synthetic_contacts(min(1000, count - start), count, seed=start)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for count in (args.contacts // 10, args.contacts):
+            filename = os.path.join(directory, f'contacts_{count}.xlsx')
+            exporter = ExcelExporter(filename, merge=processor._merge_contacts)
+
+            measure(f'write_only, новая книга {count}', lambda: exporter.export(stream_contacts(count), False), count)
+
+            # 10% обновлений: часть людей уже есть в книге, часть новые; каждый прогон - с исходной книгой
+            update = synthetic_contacts(count // 10, count * 2, seed=count)
+            base = os.path.join(directory, f'base_{count}.xlsx')
+            shutil.copyfile(filename, base)
+
+            def merge_update():
+                shutil.copyfile(base, filename)
+                exporter.export(update)
+
+            measure(f'write_only, объединение {count}', merge_update, count)
+            print(f"      {exporter.stats}")
+
+        sample = synthetic_contacts(args.contacts // 10, args.contacts)
+
+        def regular_workbook():
+            workbook = Workbook()
+            sheet = workbook.active
+            sheet.append([header for _, header, _ in EXCEL_COLUMNS])
+            for contact in sample:
+                sheet.append(contact_to_row(contact))
+            workbook.save(os.path.join(directory, 'regular.xlsx'))
+
+        measure(f'обычная книга {len(sample)}', regular_workbook, len(sample))
+
+
+def bench_memory(args):
+    """Байт на контакт: FullContactInfo со слотами и интернированием против обычного dataclass"""
+
+    import gc
+    import tracemalloc
+    from dataclasses import fields, make_dataclass
+    from contact_processor import FullContactInfo
+
+    # Прежнее представление: dataclass с __dict__, без интернирования
+    PlainContactInfo = make_dataclass(
+        'PlainContactInfo', [(f.name, f.type, f) for f in fields(FullContactInfo)]
+    )
+
+    def fresh(value):
+        # В конвейере строки приходят из regex и NER - каждый раз новый объект
+        if isinstance(value, str):
+            return ''.join(list(value))
+        return list(map(fresh, value)) if isinstance(value, list) else value
+
+    template = synthetic_contacts(args.contacts, max(1, args.contacts // 3))
+    names = [f.name for f in fields(FullContactInfo)]
+    print(f"🧪 Память контактов: {len(template)} записей")
+
+    results = {}
+    for name, cls in (('dataclass', PlainContactInfo), ('slots + intern', FullContactInfo)):
+        gc.collect()
+        tracemalloc.start()
+        contacts = [
+            cls(**{field_name: fresh(getattr(contact, field_name)) for field_name in names})
+            for contact in template
+        ]
+        gc.collect()
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        results[name] = current / len(contacts)
+        print(f"   {name:<15} {results[name]:7.0f} байт на контакт, всего {current / 2 ** 20:6.1f} МБ")
+        del contacts
+
+    print(f"   экономия {(1 - results['slots + intern'] / results['dataclass']) * 100:.1f}%")
+
+
+SUITES = {
+    'ner-profiles': bench_ner_profiles,
+    'ner-batch': bench_ner_batch,
+    'ner-cache': bench_ner_cache,
+    'regex': bench_regex,
+    'phones': bench_phones,
+    'keywords': bench_keywords,
+    'dedup': bench_dedup,
+    'fuzzy': bench_fuzzy,
+    'excel': bench_excel,
+    'memory': bench_memory,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры производительности извлечения контактов")
+    parser.add_argument('suite', choices=sorted(SUITES), help='Набор замеров')
+    parser.add_argument('--corpus', nargs='+', default=DEFAULT_CORPUS,
+                        help='Источники писем: CSV, .eml, mbox, .parquet (по умолчанию: emails_*.csv)')
+    parser.add_argument('--limit', type=int, default=300, help='Размер выборки')
+    parser.add_argument('--batch-size', type=int, default=256, help='Подписей в пачке для пакетных замеров')
+    parser.add_argument('--passes', type=int, default=3, help='Прогонов корпуса для замеров кэша')
+    parser.add_argument('--contacts', type=int, default=100000, help='Синтетических контактов для замеров дедупликации, выгрузки и памяти')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    SUITES[args.suite](args)
+
+
+if __name__ == "__main__":
+    main()
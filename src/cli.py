@@ -25,6 +25,17 @@ def parse_dates(from_date, to_date):
     
     return from_date, to_date
 
+def parse_shard(value):
+    """Часть офлайн-прогона в виде K/N (K от 1 до N) -> (K - 1, N)"""
+    
+    try:
+        number, total = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError("ожидается K/N, например 2/4")
+    if not 1 <= number <= total:
+        raise argparse.ArgumentTypeError("K должно быть от 1 до N")
+    return number - 1, total
+
 def main():
     parser = argparse.ArgumentParser(description="Парсер контактов из корпоративной почты")
     
@@ -41,14 +52,188 @@ def main():
         action='store_true', 
         help='Включить подробное логирование'
     )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help='Обработать только письма новее последней точки синхронизации'
+    )
+    parser.add_argument(
+        '--header-prefilter',
+        action='store_true',
+        help='Сначала загружать только заголовки и пропускать внутреннюю переписку'
+    )
+    parser.add_argument(
+        '--text-parts-only',
+        action='store_true',
+        help='Загружать только текстовые части писем (по BODYSTRUCTURE), без вложений'
+    )
+    parser.add_argument(
+        '--async',
+        dest='use_async',
+        action='store_true',
+        help='Асинхронная загрузка: несколько пачек UID FETCH одновременно в полёте'
+    )
+    parser.add_argument(
+        '--max-in-flight',
+        type=int,
+        default=None,
+        help='Сколько пачек загружается одновременно в режиме --async (по умолчанию: IMAP_MAX_IN_FLIGHT из .env или 4)'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Число процессов извлечения контактов (по умолчанию: EXTRACTION_WORKERS из .env или 0)'
+    )
+    parser.add_argument(
+        '--replay',
+        nargs='+',
+        metavar='PATH',
+        help='Офлайн-режим: обработать CSV-выгрузки, архивы .parquet, хранилища .idx, .eml или mbox '
+             'вместо почтового сервера (--from-date/--to-date и --sender отбирают письма)'
+    )
+    parser.add_argument(
+        '--sender',
+        dest='senders',
+        nargs='+',
+        metavar='EMAIL',
+        default=None,
+        help='Офлайн-режим: обработать только письма этих отправителей'
+    )
+    parser.add_argument(
+        '--limit',
+        type=int,
+        default=None,
+        help='Обработать не больше N писем (для офлайн-режима)'
+    )
+    parser.add_argument(
+        '--replay-offset',
+        type=int,
+        default=0,
+        metavar='BYTES',
+        help='Начать первый CSV с записи по этому смещению (число из ключа "файл@смещение")'
+    )
+    parser.add_argument(
+        '--replay-shard',
+        type=parse_shard,
+        default=None,
+        metavar='K/N',
+        help='Обработать только K-ю из N частей источников (CSV делится по диапазонам байт)'
+    )
+    parser.add_argument(
+        '--sync-state',
+        default='data/sync_state.json',
+        help='Файл точки синхронизации (по умолчанию: data/sync_state.json)'
+    )
+    parser.add_argument(
+        '--excel',
+        nargs='?',
+        const='data/contacts.xlsx',
+        default=None,
+        metavar='PATH',
+        help='Выгрузить контакты в Excel с объединением с существующей книгой (по умолчанию: data/contacts.xlsx)'
+    )
     
     args = parser.parse_args()
     
+    if args.replay:
+        return replay(args)
+    
     from_date, to_date = parse_dates(args.from_date, args.to_date)
     
-    print(f"🚀 Парсинг писем с {from_date} по {to_date}")
+    # Тяжёлые модели Natasha загружаются только при реальном запуске
+    from src.imap_client import IMAPClient
+    from src.sync_state import SyncState
+    
+    sync_state = SyncState(args.sync_state) if args.incremental else None
+    
+    if sync_state is not None:
+        print(f"🚀 Инкрементальный парсинг писем (первый запуск: с {from_date} по {to_date})")
+    else:
+        print(f"🚀 Парсинг писем с {from_date} по {to_date}")
+    print(f"📊 Режим отладки: {'включен' if args.debug else 'выключен'}")
+    
+    if args.use_async:
+        if args.text_parts_only:
+            print("❌ --text-parts-only не поддерживается в режиме --async")
+            exit(1)
+        from src.async_imap_client import AsyncIMAPClient
+        client = AsyncIMAPClient(
+            debug=args.debug,
+            max_in_flight=args.max_in_flight,
+            header_prefilter=args.header_prefilter,
+            extraction_workers=args.workers,
+        )
+    else:
+        client = IMAPClient(
+            debug=args.debug,
+            header_prefilter=args.header_prefilter,
+            fetch_strategy='text_parts' if args.text_parts_only else None,
+            extraction_workers=args.workers,
+        )
+    contacts = client.process_emails(from_date, to_date, sync_state=sync_state)
+    stats = client.get_processing_stats()
+    
+    print(f"📬 Всего писем: {stats.get('total_emails', 0)}")
+    print(f"🌐 С внешними контактами: {stats.get('external_emails', 0)}")
+    print(f"🎯 Итоговых контактов: {len(contacts)}")
+    print_cache_stats(client)
+    export_excel(args, client, contacts)
+
+def export_excel(args, client, contacts):
+    """Выгрузка контактов в Excel, если указан --excel"""
+    
+    if not args.excel:
+        return
+    
+    from src.excel_manager import export_contacts
+    
+    stats = export_contacts(contacts, args.excel, merge=client.contact_processor._merge_contacts)
+    print(f"📗 Excel {args.excel}: {stats['added']} новых, {stats['merged']} объединено, {stats['kept']} без изменений")
+
+def print_cache_stats(client):
+    """Попадания в кэш NER и таблицу отпечатков подписей, если они включены"""
+    
+    stats = client.contact_processor.get_processing_stats()
+    if 'ner_cache_hit_percent' in stats:
+        print(f"🧠 Кэш NER: {stats['ner_cache_hits']} попаданий, {stats['ner_cache_misses']} промахов "
+              f"({stats['ner_cache_hit_percent']}%)")
+    if 'signature_store_size' in stats:
+        print(f"✍️ Известных подписей: {stats['known_signatures']} писем, в таблице {stats['signature_store_size']}")
+
+def replay(args):
+    """Офлайн-прогон конвейера контактов по сохранённым письмам"""
+    
+    from src.offline_replay import OfflineReplayClient
+    
+    # Без --from-date/--to-date обрабатываются все письма источников
+    date_from = date_to = None
+    if args.from_date:
+        date_from, date_to = parse_dates(args.from_date, args.to_date)
+    elif args.to_date:
+        _, date_to = parse_dates(args.to_date, args.to_date)
+    
+    print(f"🚀 Офлайн-обработка: {', '.join(args.replay)}")
+    if date_from or date_to:
+        print(f"📅 Период: {date_from or '...'} - {date_to}")
+    if args.senders:
+        print(f"✉️ Отправители: {', '.join(args.senders)}")
     print(f"📊 Режим отладки: {'включен' if args.debug else 'выключен'}")
-    print("✅ CLI работает корректно!")
+    
+    client = OfflineReplayClient(debug=args.debug, extraction_workers=args.workers)
+    contacts = client.process_sources(args.replay, limit=args.limit, offset=args.replay_offset,
+                                      shard=args.replay_shard, date_from=date_from, date_to=date_to,
+                                      senders=args.senders)
+    stats = client.get_processing_stats()
+    
+    print(f"📬 Всего писем: {stats.get('total_emails', 0)}")
+    print(f"🌐 С внешними контактами: {stats.get('external_emails', 0)}")
+    print(f"🎯 Итоговых контактов: {len(contacts)}")
+    if client.resume_key is not None:
+        print(f"↩️ Остановлено по лимиту, следующее письмо: {client.resume_key}")
+    print_cache_stats(client)
+    export_excel(args, client, contacts)
+    print(f"⏱️ Время: {stats.get('elapsed_seconds', 0)} с ({stats.get('emails_per_second', 0)} писем/с)")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,328 @@
+import os
+import logging
+from collections import defaultdict
+from dataclasses import replace
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from contact_processor import FullContactInfo
+from signature_parser import SignatureParser
+from patterns import PATTERNS
+
+logger = logging.getLogger(__name__)
+
+# Общие почтовые сервисы: домен ничего не говорит о человеке
+FREE_MAIL_DOMAINS = {
+    'mail.ru', 'bk.ru', 'inbox.ru', 'list.ru', 'internet.ru', 'yandex.ru', 'ya.ru',
+    'gmail.com', 'rambler.ru', 'outlook.com', 'hotmail.com', 'icloud.com',
+}
+
+# Блоки больше этого размера делятся по более точному ключу; не поделившиеся не сравниваются
+DEFAULT_MAX_BLOCK = 50
+# Сколько примеров пропущенных ключей попадает в лог
+SKIPPED_KEYS_LOGGED = 10
+DEFAULT_THRESHOLD = 0.6
+
+NAME_TOKEN_RE = PATTERNS.compile(r'[А-ЯЁA-Z][а-яёa-z\-]*\.?')
+COMPANY_PUNCT_RE = PATTERNS.compile(r'[«»"\'()]')
+
+
+class ContactFeatures(NamedTuple):
+    """Нормализованные признаки контакта для блокировки и сравнения"""
+    surname: str
+    initials: str
+    full_words: int
+    email: str
+    domain: str
+    phones: frozenset
+    company: str
+
+
+def split_fio(fio: str) -> Tuple[str, str, int]:
+    """Фамилия, инициалы и число полных слов ФИО
+
+    "Иванов Иван Иванович" и "Иванов И.И." дают одинаковые фамилию и
+    инициалы ("иванов", "ии"), как и "И.И. Иванов". При нескольких полных
+    словах фамилией считается первое - так подписи пишутся чаще всего.
+    """
+
+    words, initials = [], []
+    for token in NAME_TOKEN_RE.findall(fio or ''):
+        if token.endswith('.') or len(token) == 1:
+            # "И.И." разбирается на отдельные инициалы
+            initials.extend(part for part in token.split('.') if part)
+        else:
+            words.append(token)
+
+    if not words:
+        return "", "", 0
+
+    surname = words[0].lower().replace('ё', 'е')
+    initials = [word[0] for word in words[1:]] + [initial[0] for initial in initials]
+    return surname, ''.join(initials).lower().replace('ё', 'е'), len(words)
+
+
+def names_compatible(a_surname: str, a_initials: str, b_surname: str, b_initials: str) -> bool:
+    """Одна фамилия и согласованные инициалы ("и" согласуется с "ии", "ии" с "ип" - нет)"""
+    if a_surname != b_surname:
+        return False
+    shorter, longer = sorted((a_initials, b_initials), key=len)
+    return longer.startswith(shorter)
+
+
+class ContactMatcher:
+    """Поиск нечётких дублей контактов с блокировкой
+
+    Контакты сравниваются попарно только внутри блоков с общим дешёвым
+    ключом: фамилия и первый инициал, базовый номер телефона
+    (SignatureParser._extract_base_number) или корпоративный домен почты.
+    Поэтому время растёт почти линейно с числом контактов, а не квадратично.
+    Блок больше max_block делится по более точному ключу (первые два
+    инициала или фамилия); ключи, которые и после этого слишком общие,
+    пропускаются и попадают в лог.
+
+    Пары с оценкой не ниже threshold связываются в группы, но две группы
+    объединяются, только если ФИО всех их участников попарно согласованы:
+    "Иванов И." не склеит "Иванова Ивана Ивановича" с "Ивановым Игорем Петровичем".
+    """
+
+    def __init__(self, threshold: float = DEFAULT_THRESHOLD, max_block: int = DEFAULT_MAX_BLOCK):
+        self.threshold = threshold
+        self.max_block = max_block
+        self.signature_parser = SignatureParser()
+        self.stats = {
+            'blocks': 0, 'split_blocks': 0, 'skipped_blocks': 0,
+            'compared_pairs': 0, 'matched_pairs': 0, 'vetoed_links': 0,
+        }
+        self.skipped_keys: List[str] = []
+
+    @classmethod
+    def from_env(cls) -> Optional['ContactMatcher']:
+        """Поиск нечётких дублей включается FUZZY_MATCH_THRESHOLD (например, 0.6)"""
+        threshold = os.environ.get('FUZZY_MATCH_THRESHOLD')
+        if not threshold:
+            return None
+        return cls(float(threshold), int(os.environ.get('FUZZY_MATCH_MAX_BLOCK', DEFAULT_MAX_BLOCK)))
+
+    def features(self, contact: FullContactInfo) -> ContactFeatures:
+        surname, initials, full_words = split_fio(contact.fio)
+        email = contact.email.lower().strip() if contact.email else ""
+        domain = email.rsplit('@', 1)[-1] if '@' in email else ""
+
+        phones = set()
+        for phone in contact.phones or []:
+            digits = ''.join(c for c in self.signature_parser._extract_base_number(phone) if c.isdigit())
+            # +7 913 ... и 8 913 ... - один номер
+            if len(digits) >= 10:
+                phones.add(digits[-10:])
+
+        company = ' '.join(COMPANY_PUNCT_RE.sub(' ', contact.company.lower()).split()) if contact.company else ""
+        return ContactFeatures(surname, initials, full_words, email, domain, frozenset(phones), company)
+
+    def blocking_keys(self, features: ContactFeatures) -> Iterable[str]:
+        if features.surname:
+            yield f"fio:{features.surname}:{features.initials[:1]}"
+        for phone in features.phones:
+            yield f"phone:{phone}"
+        if features.domain and features.domain not in FREE_MAIL_DOMAINS:
+            yield f"domain:{features.domain}"
+
+    def score(self, a: ContactFeatures, b: ContactFeatures) -> float:
+        """Оценка того, что два контакта - один человек (0..1)"""
+
+        # Разные люди с одним телефоном или доменом: фамилии или инициалы не совпадают
+        if a.surname and b.surname and not names_compatible(a.surname, a.initials, b.surname, b.initials):
+            return 0.0
+
+        score = 0.0
+        if a.surname and a.surname == b.surname:
+            score += 0.5
+        if a.email and a.email == b.email:
+            score += 0.5
+        elif a.domain and a.domain == b.domain and a.domain not in FREE_MAIL_DOMAINS:
+            score += 0.1
+        if a.phones & b.phones:
+            score += 0.3
+        if a.company and a.company == b.company:
+            score += 0.1
+        return min(score, 1.0)
+
+    def find_pairs(self, contacts: List[FullContactInfo]) -> List[Tuple[int, int, float]]:
+        """Пары индексов контактов-дублей с оценкой"""
+        return self._find_pairs([self.features(contact) for contact in contacts])
+
+    def _split_block(self, key: str, members: List[int],
+                     features: List[ContactFeatures]) -> Iterable[Tuple[str, List[int]]]:
+        """Делит слишком крупный блок по более точному ключу
+
+        Блок "фамилия + первый инициал" - по первым двум инициалам; контакты
+        с одним инициалом ("Иванов И.") попадают в каждый подблок и в свой
+        общий. Блоки телефона и домена - по фамилии.
+        """
+
+        sub_blocks: Dict[str, List[int]] = defaultdict(list)
+        if key.startswith('fio:'):
+            short = []
+            for index in members:
+                initials = features[index].initials
+                if len(initials) >= 2:
+                    sub_blocks[initials[:2]].append(index)
+                else:
+                    short.append(index)
+            for sub_members in sub_blocks.values():
+                sub_members.extend(short)
+            if short:
+                sub_blocks['?'] = short
+        else:
+            for index in members:
+                if features[index].surname:
+                    sub_blocks[features[index].surname].append(index)
+
+        for sub_key, sub_members in sub_blocks.items():
+            yield f"{key}/{sub_key}", sub_members
+
+    def _find_pairs(self, features: List[ContactFeatures]) -> List[Tuple[int, int, float]]:
+        blocks: Dict[str, List[int]] = defaultdict(list)
+        for index, contact_features in enumerate(features):
+            for key in self.blocking_keys(contact_features):
+                blocks[key].append(index)
+
+        compared: Set[Tuple[int, int]] = set()
+        pairs = []
+
+        def compare(members: List[int]):
+            self.stats['blocks'] += 1
+            for position, i in enumerate(members):
+                for j in members[position + 1:]:
+                    pair = (i, j) if i < j else (j, i)
+                    if pair in compared:
+                        continue
+                    compared.add(pair)
+                    pair_score = self.score(features[i], features[j])
+                    if pair_score >= self.threshold:
+                        pairs.append((*pair, pair_score))
+
+        skipped_keys = []
+        for key, members in blocks.items():
+            if len(members) < 2:
+                continue
+            if len(members) <= self.max_block:
+                compare(members)
+                continue
+
+            self.stats['split_blocks'] += 1
+            for sub_key, sub_members in self._split_block(key, members, features):
+                if len(sub_members) > self.max_block:
+                    skipped_keys.append(f"{sub_key} ({len(sub_members)})")
+                elif len(sub_members) >= 2:
+                    compare(sub_members)
+
+        if skipped_keys:
+            self.stats['skipped_blocks'] += len(skipped_keys)
+            self.skipped_keys.extend(skipped_keys)
+            logger.warning(
+                f"⚠️ Нечёткие дубли: {len(skipped_keys)} блоков больше {self.max_block} не сравнивались, "
+                f"например: {', '.join(skipped_keys[:SKIPPED_KEYS_LOGGED])}"
+            )
+
+        self.stats['compared_pairs'] += len(compared)
+        self.stats['matched_pairs'] += len(pairs)
+        return pairs
+
+    def clusters(self, contacts: List[FullContactInfo]) -> List[List[int]]:
+        """Группы индексов одного человека, в порядке появления
+
+        Пары связываются от самых уверенных; связь пропускается, если в
+        объединённой группе оказались бы несогласованные ФИО.
+        """
+
+        return self._clusters([self.features(contact) for contact in contacts])
+
+    def _clusters(self, features: List[ContactFeatures]) -> List[List[int]]:
+        parent = list(range(len(features)))
+        # ФИО (фамилия, инициалы) участников группы - хранятся у корня
+        names = {
+            index: {(item.surname, item.initials)} if item.surname else set()
+            for index, item in enumerate(features)
+        }
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i, j, _ in sorted(self._find_pairs(features), key=lambda pair: -pair[2]):
+            root_i, root_j = find(i), find(j)
+            if root_i == root_j:
+                continue
+            if not all(names_compatible(*a, *b) for a in names[root_i] for b in names[root_j]):
+                self.stats['vetoed_links'] += 1
+                continue
+
+            root, child = min(root_i, root_j), max(root_i, root_j)
+            parent[child] = root
+            names[root] |= names.pop(child)
+
+        groups: Dict[int, List[int]] = {}
+        for index in range(len(features)):
+            groups.setdefault(find(index), []).append(index)
+        return list(groups.values())
+
+    def deduplicate(self, contacts: List[FullContactInfo],
+                    merge: Optional[Callable] = None) -> List[FullContactInfo]:
+        """Объединяет нечёткие дубли; merge(a, b) - как ContactProcessor._merge_contacts
+
+        В объединённом контакте остаётся самое полное ФИО группы.
+        """
+
+        result = [self.merge_group([contacts[index] for index in group], merge) for group in self.clusters(contacts)]
+        self._log_merged(len(contacts) - len(result))
+        return result
+
+    def deduplicate_store(self, store, merge: Optional[Callable] = None,
+                          updated_since: Optional[float] = None) -> int:
+        """Объединяет нечёткие дубли прямо в ContactStore; возвращает число поглощённых строк
+
+        В памяти держатся только признаки контактов (ContactFeatures) и id
+        строк, а не сами контакты; группа дублей заменяется в хранилище одной
+        строкой (ContactStore.merge_rows), так что следующий прогон их уже не увидит.
+        """
+
+        row_ids, features = [], []
+        for row_id, contact in store.iter_rows(updated_since):
+            row_ids.append(row_id)
+            features.append(self.features(contact))
+
+        absorbed = 0
+        for group in self._clusters(features):
+            if len(group) < 2:
+                continue
+            group_ids = [row_ids[index] for index in group]
+            store.merge_rows(group_ids, self.merge_group(store.get_rows(group_ids), merge))
+            absorbed += len(group) - 1
+
+        store.commit()
+        self._log_merged(absorbed)
+        return absorbed
+
+    @staticmethod
+    def merge_group(contacts: List[FullContactInfo], merge: Optional[Callable] = None) -> FullContactInfo:
+        """Один контакт из группы дублей; ФИО - самое полное в группе"""
+
+        contact = contacts[0]
+        for other in contacts[1:]:
+            contact = merge(contact, other) if merge else contact
+
+        if len(contacts) > 1:
+            fullest = max((other.fio for other in contacts), key=lambda fio: split_fio(fio)[2])
+            if fullest != contact.fio:
+                contact = replace(contact, fio=fullest)
+        return contact
+
+    def _log_merged(self, merged: int):
+        if merged > 0:
+            logger.info(
+                f"🔗 Нечёткие дубли: {merged} объединено, "
+                f"сравнено пар: {self.stats['compared_pairs']}, отклонено связей: {self.stats['vetoed_links']}, "
+                f"пропущено крупных блоков: {self.stats['skipped_blocks']}"
+            )
@@ -1,18 +1,31 @@
 import re
+import sys
 import logging
 from typing import List, Dict, Optional
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, fields, asdict, replace
 from datetime import datetime, timedelta
 
 from ner_extractor import RussianNERExtractor, NERResult
 from signature_parser import SignatureParser, ContactInfo
+from ner_cache import NERCache
+from signature_store import SignatureStore, signature_fingerprint
+from patterns import PATTERNS
+from keyword_matcher import KEYWORDS
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
+# Строки, которые повторяются у тысяч контактов: хранятся в одном экземпляре на процесс
+INTERNED_FIELDS = ('position', 'company', 'city', 'source')
+
+
+@dataclass(slots=True)
 class FullContactInfo:
-    """Полная информация о контакте"""
+    """Полная информация о контакте
+
+    Без __dict__ (slots): за многомесячный прогон в памяти сотни тысяч
+    контактов. Должность, компания, город и источник интернируются.
+    """
     fio: str = ""
     position: str = ""
     company: str = ""
@@ -27,16 +40,55 @@ class FullContactInfo:
     email_date: str = ""
     email_subject: str = ""
 
+    def __post_init__(self):
+        self.intern_strings()
+
+    def intern_strings(self):
+        """Интернирует повторяющиеся строки (после заполнения полей присваиванием)"""
+        for name in INTERNED_FIELDS:
+            value = getattr(self, name)
+            if value and type(value) is str:
+                setattr(self, name, sys.intern(value))
+
+    # Контакты из процессов пула извлечения приходят через pickle, минуя __init__
+    def __getstate__(self):
+        return [getattr(self, f.name) for f in fields(self)]
+
+    def __setstate__(self, state):
+        for f, value in zip(fields(self), state):
+            setattr(self, f.name, value)
+        self.intern_strings()
+
+
+def dedup_key(contact: FullContactInfo) -> Optional[tuple]:
+    """Ключ дедупликации: нормализованные email и ФИО (None - если нет ни того, ни другого)
+
+    Один ключ для ContactProcessor.deduplicate_contacts, ContactStore и выгрузки в Excel.
+    """
+
+    email_normalized = contact.email.lower().strip() if contact.email else ""
+    fio_normalized = ' '.join(contact.fio.lower().split()) if contact.fio else ""
+
+    if not email_normalized and not fio_normalized:
+        return None
+    return (email_normalized, fio_normalized)
+
 
 class ContactProcessor:
     """Высококачественный процессор контактной информации"""
     
-    def __init__(self, debug: bool = False):
-        """Инициализация с загрузкой всех паттернов из файлов"""
+    def __init__(self, debug: bool = False, ner_profile: Optional[str] = None,
+                 signature_store: Optional[SignatureStore] = None):
+        """Инициализация с загрузкой всех паттернов из файлов
+        
+        ner_profile - профиль анализа Natasha (ner, ner_morph, full), по умолчанию NER_PROFILE из .env
+        signature_store - отпечатки подписей известных отправителей, по умолчанию SIGNATURE_STORE_FILE из .env
+        """
         
         self.debug = debug
-        self.ner_extractor = RussianNERExtractor()
+        self.ner_extractor = RussianNERExtractor(profile=ner_profile, cache=NERCache.from_env())
         self.signature_parser = SignatureParser()
+        self.signature_store = signature_store if signature_store is not None else SignatureStore.from_env()
         
         # Загружаем все конфигурационные файлы
         self.internal_domains = self._load_list_from_file('data/internal_domains.txt')
@@ -52,7 +104,7 @@ class ContactProcessor:
         for pattern in self.phone_patterns:
             if pattern and not pattern.startswith('#'):
                 try:
-                    self.phone_regexes.append(re.compile(pattern))
+                    self.phone_regexes.append(PATTERNS.compile(pattern))
                 except:
                     if self.debug:
                         logger.debug(f"⚠️ Неправильный regex паттерн: {pattern}")
@@ -76,6 +128,59 @@ class ContactProcessor:
             '>youtube'
         ]
         
+        # Списки маркеров проверяются одним регулярным выражением, собранным из бора слов (keyword_matcher)
+        self.internal_marker_matcher = KEYWORDS.get(self.critical_internal_markers)
+        self.company_blacklist_matcher = KEYWORDS.get(self.company_blacklist)
+        self.chain_header_matcher = KEYWORDS.get([
+            'от кого:', 'от:', 'from:', 'sent:', 'отправлено:',
+            'subject:', 'тема:', 'cc:', 'копия:', 'bcc:'
+        ])
+        self.invalid_name_matcher = KEYWORDS.get([
+            'центр лабораторной', 'telegram:', 'subject:', 'от кого', 'компания', 'youtube', 'rutube'
+        ])
+        self.invalid_position_matcher = KEYWORDS.get([
+            'subject:', 'от кого', 'telegram:', 'отправлено', 'youtube', 'rutube', 'при запросе на счет'
+        ])
+        self.junk_address_matcher = KEYWORDS.get([
+            '>>>', 'от кого:', 'subject:', 'отправлено:', 'оплату №', 'содержат конфиденциальную',
+            'настоящим уведомляем', 'в марте выставляли', 'прошу вас', 'закупка планируется',
+            'кп я только что', '19:00, 18 июня 2025'
+        ])
+        
+        # Таблицы паттернов компилируются один раз - методы ниже вызываются для каждого блока подписи
+        self.header_line_regexes = PATTERNS.compile_all([
+            r'^\d{1,2}:\d{2}, \d{1,2} [а-я]+ \d{4}',    # Временные метки
+            r'^(от кого|отправлено|subject|from|sent):',  # Заголовки писем
+        ])
+        self.tech_line_regexes = PATTERNS.compile_all([
+            r'^\d{1,2}:\d{2}, \d{1,2}',  # Временные метки
+            r'^\d{4}-\d{2}-\d{2}',       # Даты
+            r'^on \d{1,2}/',             # "On 29/07/2025" 
+            r'^в \d{1,2}:\d{2}',         # "В 10:15"
+            r'^\d{2}\.\d{2}\.\d{4}.*пишет', # "28.07.2025 пишет"
+        ])
+        self.additional_phone_regexes = PATTERNS.compile_all([
+            r'\+7-(\d{3})-(\d{3})-(\d{2})-(\d{2})',  # +7-913-399-32-72
+            r'8\s+\((\d{3,4})\)\s+(\d{3})-(\d{3})',  # 8 (3852) 291-295
+            r'\+7\s+\((\d{3})\)\s+(\d{3})\s+(\d{2})\s+(\d{2})\s+\((\d{2})\)', # +7 (495) 933 71 47 (48)
+            r'8\s+(\d{3})-(\d{3})-(\d{2})-(\d{2}),?\s*доб\.(\d+)', # 8 800-770-71-21, доб.1315
+        ])
+        self.company_cut_regexes = PATTERNS.compile_all([
+            r',\s*инн\s+\d+.*',
+            r',\s*кпп\s+\d+.*', 
+            r',\s*\d{6},.*',  # Почтовые индексы
+            r'\s*\d{6},.*'    # Почтовые индексы без запятой
+        ], re.IGNORECASE)
+        self.city_regexes = PATTERNS.compile_all([
+            r'[гГ]\.?\s*([А-ЯЁ][а-яё\-]+)',
+            r'город\s+([А-ЯЁ][а-яё\-]+)',
+        ])
+        self.spaces_regex = PATTERNS.compile(r'\s+')
+        self.capitalized_word_regex = PATTERNS.compile(r'^[А-ЯЁ][а-яё]+$')
+        self.name_word_regex = PATTERNS.compile(r'^[А-ЯЁA-Z][а-яёa-z]+$')
+        self.city_word_regex = PATTERNS.compile(r'^[А-ЯЁ][а-яё\-]+$')
+        self.position_junk_start_regex = PATTERNS.compile(r'^[\d\>\<\@\#\$\%]')
+        
         # Статистика
         self.stats = {
             'processed': 0,
@@ -83,7 +188,8 @@ class ContactProcessor:
             'high_confidence': 0,
             'low_confidence': 0,
             'successful_extractions': 0,
-            'failed_extractions': 0
+            'failed_extractions': 0,
+            'known_signatures': 0
         }
         
         logger.info("✅ ContactProcessor с улучшенными паттернами инициализирован")
@@ -136,17 +242,48 @@ class ContactProcessor:
             # Извлекаем подписи с улучшенной очисткой
             signature_blocks = self._extract_clean_signatures(email_body)
             
+            # Все блоки письма проходят NER одной пачкой
+            signature_blocks = [
+                block for block in signature_blocks
+                if isinstance(block, str) and len(block.strip()) > 15
+            ]
+            
+            # Известная подпись известного отправителя: контакты уже извлекались раньше.
+            # Порядок адресов задаёт вызывающий код (IMAPClient - From первым),
+            # поэтому отправитель одного письма одинаков от прогона к прогону
+            sender = truly_external_emails[0]
+            fingerprint = None
+            if self.signature_store is not None and signature_blocks:
+                fingerprint = signature_fingerprint(sender, signature_blocks, self.ner_extractor.profile)
+                known = self.signature_store.get(sender, fingerprint)
+                if known is not None:
+                    contacts = [
+                        replace(FullContactInfo(**fields),
+                                email_date=self._correct_email_time(email_date),
+                                email_subject=str(email_subject) if email_subject else "")
+                        for fields in known
+                    ]
+                    self.stats['known_signatures'] += 1
+                    self._update_quality_stats(contacts)
+                    return contacts
+            
+            ner_results = self.ner_extractor.extract_entities_batch(signature_blocks, return_exceptions=True)
+            
             # Обрабатываем каждый блок подписи
-            for signature_block in signature_blocks:
-                if isinstance(signature_block, str) and len(signature_block.strip()) > 15:
-                    contact = self._process_signature_block(
-                        signature_block, 
-                        truly_external_emails[0],  # 🔧 ИСПРАВЛЕНИЕ: Передаем первый email как строку
-                        email_subject, 
-                        email_date
-                    )
-                    if contact:
-                        contacts.append(contact)
+            for signature_block, ner_result in zip(signature_blocks, ner_results):
+                contact = self._process_signature_block(
+                    signature_block, 
+                    truly_external_emails[0],  # 🔧 ИСПРАВЛЕНИЕ: Передаем первый email как строку
+                    email_subject, 
+                    email_date,
+                    ner_result
+                )
+                if contact:
+                    contacts.append(contact)
+            
+            # Отпечаток запоминаем только для контактов из подписей: без них
+            # результат зависит от всего текста письма
+            from_signatures = bool(contacts)
             
             # Если подписи не найдены, пробуем из всего письма
             if not contacts:
@@ -164,15 +301,12 @@ class ContactProcessor:
             # Обновляем статистику и качество
             for contact in contacts:
                 contact.confidence_score, contact.issues = self._analyze_contact_quality(contact)
-                self.stats['processed'] += 1
-                
-                if contact.issues:
-                    self.stats['with_issues'] += 1
-                
-                if contact.confidence_score >= 0.5:
-                    self.stats['high_confidence'] += 1
-                else:
-                    self.stats['low_confidence'] += 1
+            self._update_quality_stats(contacts)
+            
+            if fingerprint is not None and from_signatures:
+                self.signature_store.put(sender, fingerprint, [
+                    asdict(replace(contact, email_date="", email_subject="")) for contact in contacts
+                ])
             
             return contacts
             
@@ -182,6 +316,21 @@ class ContactProcessor:
             return []
 
 
+    def _update_quality_stats(self, contacts: List[FullContactInfo]):
+        """Учитывает оценённые контакты в статистике обработки"""
+        
+        for contact in contacts:
+            self.stats['processed'] += 1
+            
+            if contact.issues:
+                self.stats['with_issues'] += 1
+            
+            if contact.confidence_score >= 0.5:
+                self.stats['high_confidence'] += 1
+            else:
+                self.stats['low_confidence'] += 1
+
+
     def _is_internal_email(self, email: str) -> bool:
         """УЛУЧШЕННАЯ проверка внутренних email"""
         if not email or not isinstance(email, str):
@@ -271,29 +420,24 @@ class ContactProcessor:
             
             # Проверяем критичные внутренние маркеры
             is_internal = False
-            for marker in self.critical_internal_markers:
-                if marker in line_lower:
-                    is_internal = True
-                    if self.debug:
-                        logger.debug(f"🚫 Отфильтрован маркер: {marker}")
-                    break
+            marker = self.internal_marker_matcher.find(line_lower)
+            if marker is not None:
+                is_internal = True
+                if self.debug:
+                    logger.debug(f"🚫 Отфильтрован маркер: {marker}")
             
             # Проверяем blacklist компаний
             if not is_internal:
-                for blacklist_item in self.company_blacklist:
-                    if blacklist_item in line_lower:
-                        is_internal = True
-                        if self.debug:
-                            logger.debug(f"🚫 Отфильтрован blacklist: {blacklist_item}")
-                        break
+                blacklist_item = self.company_blacklist_matcher.find(line_lower)
+                if blacklist_item is not None:
+                    is_internal = True
+                    if self.debug:
+                        logger.debug(f"🚫 Отфильтрован blacklist: {blacklist_item}")
             
             # Проверяем технические заголовки
             if not is_internal:
-                # Временные метки
-                if re.match(r'^\d{1,2}:\d{2}, \d{1,2} [а-я]+ \d{4}', line_lower):
-                    is_internal = True
-                # Заголовки писем
-                elif re.match(r'^(от кого|отправлено|subject|from|sent):', line_lower):
+                # Временные метки и заголовки писем
+                if any(regex.match(line_lower) for regex in self.header_line_regexes):
                     is_internal = True
                 # Цитирование
                 elif line_lower.startswith('>>>') or line_lower.startswith('>>'):
@@ -323,38 +467,18 @@ class ContactProcessor:
                 continue
             
             # Пропускаем заголовки цепочек
-            chain_headers = [
-                'от кого:', 'от:', 'from:', 'sent:', 'отправлено:',
-                'subject:', 'тема:', 'cc:', 'копия:', 'bcc:'
-            ]
-            
-            is_junk = False
-            for header in chain_headers:
-                if line_lower.startswith(header):
-                    is_junk = True
-                    break
+            is_junk = self.chain_header_matcher.find_prefix(line_lower) is not None
             
             # Пропускаем технические строки
             if not is_junk:
-                tech_patterns = [
-                    r'^\d{1,2}:\d{2}, \d{1,2}',  # Временные метки
-                    r'^\d{4}-\d{2}-\d{2}',       # Даты
-                    r'^on \d{1,2}/',             # "On 29/07/2025" 
-                    r'^в \d{1,2}:\d{2}',         # "В 10:15"
-                    r'^\d{2}\.\d{2}\.\d{4}.*пишет', # "28.07.2025 пишет"
-                ]
-                
-                for pattern in tech_patterns:
-                    if re.match(pattern, line_lower):
+                for regex in self.tech_line_regexes:
+                    if regex.match(line_lower):
                         is_junk = True
                         break
             
             # Пропускаем внутренние маркеры
             if not is_junk:
-                for marker in self.critical_internal_markers:
-                    if marker in line_lower:
-                        is_junk = True
-                        break
+                is_junk = self.internal_marker_matcher.contains_any(line_lower)
             
             if not is_junk:
                 clean_lines.append(line)
@@ -363,8 +487,12 @@ class ContactProcessor:
 
 
     def _process_signature_block(self, signature_block: str, external_email: str,
-                                subject: str, date: str) -> Optional[FullContactInfo]:
-        """УЛУЧШЕННАЯ обработка одного блока подписи"""
+                                subject: str, date: str, ner_result=None) -> Optional[FullContactInfo]:
+        """УЛУЧШЕННАЯ обработка одного блока подписи
+        
+        ner_result - готовый результат NER (из extract_entities_batch) или
+        исключение, которым закончилась его постобработка.
+        """
         
         try:
             # 🔧 ИСПРАВЛЕНИЕ: Строгая проверка типов данных
@@ -377,7 +505,10 @@ class ContactProcessor:
                 return None
             
             # Извлекаем данные с помощью NER
-            ner_result = self.ner_extractor.extract_entities(signature_block)
+            if ner_result is None:
+                ner_result = self.ner_extractor.extract_entities(signature_block)
+            elif isinstance(ner_result, Exception):
+                raise ner_result
             
             # Извлекаем данные с помощью парсера подписей
             signature_data = self.signature_parser.parse_signature(signature_block)
@@ -438,6 +569,7 @@ class ContactProcessor:
             contact.email_date = self._correct_email_time(date)
             contact.email_subject = str(subject) if subject else ""
             contact.source = "email_signature"
+            contact.intern_strings()
             
             # Строгая валидация
             if self._is_high_quality_contact(contact):
@@ -478,16 +610,9 @@ class ContactProcessor:
                     logger.debug(f"⚠️ Ошибка regex телефона: {e}")
         
         # Дополнительные паттерны для конкретных форматов из логов
-        additional_patterns = [
-            r'\+7-(\d{3})-(\d{3})-(\d{2})-(\d{2})',  # +7-913-399-32-72
-            r'8\s+\((\d{3,4})\)\s+(\d{3})-(\d{3})',  # 8 (3852) 291-295
-            r'\+7\s+\((\d{3})\)\s+(\d{3})\s+(\d{2})\s+(\d{2})\s+\((\d{2})\)', # +7 (495) 933 71 47 (48)
-            r'8\s+(\d{3})-(\d{3})-(\d{2})-(\d{2}),?\s*доб\.(\d+)', # 8 800-770-71-21, доб.1315
-        ]
-        
-        for pattern in additional_patterns:
+        for regex in self.additional_phone_regexes:
             try:
-                matches = re.findall(pattern, text)
+                matches = regex.findall(text)
                 for match in matches:
                     if isinstance(match, tuple):
                         # Форматируем телефон
@@ -518,7 +643,7 @@ class ContactProcessor:
             return ""
         
         # Убираем лишние пробелы
-        phone = re.sub(r'\s+', ' ', phone.strip())
+        phone = self.spaces_regex.sub(' ', phone.strip())
         
         # Проверяем, что это похоже на телефон
         if len(phone) < 7:
@@ -539,12 +664,12 @@ class ContactProcessor:
         # Ищем где заканчивается должность и начинается имя
         for i, word in enumerate(words):
             # Если слово начинается с заглавной буквы и похоже на имя
-            if (re.match(r'^[А-ЯЁ][а-яё]+$', word) and 
+            if (self.capitalized_word_regex.match(word) and 
                 i > 0 and 
                 len(word) > 3 and
                 word.lower() not in ['отдела', 'отделом', 'группы', 'департамента']):
                 # Проверяем следующее слово - если тоже имя, значит здесь начинается ФИО
-                if i + 1 < len(words) and re.match(r'^[А-ЯЁ][а-яё]+$', words[i + 1]):
+                if i + 1 < len(words) and self.capitalized_word_regex.match(words[i + 1]):
                     break
             cleaned_words.append(word)
         
@@ -570,15 +695,8 @@ class ContactProcessor:
                 break
         
         # Убираем суффиксы с ИНН, КПП и адресами
-        patterns_to_cut = [
-            r',\s*инн\s+\d+.*',
-            r',\s*кпп\s+\d+.*', 
-            r',\s*\d{6},.*',  # Почтовые индексы
-            r'\s*\d{6},.*'    # Почтовые индексы без запятой
-        ]
-        
-        for pattern in patterns_to_cut:
-            company = re.sub(pattern, '', company, flags=re.IGNORECASE)
+        for regex in self.company_cut_regexes:
+            company = regex.sub('', company)
         
         return company.strip()
 
@@ -597,19 +715,8 @@ class ContactProcessor:
             return False
         
         # Дополнительные проверки
-        invalid_patterns = [
-            'центр лабораторной',
-            'telegram:',
-            'subject:',
-            'от кого',
-            'компания',
-            'youtube',
-            'rutube'
-        ]
-        
-        for invalid in invalid_patterns:
-            if invalid in name_lower:
-                return False
+        if self.invalid_name_matcher.contains_any(name_lower):
+            return False
         
         # Проверяем, что это реальное ФИО
         words = name.split()
@@ -618,7 +725,7 @@ class ContactProcessor:
         
         # Каждое слово должно быть правильно капитализированным
         for word in words:
-            if not re.match(r'^[А-ЯЁA-Z][а-яёa-z]+$', word):
+            if not self.name_word_regex.match(word):
                 return False
         
         return True
@@ -632,22 +739,11 @@ class ContactProcessor:
         position_lower = position.lower()
         
         # Исключаем явно неправильные должности
-        invalid_indicators = [
-            'subject:',
-            'от кого',
-            'telegram:',
-            'отправлено',
-            'youtube',
-            'rutube',
-            'при запросе на счет'
-        ]
-        
-        for invalid in invalid_indicators:
-            if invalid in position_lower:
-                return False
+        if self.invalid_position_matcher.contains_any(position_lower):
+            return False
         
         # Проверяем, что должность не начинается с цифр или технических символов
-        if re.match(r'^[\d\>\<\@\#\$\%]', position_lower):
+        if self.position_junk_start_regex.match(position_lower):
             return False
         
         return True
@@ -661,11 +757,11 @@ class ContactProcessor:
         company_lower = company.lower()
         
         # Проверяем blacklist компаний из файла
-        for blacklist_item in self.company_blacklist:
-            if blacklist_item in company_lower:
-                if self.debug:
-                    logger.debug(f"🚫 Компания в blacklist: {blacklist_item}")
-                return False
+        blacklist_item = self.company_blacklist_matcher.find(company_lower)
+        if blacklist_item is not None:
+            if self.debug:
+                logger.debug(f"🚫 Компания в blacklist: {blacklist_item}")
+            return False
         
         return True
 
@@ -678,24 +774,8 @@ class ContactProcessor:
         address_lower = address.lower()
         
         # Исключаем мусорные данные в адресах
-        junk_indicators = [
-            '>>>',
-            'от кого:',
-            'subject:',
-            'отправлено:',
-            'оплату №',
-            'содержат конфиденциальную',
-            'настоящим уведомляем',
-            'в марте выставляли',
-            'прошу вас',
-            'закупка планируется',
-            'кп я только что',
-            '19:00, 18 июня 2025'
-        ]
-        
-        for junk in junk_indicators:
-            if junk in address_lower:
-                return False
+        if self.junk_address_matcher.contains_any(address_lower):
+            return False
         
         return True
 
@@ -706,13 +786,8 @@ class ContactProcessor:
         if not address or not isinstance(address, str):
             return ""
         
-        city_patterns = [
-            r'[гГ]\.?\s*([А-ЯЁ][а-яё\-]+)',
-            r'город\s+([А-ЯЁ][а-яё\-]+)',
-        ]
-        
-        for pattern in city_patterns:
-            match = re.search(pattern, address)
+        for regex in self.city_regexes:
+            match = regex.search(address)
             if match:
                 city = match.group(1)
                 # Дополнительная валидация
@@ -725,7 +800,7 @@ class ContactProcessor:
             first_part = parts[0].strip()
             words = first_part.split()
             for word in words:
-                if (re.match(r'^[А-ЯЁ][а-яё\-]+$', word) and 
+                if (self.city_word_regex.match(word) and 
                     len(word) > 3 and 
                     word.lower() not in ['просим', 'настоящим', 'содержат', 'заказчик']):
                     return word
@@ -814,67 +889,75 @@ class ContactProcessor:
 
 
     def deduplicate_contacts(self, contacts: List[FullContactInfo]) -> List[FullContactInfo]:
-        """ИСПРАВЛЕННАЯ дедупликация контактов"""
+        """ИСПРАВЛЕННАЯ дедупликация контактов
+        
+        Ключ - нормализованные email и ФИО. Индекс ключ → позиция в результате
+        находит дубль за O(1); дубль объединяется с уже найденным контактом
+        (см. _merge_contacts), порядок первых появлений сохраняется.
+        """
         
         if not contacts:
             return contacts
         
         unique_contacts = []
-        seen_keys = set()
+        slots: Dict[tuple, int] = {}
         
         for contact in contacts:
-            # Создаём более строгий ключ дедупликации
-            key_parts = []
-            
-            # Основной ключ - email (нормализованный)
-            if contact.email:
-                email_normalized = contact.email.lower().strip()
-                key_parts.append(f"email:{email_normalized}")
-            
-            # Дополнительный ключ - ФИО (нормализованное)
-            if contact.fio:
-                fio_normalized = re.sub(r'\s+', ' ', contact.fio.lower().strip())
-                key_parts.append(f"fio:{fio_normalized}")
-            
-            # Если есть ключевые данные
-            if key_parts:
-                key = '|'.join(sorted(key_parts))  # Сортируем для консистентности
-                
-                if key not in seen_keys:
-                    unique_contacts.append(contact)
-                    seen_keys.add(key)
-                    if self.debug:
-                        logger.debug(f"✅ Добавлен уникальный контакт: {contact.fio or contact.email}")
-                else:
-                    # Если дубль найден, выбираем лучший по качеству
-                    existing_idx = None
-                    for idx, existing in enumerate(unique_contacts):
-                        existing_key_parts = []
-                        if existing.email:
-                            existing_key_parts.append(f"email:{existing.email.lower().strip()}")
-                        if existing.fio:
-                            existing_key_parts.append(f"fio:{re.sub(r's+', ' ', existing.fio.lower().strip())}")
-                        
-                        if key_parts and '|'.join(sorted(existing_key_parts)) == key:
-                            existing_idx = idx
-                            break
-                    
-                    if existing_idx is not None and contact.confidence_score > unique_contacts[existing_idx].confidence_score:
-                        if self.debug:
-                            logger.debug(f"🔄 Заменен контакт на лучший: {contact.fio or contact.email}")
-                        unique_contacts[existing_idx] = contact
-                    else:
-                        if self.debug:
-                            logger.debug(f"🗑️ Отброшен дубль: {contact.fio or contact.email}")
-            else:
-                # Если нет ключевых данных, добавляем как есть
+            key = dedup_key(contact)
+            
+            # Если нет ключевых данных, добавляем как есть
+            if key is None:
                 unique_contacts.append(contact)
+                continue
+            
+            slot = slots.get(key)
+            if slot is None:
+                slots[key] = len(unique_contacts)
+                unique_contacts.append(contact)
+                if self.debug:
+                    logger.debug(f"✅ Добавлен уникальный контакт: {contact.fio or contact.email}")
+            else:
+                unique_contacts[slot] = self._merge_contacts(unique_contacts[slot], contact)
         
         if self.debug and len(contacts) != len(unique_contacts):
             logger.debug(f"🗑️ Итого дедупликация: {len(contacts)} → {len(unique_contacts)}")
         
         return unique_contacts
 
+    def _merge_contacts(self, existing: FullContactInfo, duplicate: FullContactInfo) -> FullContactInfo:
+        """Объединяет дубль с найденным ранее контактом
+        
+        Основой остаётся контакт с большей уверенностью (при равной - ранний),
+        пустые поля заполняются из второго, телефоны объединяются.
+        Исходные объекты не меняются.
+        """
+        
+        if duplicate.confidence_score > existing.confidence_score:
+            best, other = duplicate, existing
+            if self.debug:
+                logger.debug(f"🔄 Заменен контакт на лучший: {duplicate.fio or duplicate.email}")
+        else:
+            best, other = existing, duplicate
+            if self.debug:
+                logger.debug(f"🗑️ Отброшен дубль: {duplicate.fio or duplicate.email}")
+        
+        updates = {
+            name: getattr(other, name)
+            for name in ('position', 'company', 'address', 'city', 'inn')
+            if not getattr(best, name) and getattr(other, name)
+        }
+        
+        new_phones = [phone for phone in other.phones if phone not in best.phones]
+        if new_phones:
+            updates['phones'] = best.phones + new_phones
+        
+        if not updates:
+            return best
+        
+        merged = replace(best, **updates)
+        merged.confidence_score, merged.issues = self._analyze_contact_quality(merged)
+        return merged
+
 
     def get_processing_stats(self) -> Dict:
         """Возвращает статистику обработки"""
@@ -885,4 +968,32 @@ class ContactProcessor:
             stats['high_confidence_percent'] = round(stats['high_confidence'] / stats['processed'] * 100, 1)
             stats['issues_percent'] = round(stats['with_issues'] / stats['processed'] * 100, 1)
         
+        # Кэш NER (к счётчикам, перенесённым из воркеров пула, добавляются свои)
+        cache = self.ner_extractor.cache
+        if cache is not None:
+            stats['ner_cache_hits'] = stats.get('ner_cache_hits', 0) + cache.stats['hits']
+            stats['ner_cache_misses'] = stats.get('ner_cache_misses', 0) + cache.stats['misses']
+            lookups = stats['ner_cache_hits'] + stats['ner_cache_misses']
+            if lookups > 0:
+                stats['ner_cache_hit_percent'] = round(stats['ner_cache_hits'] / lookups * 100, 1)
+        
+        if self.signature_store is not None:
+            stats['signature_store_size'] = len(self.signature_store)
+        
         return stats
+
+    def get_counters(self) -> Dict[str, int]:
+        """Счётчики обработки (без процентов) - для сложения статистики воркеров"""
+        
+        counters = dict(self.stats)
+        cache = self.ner_extractor.cache
+        if cache is not None:
+            counters['ner_cache_hits'] = cache.stats['hits']
+            counters['ner_cache_misses'] = cache.stats['misses']
+        return counters
+
+    def save_caches(self):
+        """Сохраняет кэш NER на диск, если задан NER_CACHE_FILE"""
+        
+        if self.ner_extractor.cache is not None:
+            self.ner_extractor.cache.save()
@@ -0,0 +1,306 @@
+import os
+import json
+import time
+import logging
+import sqlite3
+import threading
+from dataclasses import fields, replace
+from datetime import datetime
+from itertools import islice
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from contact_processor import FullContactInfo, dedup_key
+
+logger = logging.getLogger(__name__)
+
+# Формат email_date после ContactProcessor._correct_email_time
+EMAIL_DATE_FORMAT = "%d.%m.%Y %H:%M"
+SEEN_FORMAT = "%Y-%m-%d %H:%M"
+
+# Сколько изменений копится до фиксации транзакции
+COMMIT_EVERY = 500
+
+CONTACT_COLUMNS = [f.name for f in fields(FullContactInfo)]
+JSON_COLUMNS = ('phones', 'issues')
+
+
+def seen_date(email_date: str) -> str:
+    """Дата письма в сортируемом виде (ГГГГ-ММ-ДД ЧЧ:ММ); без даты - текущее время"""
+    try:
+        return datetime.strptime(email_date, EMAIL_DATE_FORMAT).strftime(SEEN_FORMAT)
+    except (TypeError, ValueError):
+        return datetime.now().strftime(SEEN_FORMAT)
+
+
+class StoredContacts(Sequence):
+    """Контакты хранилища, изменённые после момента updated_since
+
+    Строки читаются из SQLite при каждом обходе и в памяти не копятся: len()
+    считается запросом COUNT, срез contacts[:5] читает только нужные строки.
+    """
+
+    def __init__(self, store: 'ContactStore', updated_since: Optional[float] = None):
+        self.store = store
+        self.updated_since = updated_since
+
+    def __len__(self) -> int:
+        return self.store.count(self.updated_since)
+
+    def __iter__(self) -> Iterator[FullContactInfo]:
+        return self.store.iter_contacts(self.updated_since)
+
+    def __getitem__(self, index: Union[int, slice]):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            return list(islice(iter(self), start, stop, step)) if step > 0 else list(self)[index]
+        if index < 0:
+            index += len(self)
+        for contact in islice(iter(self), index, index + 1):
+            return contact
+        raise IndexError(index)
+
+
+class ContactStore:
+    """Хранилище контактов в SQLite с upsert по нормализованным email и ФИО
+
+    Конвейер записывает контакты по мере обработки писем, вместо того чтобы
+    копить их в списке до конца прогона: память не растёт с длиной периода,
+    а повторные запуски дополняют уже найденное. Дубль объединяется с
+    сохранённым контактом функцией merge (по умолчанию - замена на новый),
+    для каждого контакта хранятся даты первого и последнего письма.
+    """
+
+    def __init__(self, filename: str, merge: Optional[Callable] = None):
+        self.filename = filename
+        self.merge = merge
+
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._db = sqlite3.connect(filename, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(f'''
+            CREATE TABLE IF NOT EXISTS contacts (
+                id INTEGER PRIMARY KEY,
+                email_key TEXT NOT NULL,
+                fio_key TEXT NOT NULL,
+                {', '.join(CONTACT_COLUMNS)},
+                first_seen TEXT NOT NULL,
+                last_seen TEXT NOT NULL,
+                seen_count INTEGER NOT NULL DEFAULT 1,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        self._db.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_contacts_key ON contacts (email_key, fio_key)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS idx_contacts_fio ON contacts (fio_key)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS idx_contacts_updated ON contacts (updated_at)')
+        self._db.commit()
+
+        # Контакты, обновлённые после этого момента, относятся к текущему прогону
+        self.session_started = time.time()
+        self.stats = {'inserted': 0, 'merged': 0}
+
+        logger.info(f"✅ Хранилище контактов: {filename} ({len(self)} контактов)")
+
+    @classmethod
+    def from_env(cls, merge: Optional[Callable] = None) -> Optional['ContactStore']:
+        """Хранилище по CONTACT_STORE_FILE; без файла контакты держатся в памяти"""
+        filename = os.environ.get('CONTACT_STORE_FILE')
+        if not filename:
+            return None
+        return cls(filename, merge)
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def count(self, updated_since: Optional[float] = None) -> int:
+        """Число контактов (updated_since - только изменённых после момента)"""
+        with self._lock:
+            if updated_since is None:
+                return self._db.execute('SELECT COUNT(*) FROM contacts').fetchone()[0]
+            return self._db.execute(
+                'SELECT COUNT(*) FROM contacts WHERE updated_at >= ?', (updated_since,)
+            ).fetchone()[0]
+
+    # Нормализованные email и ФИО - тот же ключ, что в ContactProcessor.deduplicate_contacts
+    contact_key = staticmethod(dedup_key)
+
+    @staticmethod
+    def _to_row(contact: FullContactInfo) -> List:
+        return [
+            json.dumps(getattr(contact, name), ensure_ascii=False) if name in JSON_COLUMNS else getattr(contact, name)
+            for name in CONTACT_COLUMNS
+        ]
+
+    @staticmethod
+    def _from_row(row) -> FullContactInfo:
+        values = dict(zip(CONTACT_COLUMNS, row))
+        for name in JSON_COLUMNS:
+            values[name] = json.loads(values[name]) if values[name] else []
+        values['confidence_score'] = float(values['confidence_score'] or 0)
+        return FullContactInfo(**values)
+
+    def upsert(self, contact: FullContactInfo) -> bool:
+        """Добавляет контакт или объединяет его с сохранённым; True - если контакт новый
+
+        Контакты без email и ФИО не сохраняются.
+        """
+
+        key = self.contact_key(contact)
+        if key is None:
+            return False
+
+        seen = seen_date(contact.email_date)
+        now = time.time()
+        columns = ', '.join(CONTACT_COLUMNS)
+
+        with self._lock:
+            row = self._db.execute(
+                f'SELECT id, first_seen, last_seen, {columns} FROM contacts WHERE email_key = ? AND fio_key = ?',
+                key
+            ).fetchone()
+
+            if row is None:
+                self._db.execute(
+                    f'INSERT INTO contacts (email_key, fio_key, {columns}, first_seen, last_seen, updated_at) '
+                    f'VALUES (?, ?, {", ".join("?" * len(CONTACT_COLUMNS))}, ?, ?, ?)',
+                    [*key, *self._to_row(contact), seen, seen, now]
+                )
+                self.stats['inserted'] += 1
+                inserted = True
+            else:
+                contact_id, first_seen, last_seen = row[:3]
+                existing = self._from_row(row[3:])
+                merged = self.merge(existing, contact) if self.merge else contact
+
+                # Дата и тема - последнего по времени письма
+                latest = contact if seen >= last_seen else existing
+                merged = replace(merged, email_date=latest.email_date, email_subject=latest.email_subject)
+
+                self._db.execute(
+                    f'UPDATE contacts SET {", ".join(f"{name} = ?" for name in CONTACT_COLUMNS)}, '
+                    f'first_seen = ?, last_seen = ?, seen_count = seen_count + 1, updated_at = ? WHERE id = ?',
+                    [*self._to_row(merged), min(first_seen, seen), max(last_seen, seen), now, contact_id]
+                )
+                self.stats['merged'] += 1
+                inserted = False
+
+            self._pending += 1
+            if self._pending >= COMMIT_EVERY:
+                self._db.commit()
+                self._pending = 0
+
+        return inserted
+
+    def upsert_many(self, contacts: List[FullContactInfo]) -> int:
+        """Сохраняет контакты письма; возвращает число новых"""
+        return sum(1 for contact in contacts if self.upsert(contact))
+
+    def commit(self):
+        with self._lock:
+            self._db.commit()
+            self._pending = 0
+
+    def iter_contacts(self, updated_since: Optional[float] = None) -> Iterator[FullContactInfo]:
+        """Контакты по порядку добавления (updated_since - только изменённые после момента)"""
+        for _, contact in self.iter_rows(updated_since):
+            yield contact
+
+    def iter_rows(self, updated_since: Optional[float] = None) -> Iterator[Tuple[int, FullContactInfo]]:
+        """(id строки, контакт) по порядку добавления - для merge_rows"""
+
+        query = f'SELECT id, {", ".join(CONTACT_COLUMNS)} FROM contacts'
+        params = []
+        if updated_since is not None:
+            query += ' WHERE updated_at >= ?'
+            params.append(updated_since)
+        query += ' ORDER BY id'
+
+        with self._lock:
+            rows = self._db.execute(query, params)
+            batch = rows.fetchmany(1000)
+        while batch:
+            for row in batch:
+                yield row[0], self._from_row(row[1:])
+            with self._lock:
+                batch = rows.fetchmany(1000)
+
+    def get_rows(self, row_ids: Sequence[int]) -> List[FullContactInfo]:
+        """Контакты строк row_ids в том же порядке"""
+
+        with self._lock:
+            rows = self._db.execute(
+                f'SELECT id, {", ".join(CONTACT_COLUMNS)} FROM contacts '
+                f'WHERE id IN ({", ".join("?" * len(row_ids))})', list(row_ids)
+            ).fetchall()
+        by_id = {row[0]: self._from_row(row[1:]) for row in rows}
+        return [by_id[row_id] for row_id in row_ids if row_id in by_id]
+
+    def merge_rows(self, row_ids: Sequence[int], contact: FullContactInfo):
+        """Заменяет строки row_ids одной строкой с контактом contact (нечёткие дубли)
+
+        Даты первого и последнего письма и число писем суммируются по
+        группе. Если ключ объединённого контакта уже занят строкой вне
+        группы, контакт объединяется с ней функцией merge.
+        """
+
+        key = self.contact_key(contact)
+        if key is None or not row_ids:
+            return
+
+        placeholders = ", ".join("?" * len(row_ids))
+        with self._lock:
+            first_seen, last_seen, seen_count = self._db.execute(
+                f'SELECT MIN(first_seen), MAX(last_seen), SUM(seen_count) FROM contacts WHERE id IN ({placeholders})',
+                list(row_ids)
+            ).fetchone()
+
+            columns = ', '.join(CONTACT_COLUMNS)
+            other = self._db.execute(
+                f'SELECT id, first_seen, last_seen, seen_count, {columns} FROM contacts '
+                f'WHERE email_key = ? AND fio_key = ? AND id NOT IN ({placeholders})',
+                [*key, *row_ids]
+            ).fetchone()
+
+            self._db.execute(f'DELETE FROM contacts WHERE id IN ({placeholders})', list(row_ids))
+
+            if other is None:
+                target_id = row_ids[0]
+            else:
+                target_id = other[0]
+                first_seen, last_seen = min(first_seen, other[1]), max(last_seen, other[2])
+                seen_count += other[3]
+                existing = self._from_row(other[4:])
+                contact = self.merge(existing, contact) if self.merge else contact
+                self._db.execute('DELETE FROM contacts WHERE id = ?', (target_id,))
+
+            self._db.execute(
+                f'INSERT INTO contacts (id, email_key, fio_key, {columns}, first_seen, last_seen, seen_count, updated_at) '
+                f'VALUES (?, ?, ?, {", ".join("?" * len(CONTACT_COLUMNS))}, ?, ?, ?, ?)',
+                [target_id, *key, *self._to_row(contact), first_seen, last_seen, seen_count, time.time()]
+            )
+            self._pending += 1
+
+    def seen_range(self, contact: FullContactInfo) -> Optional[tuple]:
+        """Даты первого и последнего письма контакта"""
+
+        key = self.contact_key(contact)
+        if key is None:
+            return None
+        with self._lock:
+            return self._db.execute(
+                'SELECT first_seen, last_seen FROM contacts WHERE email_key = ? AND fio_key = ?', key
+            ).fetchone()
+
+    def session_contacts(self) -> StoredContacts:
+        """Контакты, добавленные или обновлённые с момента открытия хранилища (читаются при обходе)"""
+        return StoredContacts(self, self.session_started)
+
+    def close(self):
+        with self._lock:
+            self._db.commit()
+            self._db.close()
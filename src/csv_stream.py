@@ -0,0 +1,124 @@
+import io
+import os
+import csv
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Тела писем в выгрузках бывают длиннее стандартного лимита csv (128 КБ)
+CSV_FIELD_SIZE_LIMIT = min(sys.maxsize, 2 ** 31 - 1)
+
+QUOTE = ord('"')
+
+
+def _read_record(f) -> Tuple[bytes, int]:
+    """Читает одну запись CSV в сыром виде (с переносами строк внутри кавычек)
+
+    Кавычки внутри поля удваиваются, поэтому запись заканчивается на первом
+    переводе строки при чётном числе кавычек. Байт 0x22 не встречается внутри
+    многобайтовых символов UTF-8, так что считать можно прямо по байтам.
+    Возвращает (байты записи, смещение её конца); пустые байты - конец файла.
+    """
+
+    lines = []
+    in_quotes = False
+
+    while True:
+        line = f.readline()
+        if not line:
+            break
+        lines.append(line)
+        if line.count(QUOTE) % 2:
+            in_quotes = not in_quotes
+        if not in_quotes:
+            break
+
+    return b''.join(lines), f.tell()
+
+
+def _parse_record(raw: bytes, encoding: str) -> List[str]:
+    text = raw.decode(encoding, errors='replace')
+    return next(csv.reader(io.StringIO(text, newline='')), [])
+
+
+def read_header(path: str, encoding: str = 'utf-8') -> Tuple[List[str], int]:
+    """Имена колонок и смещение первой записи данных"""
+    with open(path, 'rb') as f:
+        raw, offset = _read_record(f)
+    return _parse_record(raw.lstrip(b'\xef\xbb\xbf'), encoding), offset
+
+
+def iter_csv_records(path: str, start: int = 0, end: Optional[int] = None,
+                     encoding: str = 'utf-8') -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Построчно отдаёт записи CSV как (смещение записи, словарь), не загружая файл целиком
+
+    start - смещение начала записи (0 - с начала файла, иначе значение,
+    полученное от этого генератора или split_byte_ranges). Отдаются записи,
+    начинающиеся в диапазоне [start, end). В памяти одновременно только одна запись.
+    """
+
+    csv.field_size_limit(CSV_FIELD_SIZE_LIMIT)
+    fieldnames, data_start = read_header(path, encoding)
+
+    with open(path, 'rb') as f:
+        offset = max(start, data_start)
+        f.seek(offset)
+
+        while end is None or offset < end:
+            raw, next_offset = _read_record(f)
+            if not raw:
+                break
+
+            values = _parse_record(raw, encoding)
+            if values:
+                yield offset, dict(zip(fieldnames, values))
+
+            offset = next_offset
+
+
+def iter_csv_records_at(path: str, offsets: Iterable[int],
+                        encoding: str = 'utf-8') -> Iterator[Tuple[int, Dict[str, str]]]:
+    """Записи CSV по смещениям (из iter_csv_records) в заданном порядке
+
+    Файл открывается один раз; для перестановки записей (например, по дате)
+    в памяти держатся только смещения, а не сами записи.
+    """
+
+    csv.field_size_limit(CSV_FIELD_SIZE_LIMIT)
+    fieldnames, _ = read_header(path, encoding)
+
+    with open(path, 'rb') as f:
+        for offset in offsets:
+            f.seek(offset)
+            raw, _ = _read_record(f)
+            values = _parse_record(raw, encoding) if raw else []
+            if values:
+                yield offset, dict(zip(fieldnames, values))
+
+
+def split_byte_ranges(path: str, parts: int) -> List[Tuple[int, int]]:
+    """Делит файл на parts диапазонов байт по границам записей для параллельной обработки
+
+    Один проход по файлу без разбора полей: границы ищутся по чётности кавычек.
+    """
+
+    _, data_start = read_header(path)
+    size = os.path.getsize(path)
+    parts = max(1, parts)
+    targets = [data_start + (size - data_start) * i // parts for i in range(1, parts)]
+
+    boundaries = [data_start]
+    with open(path, 'rb') as f:
+        f.seek(data_start)
+        offset = data_start
+        for target in targets:
+            while offset < target:
+                raw, offset = _read_record(f)
+                if not raw:
+                    break
+            if offset > boundaries[-1]:
+                boundaries.append(offset)
+
+    if boundaries[-1] < size:
+        boundaries.append(size)
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
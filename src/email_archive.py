@@ -0,0 +1,307 @@
+import os
+import sys
+import logging
+from datetime import date, datetime, time, timezone
+from email.utils import parseaddr, parsedate_to_datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow нужен только для архивов Parquet
+    pa = pc = pq = None
+
+# Добавляем путь для импорта наших модулей
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from csv_stream import iter_csv_records, iter_csv_records_at
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_COMPRESSION = 'zstd'
+DEFAULT_ROW_GROUP_SIZE = 2000
+
+# Колонки, по которым можно отбирать письма без чтения тел
+FILTER_COLUMNS = ['sent_at', 'from_address']
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Для архивов Parquet нужен pyarrow: pip install -r requirements-parquet.txt")
+
+
+def archive_schema():
+    """Схема архива: поля CSV-выгрузки плюс разобранные дата и адрес отправителя"""
+    _require_pyarrow()
+    return pa.schema([
+        ('month', pa.string()),
+        ('date', pa.string()),
+        ('sent_at', pa.timestamp('s', tz='UTC')),
+        ('from', pa.string()),
+        ('from_address', pa.string()),
+        ('to', pa.string()),
+        ('subject', pa.string()),
+        ('char_count', pa.int32()),
+        ('body', pa.large_string()),
+    ])
+
+
+def _sent_at(date_header: str) -> Optional[datetime]:
+    try:
+        sent_at = parsedate_to_datetime(date_header)
+    except (TypeError, ValueError):
+        return None
+    if sent_at.tzinfo is None:
+        sent_at = sent_at.replace(tzinfo=timezone.utc)
+    return sent_at.astimezone(timezone.utc)
+
+
+def archive_row(record: Dict) -> Dict:
+    """Запись выгрузки (поля CSV_FIELDS) в строку архива"""
+    body = record.get('body') or ''
+    try:
+        char_count = int(record.get('char_count') or len(body))
+    except ValueError:
+        char_count = len(body)
+    return {
+        'month': record.get('month') or '',
+        'date': record.get('date') or '',
+        'sent_at': _sent_at(record.get('date') or ''),
+        'from': record.get('from') or '',
+        'from_address': parseaddr(record.get('from') or '')[1].lower(),
+        'to': record.get('to') or '',
+        'subject': record.get('subject') or '',
+        'char_count': char_count,
+        'body': body,
+    }
+
+
+class ArchiveWriter:
+    """Потоковая запись архива Parquet по группам строк
+
+    Каждая группа строк хранит min/max даты и отправителя, поэтому при
+    чтении с фильтром неподходящие группы пропускаются целиком.
+    """
+
+    def __init__(self, path: str, compression: str = DEFAULT_COMPRESSION,
+                 row_group_size: int = DEFAULT_ROW_GROUP_SIZE):
+        _require_pyarrow()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.row_group_size = row_group_size
+        self.rows_written = 0
+        self._schema = archive_schema()
+        self._buffer: List[Dict] = []
+        self._writer = pq.ParquetWriter(path, self._schema, compression=compression, write_statistics=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write(self, record: Dict):
+        self._buffer.append(archive_row(record))
+        if len(self._buffer) >= self.row_group_size:
+            self._flush()
+
+    def write_many(self, records: Iterable[Dict]):
+        for record in records:
+            self.write(record)
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        table = pa.Table.from_pylist(self._buffer, schema=self._schema)
+        self._writer.write_table(table, row_group_size=self.row_group_size)
+        self.rows_written += len(self._buffer)
+        self._buffer = []
+
+    def close(self):
+        if self._writer is not None:
+            self._flush()
+            self._writer.close()
+            self._writer = None
+
+
+def write_archive(records: Sequence[Dict], path: str, compression: str = DEFAULT_COMPRESSION,
+                  row_group_size: int = DEFAULT_ROW_GROUP_SIZE) -> str:
+    """Сохраняет записи писем в архив Parquet (по возрастанию даты - для точных статистик групп)"""
+
+    rows = sorted(records, key=lambda record: _sent_at(record.get('date') or '') or datetime.min.replace(tzinfo=timezone.utc))
+    with ArchiveWriter(path, compression, row_group_size) as writer:
+        writer.write_many(rows)
+    return path
+
+
+def convert_csv_to_archive(csv_path: str, path: Optional[str] = None,
+                           compression: str = DEFAULT_COMPRESSION,
+                           row_group_size: int = DEFAULT_ROW_GROUP_SIZE) -> str:
+    """Перекладывает CSV-выгрузку в архив Parquet, не загружая её целиком
+
+    Письма пишутся по возрастанию даты, как в write_archive: иначе диапазоны
+    дат групп строк перекрываются и отбор по дате не пропускает группы.
+    Первый проход собирает только даты и смещения записей, второй читает
+    записи по смещениям в отсортированном порядке.
+    """
+
+    path = path or os.path.splitext(csv_path)[0] + '.parquet'
+    oldest = datetime.min.replace(tzinfo=timezone.utc)
+    order = sorted(
+        (_sent_at(record.get('date') or '') or oldest, offset)
+        for offset, record in iter_csv_records(csv_path)
+    )
+
+    with ArchiveWriter(path, compression, row_group_size) as writer:
+        for _, record in iter_csv_records_at(csv_path, (offset for _, offset in order)):
+            writer.write(record)
+
+    logger.info(
+        f"🗜️ {csv_path} → {path}: {writer.rows_written} писем, "
+        f"{os.path.getsize(csv_path) / 1024 / 1024:.1f} МБ → {os.path.getsize(path) / 1024 / 1024:.1f} МБ"
+    )
+    return path
+
+
+def _as_utc(value, end_of_day: bool = False) -> Optional[datetime]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        # "2025-01-21" - целый день, "2025-01-21T10:00" - точный момент
+        value = date.fromisoformat(value) if len(value) == 10 else datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, time.max if end_of_day else time.min)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _row_group_may_match(stats: Dict, date_from: Optional[datetime], date_to: Optional[datetime],
+                         senders: Optional[set]) -> bool:
+    """Проверка по статистикам группы: можно ли пропустить её, не читая данные"""
+
+    sent_at = stats.get('sent_at')
+    if sent_at is not None and sent_at.has_min_max:
+        if date_from is not None and sent_at.max < date_from:
+            return False
+        if date_to is not None and sent_at.min > date_to:
+            return False
+
+    from_address = stats.get('from_address')
+    if senders and from_address is not None and from_address.has_min_max:
+        if all(sender < from_address.min or sender > from_address.max for sender in senders):
+            return False
+
+    return True
+
+
+def header_filter(date_from=None, date_to=None, senders: Optional[Iterable[str]] = None
+                  ) -> Optional[Callable[[str, str], bool]]:
+    """Отбор read_archive для писем вне архива: проверка по заголовкам Date и From
+
+    Возвращает None, если отбора нет. Как и в архиве, письмо без разборчивой
+    даты не проходит отбор по дате.
+    """
+
+    date_from = _as_utc(date_from)
+    date_to = _as_utc(date_to, end_of_day=True)
+    senders = {sender.lower() for sender in senders} if senders else None
+    if date_from is None and date_to is None and not senders:
+        return None
+
+    def matches(date_header: str, from_header: str) -> bool:
+        if date_from is not None or date_to is not None:
+            sent_at = _sent_at(date_header)
+            if sent_at is None:
+                return False
+            if date_from is not None and sent_at < date_from:
+                return False
+            if date_to is not None and sent_at > date_to:
+                return False
+        return not senders or parseaddr(from_header)[1].lower() in senders
+
+    return matches
+
+
+def read_archive(path: str, date_from=None, date_to=None, senders: Optional[Iterable[str]] = None,
+                 columns: Optional[List[str]] = None) -> Iterator[Dict]:
+    """Читает письма из архива с отбором по дате (включительно) и адресам отправителей
+
+    Группы строк отбрасываются по статистикам, внутри группы сначала читаются
+    только дата и отправитель; остальные колонки (и тела) - лишь для групп,
+    где нашлись подходящие строки.
+    """
+
+    _require_pyarrow()
+
+    date_from = _as_utc(date_from)
+    date_to = _as_utc(date_to, end_of_day=True)
+    senders = {sender.lower() for sender in senders} if senders else None
+
+    parquet_file = pq.ParquetFile(path)
+    column_names = parquet_file.schema_arrow.names
+    columns = columns or column_names
+    column_index = {name: i for i, name in enumerate(column_names)}
+
+    for group in range(parquet_file.num_row_groups):
+        metadata = parquet_file.metadata.row_group(group)
+        stats = {
+            name: metadata.column(column_index[name]).statistics
+            for name in FILTER_COLUMNS if name in column_index
+        }
+        if not _row_group_may_match(stats, date_from, date_to, senders):
+            continue
+
+        mask = None
+        if date_from is not None or date_to is not None or senders:
+            keys = parquet_file.read_row_group(group, columns=FILTER_COLUMNS)
+            conditions = []
+            if date_from is not None:
+                conditions.append(pc.greater_equal(keys['sent_at'], pa.scalar(date_from, keys['sent_at'].type)))
+            if date_to is not None:
+                conditions.append(pc.less_equal(keys['sent_at'], pa.scalar(date_to, keys['sent_at'].type)))
+            if senders:
+                conditions.append(pc.is_in(keys['from_address'], value_set=pa.array(sorted(senders))))
+
+            mask = conditions[0]
+            for condition in conditions[1:]:
+                mask = pc.and_(mask, condition)
+            mask = pc.fill_null(mask, False)
+            if not pc.any(mask).as_py():
+                continue
+
+        table = parquet_file.read_row_group(group, columns=columns)
+        if mask is not None:
+            table = table.filter(mask)
+
+        yield from table.to_pylist()
+
+
+def archive_info(path: str) -> Dict:
+    """Размер архива, число строк и групп строк"""
+    _require_pyarrow()
+    metadata = pq.ParquetFile(path).metadata
+    return {
+        'rows': metadata.num_rows,
+        'row_groups': metadata.num_row_groups,
+        'size_bytes': os.path.getsize(path),
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Перекладывает CSV-выгрузки писем в архивы Parquet")
+    parser.add_argument('csv_files', nargs='+', help='Файлы emails_*.csv')
+    parser.add_argument('--compression', default=DEFAULT_COMPRESSION, help='Кодек сжатия (zstd, snappy, gzip)')
+    parser.add_argument('--row-group-size', type=int, default=DEFAULT_ROW_GROUP_SIZE, help='Писем в группе строк')
+    args = parser.parse_args()
+
+    for csv_file in args.csv_files:
+        convert_csv_to_archive(csv_file, compression=args.compression, row_group_size=args.row_group_size)
@@ -0,0 +1,237 @@
+import os
+import sys
+import stat
+import logging
+import tempfile
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Добавляем путь для импорта наших модулей
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from openpyxl import Workbook, load_workbook
+from openpyxl.utils import get_column_letter
+
+from contact_processor import FullContactInfo
+from contact_store import ContactStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EXCEL_FILE = 'data/contacts.xlsx'
+DEFAULT_SHEET = 'Контакты'
+
+# Поле FullContactInfo, заголовок столбца и его ширина
+EXCEL_COLUMNS = [
+    ('fio', 'ФИО', 35),
+    ('position', 'Должность', 30),
+    ('company', 'Компания', 35),
+    ('email', 'Email', 30),
+    ('phones', 'Телефоны', 35),
+    ('address', 'Адрес', 40),
+    ('city', 'Город', 18),
+    ('inn', 'ИНН', 14),
+    ('confidence_score', 'Уверенность', 12),
+    ('issues', 'Замечания', 30),
+    ('source', 'Источник', 16),
+    ('email_date', 'Дата письма', 17),
+    ('email_subject', 'Тема письма', 40),
+]
+LIST_FIELDS = ('phones', 'issues')
+LIST_SEPARATOR = '; '
+
+
+def contact_to_row(contact: FullContactInfo) -> List:
+    row = []
+    for name, _, _ in EXCEL_COLUMNS:
+        value = getattr(contact, name)
+        row.append(LIST_SEPARATOR.join(value) if name in LIST_FIELDS else value)
+    return row
+
+
+def contact_values(contact: FullContactInfo) -> Tuple:
+    """Все значения контакта в том виде, в каком они читаются из книги (для сравнения строк)"""
+    headers = [header for _, header, _ in EXCEL_COLUMNS]
+    return tuple(contact_to_row(contact_from_values(dict(zip(headers, contact_to_row(contact))))))
+
+
+def contact_from_values(values: Dict) -> FullContactInfo:
+    """Контакт из значений строки листа по заголовкам (пустые ячейки - пустые поля)"""
+
+    fields = {}
+    for name, header, _ in EXCEL_COLUMNS:
+        value = values.get(header)
+        if name in LIST_FIELDS:
+            fields[name] = [item.strip() for item in str(value).split(';') if item.strip()] if value else []
+        elif name == 'confidence_score':
+            try:
+                fields[name] = float(value or 0)
+            except (TypeError, ValueError):
+                fields[name] = 0.0
+        else:
+            fields[name] = '' if value is None else str(value)
+    return FullContactInfo(**fields)
+
+
+class ExcelExporter:
+    """Выгрузка контактов в Excel потоком, с объединением с уже существующей книгой
+
+    Книга пишется в режиме write_only openpyxl: строки сразу уходят в файл,
+    и память не зависит от числа строк. Существующая книга читается в
+    режиме read_only построчно; строка, чей ключ (email и ФИО, как в
+    ContactStore) совпал с выгружаемым контактом, объединяется с ним
+    функцией merge (по умолчанию новый контакт заменяет строку), остальные
+    переписываются как есть. Новые контакты дописываются в конец. В памяти
+    держится только индекс выгружаемых контактов - не содержимое книги.
+
+    Столбцы книги, которых нет в EXCEL_COLUMNS, и другие листы сохраняются
+    (только значения, без оформления).
+    """
+
+    def __init__(self, filename: str = DEFAULT_EXCEL_FILE, sheet_name: str = DEFAULT_SHEET,
+                 merge: Optional[Callable] = None):
+        self.filename = filename
+        self.sheet_name = sheet_name
+        self.merge = merge
+        self.stats = {'kept': 0, 'merged': 0, 'added': 0}
+
+    def _has_workbook(self) -> bool:
+        # Пустой файл-заготовка (как data/contacts.xlsx в репозитории) считается отсутствующим
+        return os.path.exists(self.filename) and os.path.getsize(self.filename) > 0
+
+    def _file_mode(self) -> int:
+        """Права книги: как у заменяемого файла, для новой - по umask (mkstemp создаёт 0600)"""
+        if os.path.exists(self.filename):
+            return stat.S_IMODE(os.stat(self.filename).st_mode)
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+    def _new_sheet(self, workbook: Workbook, extra_headers: List[str]):
+        sheet = workbook.create_sheet(self.sheet_name)
+        for index, (_, _, width) in enumerate(EXCEL_COLUMNS, 1):
+            sheet.column_dimensions[get_column_letter(index)].width = width
+        sheet.append([header for _, header, _ in EXCEL_COLUMNS] + extra_headers)
+        return sheet
+
+    def export(self, contacts: Iterable[FullContactInfo], merge_existing: bool = True) -> Dict[str, int]:
+        """Записывает контакты в книгу; merge_existing=False - книга создаётся заново
+
+        Без существующей книги контакты пишутся прямо из итератора (например,
+        ContactStore.iter_contacts) и в памяти не накапливаются.
+        """
+
+        self.stats = {'kept': 0, 'merged': 0, 'added': 0}
+
+        directory = os.path.dirname(self.filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Пишем во временный файл рядом и подменяем книгу целиком: при сбое старая книга цела
+        handle, temp_filename = tempfile.mkstemp(suffix='.xlsx', dir=directory or '.')
+        os.close(handle)
+
+        try:
+            workbook = Workbook(write_only=True)
+            if merge_existing and self._has_workbook():
+                self._merge_into(workbook, contacts)
+            else:
+                sheet = self._new_sheet(workbook, [])
+                for contact in contacts:
+                    sheet.append(contact_to_row(contact))
+                    self.stats['added'] += 1
+            workbook.save(temp_filename)
+            os.chmod(temp_filename, self._file_mode())
+            os.replace(temp_filename, self.filename)
+        except Exception:
+            if os.path.exists(temp_filename):
+                os.remove(temp_filename)
+            raise
+
+        logger.info(
+            f"📗 Excel {self.filename}: {self.stats['added']} новых, {self.stats['merged']} объединено, "
+            f"{self.stats['kept']} без изменений"
+        )
+        return self.stats
+
+    def _index_contacts(self, contacts: Iterable[FullContactInfo]
+                        ) -> Tuple[Dict[Tuple, FullContactInfo], Dict[Tuple, FullContactInfo]]:
+        """Выгружаемые контакты по ключу (дубли сразу объединяются) и контакты без ключа
+
+        Контакт без email и ФИО не с чем объединить: он индексируется по всем
+        значениям (contact_values) и дописывается как есть, если такой строки
+        в книге ещё нет, - повторные выгрузки его не размножают.
+        """
+
+        index: Dict[Tuple, FullContactInfo] = {}
+        keyless: Dict[Tuple, FullContactInfo] = {}
+        for contact in contacts:
+            key = ContactStore.contact_key(contact)
+            if key is None:
+                keyless.setdefault(contact_values(contact), contact)
+                continue
+            existing = index.get(key)
+            index[key] = self.merge(existing, contact) if existing is not None and self.merge else contact
+        return index, keyless
+
+    def _merge_into(self, workbook: Workbook, contacts: Iterable[FullContactInfo]):
+        pending, keyless = self._index_contacts(contacts)
+        source = load_workbook(self.filename, read_only=True)
+
+        try:
+            sheet = None
+            for worksheet in source.worksheets:
+                if worksheet.title == self.sheet_name:
+                    sheet = self._merge_sheet(workbook, worksheet, pending, keyless)
+                else:
+                    copy = workbook.create_sheet(worksheet.title)
+                    for row in worksheet.iter_rows(values_only=True):
+                        copy.append(row)
+
+            if sheet is None:
+                sheet = self._new_sheet(workbook, [])
+        finally:
+            source.close()
+
+        # Контакты, которых в книге не было, - в конец листа
+        for contact in list(pending.values()) + list(keyless.values()):
+            sheet.append(contact_to_row(contact))
+            self.stats['added'] += 1
+
+    def _merge_sheet(self, workbook: Workbook, worksheet, pending: Dict[Tuple, FullContactInfo],
+                     keyless: Dict[Tuple, FullContactInfo]):
+        rows = worksheet.iter_rows(values_only=True)
+        headers = [str(value) if value is not None else '' for value in next(rows, ())]
+        known = {header for _, header, _ in EXCEL_COLUMNS}
+        extra = [(position, header) for position, header in enumerate(headers) if header not in known]
+
+        sheet = self._new_sheet(workbook, [header for _, header in extra])
+        for row in rows:
+            if not any(value is not None for value in row):
+                continue
+            values = dict(zip(headers, row))
+            existing = contact_from_values(values)
+            extra_values = [row[position] if position < len(row) else None for position, _ in extra]
+
+            key = ContactStore.contact_key(existing)
+            if key is None:
+                # Та же строка без ключа уже есть в книге - второй раз не дописываем
+                keyless.pop(tuple(contact_to_row(existing)), None)
+                contact = None
+            else:
+                contact = pending.pop(key, None)
+            if contact is None:
+                # Строку без совпадений переписываем значениями как есть, без разбора
+                self.stats['kept'] += 1
+                sheet.append([values.get(header) for _, header, _ in EXCEL_COLUMNS] + extra_values)
+                continue
+
+            self.stats['merged'] += 1
+            contact = self.merge(existing, contact) if self.merge else contact
+            sheet.append(contact_to_row(contact) + extra_values)
+
+        return sheet
+
+
+def export_contacts(contacts: Iterable[FullContactInfo], filename: str = DEFAULT_EXCEL_FILE,
+                    merge: Optional[Callable] = None, merge_existing: bool = True) -> Dict[str, int]:
+    """Выгрузка контактов в Excel с объединением с существующей книгой"""
+    return ExcelExporter(filename, merge=merge).export(contacts, merge_existing=merge_existing)
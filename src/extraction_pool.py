@@ -0,0 +1,134 @@
+import os
+import sys
+import logging
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Добавляем путь для импорта наших модулей
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+logger = logging.getLogger(__name__)
+
+# Сколько заданий на одного воркера может ждать в очереди
+DEFAULT_QUEUE_PER_WORKER = 4
+
+# ContactProcessor рабочего процесса (создаётся один раз в инициализаторе)
+_processor = None
+
+
+def _init_worker(debug: bool, profile: Optional[str]):
+    """Инициализатор процесса: один ContactProcessor на воркер"""
+    global _processor
+    from contact_processor import ContactProcessor
+    _processor = ContactProcessor(debug=debug, ner_profile=profile)
+
+
+def _ready() -> bool:
+    """Пустое задание: дожидается запуска воркера"""
+    return True
+
+
+def _extract(job: Tuple[str, str, str, List[str]]):
+    """Извлекает контакты из одного письма
+
+    Возвращает контакты, прирост статистики процессора и новые записи кэша
+    NER: кэш воркера на диск не сохраняется, его пополняет родитель.
+    """
+
+    email_body, subject, date_str, external_emails = job
+    before = _processor.get_counters()
+    contacts = _processor.process_email_signature(email_body, subject, date_str, external_emails)
+    delta = {key: value - before.get(key, 0) for key, value in _processor.get_counters().items()}
+    cache = _processor.ner_extractor.cache
+    return contacts, delta, cache.drain_new() if cache is not None else {}
+
+
+class ExtractionPool:
+    """Пул процессов для извлечения контактов (NER) параллельно с загрузкой писем
+
+    Каждый процесс держит свой ContactProcessor. Очередь заданий ограничена
+    queue_size: загрузчик ждёт, пока воркеры не разберут накопившиеся письма,
+    так что в памяти не копятся тела всего периода. Новые записи кэша NER
+    воркеров переносятся в cache (кэш родительского процесса), который
+    сохраняется на диск вместе с остальными кэшами.
+    """
+
+    def __init__(self, workers: int, queue_size: Optional[int] = None, debug: bool = False,
+                 preload: bool = True, profile: Optional[str] = None, cache=None):
+        self.workers = max(1, workers)
+        self.cache = cache
+        self.queue_size = queue_size or self.workers * DEFAULT_QUEUE_PER_WORKER
+        self.debug = debug
+        self.preload = preload
+        self.profile = profile
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self, spawn: bool = False):
+        """Создаёт пул; spawn=True сразу запускает процессы воркеров
+
+        ProcessPoolExecutor создаёт процессы только при первом submit. Если к
+        тому времени в родителе уже работают потоки, fork унаследует их
+        блокировки, поэтому такой код запускает воркеры заранее.
+        """
+        if self._executor is None:
+            if self.preload:
+                # При fork воркеры унаследуют уже загруженные модели
+                from natasha_models import preload_for_workers
+                preload_for_workers(self.profile)
+            logger.info(f"🧵 Запускаю {self.workers} процессов извлечения контактов...")
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.debug, self.profile),
+            )
+            if spawn:
+                for future in [self._executor.submit(_ready) for _ in range(self.workers)]:
+                    future.result()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def imap(self, jobs: Iterable[Tuple[object, Tuple[str, str, str, List[str]]]]
+             ) -> Iterator[Tuple[object, List, Dict[str, int]]]:
+        """Обрабатывает задания (ключ, (тело, тема, дата, внешние адреса)) в порядке поступления
+
+        Отдаёт (ключ, контакты, прирост статистики). Новые задания берутся из
+        jobs, только пока в очереди меньше queue_size незавершённых.
+        """
+
+        pending = deque()
+
+        for key, job in jobs:
+            pending.append((key, self.submit(job)))
+            while len(pending) >= self.queue_size:
+                yield self.result(*pending.popleft())
+
+        while pending:
+            yield self.result(*pending.popleft())
+
+    def submit(self, job: Tuple[str, str, str, List[str]]) -> Future:
+        """Отправляет одно задание воркерам; очередь ограничивает вызывающий код (см. imap)"""
+        self.start()
+        return self._executor.submit(_extract, job)
+
+    def result(self, key, future: Future) -> Tuple[object, List, Dict[str, int]]:
+        """(ключ, контакты, прирост статистики) завершённого задания; записи кэша NER - в cache"""
+        try:
+            contacts, delta, cache_entries = future.result()
+        except Exception as e:
+            logger.error(f"❌ Ошибка воркера извлечения: {e}")
+            # Неудачу засчитает вызывающий код (контактов нет), как и без пула
+            return key, [], {}
+        if cache_entries and self.cache is not None:
+            self.cache.update(cache_entries)
+        return key, contacts, delta
@@ -0,0 +1,252 @@
+import re
+import base64
+import binascii
+import quopri
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Лексемы ответа FETCH: скобки, строки в кавычках и атомы (NIL, числа, имена)
+TOKEN_RE = re.compile(rb'\s*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|([^\s()"]+))')
+
+# Начало ответа по новому письму: "12 (UID 345 ..."
+MESSAGE_START_RE = re.compile(rb'^\d+ \(')
+
+# Имя элемента с литералом в конце заголовка: "BODY[1.2] {1024}"
+LITERAL_ITEM_RE = re.compile(rb'(BODY\[[^\]]*\](?:<\d+>)?|RFC822(?:\.\w+)?) \{\d+\}$')
+LITERAL_SIZE_RE = re.compile(rb'\{\d+\}$')
+UID_RE = re.compile(rb'UID (\d+)')
+
+BODYSTRUCTURE_ITEMS = '(UID BODYSTRUCTURE)'
+
+
+@dataclass
+class TextPart:
+    """Текстовая часть письма из BODYSTRUCTURE"""
+    section: str
+    subtype: str
+    charset: str = 'utf-8'
+    encoding: str = '7bit'
+    size: int = 0
+    is_attachment: bool = False
+
+
+def _group_by_message(fetch_data) -> List[list]:
+    """Группирует фрагменты ответа imaplib по письмам
+
+    Каждое письмо - список из bytes (текст ответа) и кортежей ('literal', bytes).
+    """
+
+    messages = []
+
+    for item in fetch_data or []:
+        if isinstance(item, tuple):
+            head, literal = item
+            if MESSAGE_START_RE.match(head) or not messages:
+                messages.append([])
+            messages[-1].append(head)
+            messages[-1].append(('literal', literal))
+        elif isinstance(item, bytes):
+            if MESSAGE_START_RE.match(item) or not messages:
+                messages.append([])
+            messages[-1].append(item)
+
+    return messages
+
+
+def _parse_sexp(pieces: list) -> list:
+    """Разбирает S-выражение IMAP в вложенные списки (NIL -> None)"""
+
+    root = []
+    stack = [root]
+
+    for piece in pieces:
+        if isinstance(piece, tuple):
+            stack[-1].append(piece[1].decode('utf-8', errors='replace'))
+            continue
+
+        # Маркер литерала {n} заменяется следующим за ним фрагментом
+        text = LITERAL_SIZE_RE.sub(b'', piece.rstrip())
+        pos = 0
+        while pos < len(text):
+            match = TOKEN_RE.match(text, pos)
+            if not match or match.end() == pos:
+                break
+            pos = match.end()
+
+            if match.group(1):
+                child = []
+                stack[-1].append(child)
+                stack.append(child)
+            elif match.group(2):
+                if len(stack) > 1:
+                    stack.pop()
+            elif match.group(3) is not None:
+                value = re.sub(rb'\\(.)', rb'\1', match.group(3))
+                stack[-1].append(value.decode('utf-8', errors='replace'))
+            else:
+                atom = match.group(4).decode('ascii', errors='replace')
+                stack[-1].append(None if atom.upper() == 'NIL' else atom)
+
+    return root
+
+
+def parse_bodystructure_response(fetch_data) -> Dict[int, list]:
+    """Разбирает ответ на UID FETCH (UID BODYSTRUCTURE): {uid: структура}"""
+
+    structures = {}
+
+    for pieces in _group_by_message(fetch_data):
+        parsed = _parse_sexp(pieces)
+        # Ожидаем: [номер, [UID, 5, BODYSTRUCTURE, (...)]]
+        items = next((p for p in parsed if isinstance(p, list)), [])
+        uid = structure = None
+        for name, value in zip(items[::2], items[1::2]):
+            name = str(name).upper()
+            if name == 'UID':
+                uid = int(value)
+            elif name in ('BODYSTRUCTURE', 'BODY') and isinstance(value, list):
+                structure = value
+        if uid is not None and structure is not None:
+            structures[uid] = structure
+
+    return structures
+
+
+def _params_dict(params) -> Dict[str, str]:
+    """Список параметров ("CHARSET" "UTF-8" ...) в словарь"""
+    if not isinstance(params, list):
+        return {}
+    return {
+        str(key).lower(): str(value)
+        for key, value in zip(params[::2], params[1::2])
+        if key is not None and value is not None
+    }
+
+
+def _is_attachment(disposition) -> bool:
+    return isinstance(disposition, list) and bool(disposition) and str(disposition[0]).lower() == 'attachment'
+
+
+def _collect_parts(structure: list, prefix: str, parts: List[TextPart]):
+    if structure and isinstance(structure[0], list):
+        # multipart: дочерние части, затем подтип и расширения
+        index = 0
+        for child in structure:
+            if not isinstance(child, list):
+                break
+            index += 1
+            section = f"{prefix}.{index}" if prefix else str(index)
+            if child and isinstance(child[0], list):
+                _collect_parts(child, section, parts)
+            else:
+                _collect_single(child, section, parts)
+    else:
+        _collect_single(structure, f"{prefix}.1" if prefix else '1', parts)
+
+
+def _collect_single(structure: list, section: str, parts: List[TextPart]):
+    if len(structure) < 7:
+        return
+
+    media_type = str(structure[0] or '').lower()
+    subtype = str(structure[1] or '').lower()
+
+    if media_type == 'message' and subtype == 'rfc822' and len(structure) > 8:
+        # Вложенное письмо: его части нумеруются от номера этой части
+        if isinstance(structure[8], list) and not _is_attachment(structure[11] if len(structure) > 11 else None):
+            _collect_parts(structure[8], section, parts)
+        return
+
+    if media_type != 'text' or subtype not in ('plain', 'html'):
+        return
+
+    params = _params_dict(structure[2])
+    try:
+        size = int(structure[6])
+    except (TypeError, ValueError):
+        size = 0
+
+    parts.append(TextPart(
+        section=section,
+        subtype=subtype,
+        charset=params.get('charset', 'utf-8'),
+        encoding=str(structure[5] or '7bit').lower(),
+        size=size,
+        # У text/* после размера идёт число строк, затем MD5 и Content-Disposition
+        is_attachment=_is_attachment(structure[9] if len(structure) > 9 else None),
+    ))
+
+
+def find_text_parts(structure: list) -> List[TextPart]:
+    """Возвращает все text/plain и text/html части письма в порядке следования"""
+    parts = []
+    if isinstance(structure, list) and structure:
+        _collect_parts(structure, '', parts)
+    return parts
+
+
+def choose_body_part(parts: List[TextPart]) -> Optional[TextPart]:
+    """Выбирает часть для тела письма: text/plain, иначе text/html (без вложений)"""
+    inline_parts = [part for part in parts if not part.is_attachment]
+    for subtype in ('plain', 'html'):
+        for part in inline_parts:
+            if part.subtype == subtype:
+                return part
+    return None
+
+
+def section_fetch_items(sections: List[str], with_header: bool = True) -> str:
+    """Формирует список элементов FETCH для загрузки выбранных частей без флага \\Seen"""
+    items = ['UID']
+    if with_header:
+        items.append('BODY.PEEK[HEADER]')
+    items.extend(f'BODY.PEEK[{section}]' for section in sections)
+    return '(' + ' '.join(items) + ')'
+
+
+def parse_fetch_literals(fetch_data) -> List[Dict[str, bytes]]:
+    """Разбирает ответ FETCH с несколькими литералами: [{'UID': b'5', 'BODY[HEADER]': ..., 'BODY[1]': ...}]"""
+
+    messages = []
+
+    for pieces in _group_by_message(fetch_data):
+        items = {}
+        last_item = None
+        for piece in pieces:
+            if isinstance(piece, tuple):
+                if last_item is not None:
+                    items[last_item] = piece[1]
+                last_item = None
+                continue
+
+            if 'UID' not in items:
+                match = UID_RE.search(piece)
+                if match:
+                    items['UID'] = match.group(1)
+
+            match = LITERAL_ITEM_RE.search(piece.rstrip())
+            last_item = match.group(1).decode('ascii') if match else None
+
+        messages.append(items)
+
+    return messages
+
+
+def decode_part(data: bytes, part: TextPart) -> str:
+    """Снимает Content-Transfer-Encoding и декодирует текст в кодировке части"""
+
+    if not data:
+        return ""
+
+    try:
+        if part.encoding == 'base64':
+            data = base64.b64decode(data)
+        elif part.encoding == 'quoted-printable':
+            data = quopri.decodestring(data)
+    except (binascii.Error, ValueError):
+        pass
+
+    try:
+        return data.decode(part.charset, errors='ignore')
+    except LookupError:
+        return data.decode('utf-8', errors='ignore')
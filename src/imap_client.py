@@ -3,13 +3,13 @@ import ssl
 import imaplib
 import email
 from email.header import decode_header, make_header
+from email.message import Message
 from email.utils import parsedate_to_datetime, getaddresses
 from dotenv import load_dotenv
-import socket
 from bs4 import BeautifulSoup
 import logging
 from datetime import datetime, date, timedelta
-from typing import List, Dict, Optional, Tuple
+from typing import Iterator, List, Dict, Optional, Sequence, Tuple
 import sys
 import re
 
@@ -17,6 +17,29 @@ import re
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from contact_processor import ContactProcessor, FullContactInfo
+from imap_fetch import (
+    DEFAULT_FETCH_BATCH_SIZE,
+    HEADER_PREFILTER_ITEMS,
+    compress_uid_set,
+    iter_uid_batches,
+    get_uidvalidity,
+    parse_fetch_response,
+)
+from imap_bodystructure import (
+    BODYSTRUCTURE_ITEMS,
+    choose_body_part,
+    decode_part,
+    find_text_parts,
+    parse_bodystructure_response,
+    parse_fetch_literals,
+    section_fetch_items,
+)
+from message_cache import MessageCache
+from contact_store import ContactStore
+from contact_matcher import ContactMatcher
+from extraction_pool import ExtractionPool
+from sync_state import SyncState
+from keyword_matcher import KEYWORDS
 
 # Настройка логирования для консоли
 logging.basicConfig(
@@ -26,31 +49,96 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# Стратегии загрузки писем
+FETCH_RFC822 = 'rfc822'
+FETCH_TEXT_PARTS = 'text_parts'
+
+# Таймаут сетевых операций IMAP, секунд
+IMAP_TIMEOUT = 180
+
+# Маркеры типа письма в теме и теле (см. _analyze_email_type)
+FORWARD_MARKERS = KEYWORDS.get(['fwd:', 'fw:', 'пересл:', 'переслано:'])
+REPLY_MARKERS = KEYWORDS.get(['re:', 'ответ:', 'отв:'])
+CHAIN_MARKERS = KEYWORDS.get([
+    'написал(а):',
+    'wrote:',
+    'от кого:',
+    'from:',
+    'отправлено:',
+    'sent:',
+    '-----original message-----',
+    '-----исходное сообщение-----'
+])
+
 class IMAPClient:
     """IMAP-клиент для извлечения высококачественных контактов из корпоративной почты"""
     
-    def __init__(self, debug: bool = False):
-        """Инициализация IMAP-клиента"""
+    def __init__(self, debug: bool = False, fetch_batch_size: Optional[int] = None,
+                 message_cache: Optional[MessageCache] = None, header_prefilter: bool = False,
+                 fetch_strategy: Optional[str] = None, extraction_workers: Optional[int] = None,
+                 contact_store: Optional[ContactStore] = None):
+        """Инициализация IMAP-клиента
         
-        self.debug = debug
-        self.contact_processor = ContactProcessor(debug=debug)
+        header_prefilter включает двухфазную загрузку: сначала заголовки адресатов,
+        затем тела только писем с внешними участниками. Письма, где внешний
+        адрес встречается лишь в подписи внутри тела, при этом пропускаются.
+        
+        fetch_strategy: 'rfc822' - письмо целиком (с кэшем), 'text_parts' - только
+        заголовок и текстовая часть по BODYSTRUCTURE, без вложений.
+        
+        extraction_workers > 1 выносит извлечение контактов (NER) в пул процессов,
+        который работает параллельно с загрузкой писем.
         
-        # Загружаем переменные окружения
+        contact_store (по умолчанию CONTACT_STORE_FILE из .env) - контакты сразу
+        записываются в SQLite с объединением дублей, а не копятся в памяти.
+        """
+        
+        # Загружаем переменные окружения до любого чтения настроек: от них зависят
+        # профиль NER, кэши ContactProcessor и стратегия загрузки
         load_dotenv()
         
+        self.debug = debug
+        self.header_prefilter = header_prefilter
+        self.fetch_strategy = fetch_strategy or os.environ.get("IMAP_FETCH_STRATEGY", FETCH_RFC822)
+        if self.fetch_strategy not in (FETCH_RFC822, FETCH_TEXT_PARTS):
+            raise ValueError(f"Неизвестная стратегия загрузки: {self.fetch_strategy}")
+        self.contact_processor = ContactProcessor(debug=debug)
+        
         # Настройки подключения из .env
         self.imap_server = os.environ.get("IMAP_SERVER")
         self.imap_port = int(os.environ.get("IMAP_PORT", 143))
         self.imap_user = os.environ.get("IMAP_USER")
         self.imap_password = os.environ.get("IMAP_PASSWORD")
         
+        # Размер пачки для UID FETCH (писем за одну команду)
+        self.fetch_batch_size = fetch_batch_size or int(
+            os.environ.get("IMAP_FETCH_BATCH_SIZE", DEFAULT_FETCH_BATCH_SIZE)
+        )
+        
+        # Число процессов извлечения контактов (0/1 - в основном процессе)
+        self.extraction_workers = extraction_workers if extraction_workers is not None else int(
+            os.environ.get("EXTRACTION_WORKERS", 0)
+        )
+        
+        # Папка и её UIDVALIDITY (UID имеют смысл только вместе с ними)
+        self.folder = "INBOX"
+        self.uidvalidity = None
+        
+        # Локальный кэш сырых писем (MESSAGE_CACHE_DIR в .env)
+        self.message_cache = message_cache if message_cache is not None else MessageCache.from_env()
+        
+        # Хранилище найденных контактов (CONTACT_STORE_FILE в .env)
+        self.contact_store = contact_store if contact_store is not None else ContactStore.from_env(
+            merge=self.contact_processor._merge_contacts
+        )
+        
+        # Поиск нечётких дублей ("Иванов И.И." и "Иванов Иван Иванович") - FUZZY_MATCH_THRESHOLD в .env
+        self.contact_matcher = ContactMatcher.from_env()
+        
         # Загружаем списки доменов и стоп-слов
         self.internal_domains = self._load_list_from_file('data/internal_domains.txt')
         self.blacklist_emails = self._load_list_from_file('data/blacklist.txt')
         
-        # Настройка таймаута
-        socket.setdefaulttimeout(180)
-        
         # Статистика обработки
         self.stats = {
             'total_emails': 0,
@@ -65,13 +153,16 @@ class IMAPClient:
             'failed_extractions': 0,
             'chain_emails': 0,
             'original_emails': 0,
-            'forwarded_emails': 0
+            'forwarded_emails': 0,
+            'header_prefiltered': 0,     # отброшено по заголовкам без загрузки тела
+            'bytes_fetched': 0           # загружено байт писем с сервера
         }
         
         logger.info("✅ IMAP-клиент инициализирован")
         if self.debug:
             logger.debug(f"🔌 Сервер: {self.imap_server}:{self.imap_port}")
             logger.debug(f"👤 Пользователь: {self.imap_user}")
+            logger.debug(f"📦 Размер пачки загрузки: {self.fetch_batch_size}")
 
     def _load_list_from_file(self, filename: str) -> set:
         """Загружает список из файла с обработкой ошибок"""
@@ -169,26 +260,15 @@ class IMAPClient:
         body_lower = email_body.lower()
         
         # Определяем пересланные письма
-        if any(marker in subject_lower for marker in ['fwd:', 'fw:', 'пересл:', 'переслано:']):
+        if FORWARD_MARKERS.contains_any(subject_lower):
             return 'forwarded'
         
         # Определяем ответы
-        if any(marker in subject_lower for marker in ['re:', 'ответ:', 'отв:']):
+        if REPLY_MARKERS.contains_any(subject_lower):
             return 'reply'
         
-        # Ищем маркеры цепочек в тексте
-        chain_markers = [
-            'написал(а):',
-            'wrote:',
-            'от кого:',
-            'from:',
-            'отправлено:',
-            'sent:',
-            '-----original message-----',
-            '-----исходное сообщение-----'
-        ]
-        
-        if any(marker in body_lower for marker in chain_markers):
+        # Ищем маркеры цепочек в тексте (тело письма длинное - один проход вместо прохода на маркер)
+        if CHAIN_MARKERS.contains_any(body_lower):
             return 'chain'
         
         return 'original'
@@ -211,29 +291,24 @@ class IMAPClient:
         else:
             self.stats['original_emails'] += 1
         
-        # Собираем участников из заголовков
-        external_emails = set()
+        # Собираем участников из заголовков. Словарь вместо множества: порядок
+        # не зависит от хэшей строк, первым идёт отправитель (From) - по нему
+        # ContactProcessor ищет известные подписи
+        external_emails = {}
         
         # Извлекаем участников из заголовков письма
-        header_participants = []
-        for header_name in ['From', 'To', 'Cc', 'Bcc']:
-            header_value = msg.get(header_name, '')
-            if header_value:
-                participants = getaddresses([header_value])
-                for name, email_addr in participants:
-                    if email_addr:
-                        header_participants.append(email_addr.lower())
+        header_participants = self._header_participants(msg)
         
         # СТРОГАЯ фильтрация только реально внешних участников
         for email_addr in header_participants:
             if not self._is_internal_email(email_addr):
-                external_emails.add(email_addr)
+                external_emails[email_addr] = None
         
         # Ищем email-адреса в тексте письма (только в подписях, не в заголовках)
         signature_emails = self._extract_signature_emails(email_body)
         for email_addr in signature_emails:
             if not self._is_internal_email(email_addr):
-                external_emails.add(email_addr)
+                external_emails[email_addr] = None
         
         result_emails = list(external_emails)
         
@@ -243,6 +318,20 @@ class IMAPClient:
         
         return len(result_emails) > 0, result_emails
 
+    def _header_participants(self, msg) -> List[str]:
+        """Собирает адреса участников из заголовков From/To/Cc/Bcc"""
+        
+        header_participants = []
+        for header_name in ['From', 'To', 'Cc', 'Bcc']:
+            header_value = msg.get(header_name, '')
+            if header_value:
+                participants = getaddresses([header_value])
+                for name, email_addr in participants:
+                    if email_addr:
+                        header_participants.append(email_addr.lower())
+        
+        return header_participants
+
     def _extract_signature_emails(self, email_body: str) -> List[str]:
         """Извлекает email только из подписей, исключая заголовки цепочек"""
         
@@ -291,8 +380,14 @@ class IMAPClient:
         
         return signature_emails
 
-    def process_emails(self, from_date: str, to_date: str) -> List[FullContactInfo]:
-        """ОСНОВНОЙ МЕТОД: Обработка писем с высоким качеством результатов"""
+    def process_emails(self, from_date: str, to_date: str,
+                       sync_state: Optional[SyncState] = None) -> Sequence[FullContactInfo]:
+        """ОСНОВНОЙ МЕТОД: Обработка писем с высоким качеством результатов
+        
+        Если передан sync_state и для папки есть действительная точка синхронизации,
+        обрабатываются только письма с UID новее неё; даты используются лишь
+        для первого запуска или после смены UIDVALIDITY.
+        """
         
         processed_contacts = []
         
@@ -300,127 +395,63 @@ class IMAPClient:
             # Подключение к IMAP-серверу
             logger.info(f"🔌 Подключаюсь к {self.imap_server}:{self.imap_port}...")
             
-            mailbox = imaplib.IMAP4(self.imap_server, self.imap_port)
+            mailbox = imaplib.IMAP4(self.imap_server, self.imap_port, timeout=IMAP_TIMEOUT)
             mailbox.starttls(ssl_context=ssl.create_default_context())
             mailbox.login(self.imap_user, self.imap_password)
-            mailbox.select("INBOX")
+            mailbox.select(self.folder)
+            self.uidvalidity = get_uidvalidity(mailbox, self.folder)
             
             logger.info("✅ Успешно подключился к почтовому серверу!")
             
-            # Формируем поисковый запрос по датам
-            search_criteria = self._build_search_criteria(from_date, to_date)
+            search_criteria, period, last_uid = self._search_plan(from_date, to_date, sync_state)
             
-            # Поиск писем
-            status, messages_ids = mailbox.search(None, search_criteria)
-            message_id_list = messages_ids[0].split()
+            # Поиск писем (UID стабильны между сессиями, в отличие от порядковых номеров)
+            status, messages_ids = mailbox.uid('SEARCH', None, search_criteria)
+            message_id_list = messages_ids[0].split() if messages_ids and messages_ids[0] else []
+            message_id_list = self._after_checkpoint(message_id_list, last_uid)
             
-            total_emails = len(message_id_list)
-            self.stats['total_emails'] = total_emails
+            self.stats['total_emails'] = len(message_id_list)
             
-            logger.info(f"📬 Найдено писем за период {from_date} - {to_date}: {total_emails}")
+            logger.info(f"📬 Найдено писем {period}: {len(message_id_list)}")
             
-            # Обработка каждого письма
-            for i, msg_id in enumerate(message_id_list, 1):
-                try:
-                    # Получаем письмо
-                    status, msg_data = mailbox.fetch(msg_id, "(RFC822)")
-                    if status != "OK":
-                        continue
-                    
-                    raw_email = msg_data[0][1]
-                    msg = email.message_from_bytes(raw_email)
-                    
-                    # Извлекаем основные данные письма
-                    subject = self._smart_decode(msg.get("Subject", "")).strip()
-                    email_body = self._extract_email_body(msg)
-                    
-                    # 🔧 ИСПРАВЛЕНО: Получаем дату письма с коррекцией (+4 часа)
-                    mail_date_raw = msg.get("Date", "")
-                    try:
-                        mail_date = parsedate_to_datetime(mail_date_raw)
-                        # ✅ ДОБАВЛЕНА КОРРЕКЦИЯ ВРЕМЕНИ (+4 часа)
-                        corrected_date = mail_date + timedelta(hours=4)
-                        date_str = corrected_date.strftime("%d.%m.%Y %H:%M")
-                    except Exception:
-                        date_str = mail_date_raw or "-"
-                    
-                    # СТРОГАЯ проверка наличия внешних участников
-                    has_external, external_emails = self._has_external_participants(msg, email_body)
-                    
-                    if self.debug:
-                        logger.debug(f"📧 Обработка {i}/{total_emails}: {subject[:50]}...")
-                    
-                    if not has_external:
-                        self.stats['internal_emails'] += 1
-                        if self.debug:
-                            logger.debug("⚪ Письмо содержит только внутренние контакты. Пропущено.")
-                        continue
-                    
-                    self.stats['external_emails'] += 1
-                    
-                    # Логируем информацию о письме с внешними участниками
-                    logger.info("=" * 60)
-                    logger.info(f"📧 Письмо {i}/{total_emails}: {date_str}")
-                    logger.info(f"📝 Тема: {subject}")
-                    logger.info(f"🌐 Внешние участники: {', '.join(external_emails[:3])}")
-                    
-                    # Обрабатываем письмо через процессор контактов
+            # Двухфазная загрузка: тела только для писем с внешними участниками в заголовках
+            body_id_list = message_id_list
+            if self.header_prefilter:
+                body_id_list = self._prefilter_by_headers(mailbox, message_id_list)
+            
+            total_emails = len(body_id_list)
+            
+            # Пакетная загрузка: одна команда UID FETCH на пачку писем вместо запроса на каждое
+            if self.fetch_strategy == FETCH_TEXT_PARTS:
+                messages = self._fetch_text_parts_batched(mailbox, body_id_list)
+            else:
+                messages = self._fetch_messages_batched(mailbox, body_id_list)
+            
+            # UID писем, которые действительно пришли с сервера (для точки синхронизации)
+            fetched_uids = set()
+            messages = self._track_fetched(messages, fetched_uids)
+            
+            if self.extraction_workers > 1:
+                # Загрузка идёт в этом процессе, NER - в пуле процессов
+                with ExtractionPool(self.extraction_workers, debug=self.debug,
+                                    cache=self.contact_processor.ner_extractor.cache) as pool:
+                    self._process_messages_pooled(messages, total_emails, processed_contacts, pool)
+            else:
+                for i, (msg_id, raw_email, email_body) in enumerate(messages, 1):
                     try:
-                        contacts = self.contact_processor.process_email_signature(
-                            email_body, subject, date_str, external_emails
-                        )
-                        
-                        if contacts:
-                            # НОВАЯ ЛОГИКА: Строгая фильтрация по качеству + дедупликация
-                            high_quality_contacts = self._filter_and_dedupe_contacts(contacts)
-                            
-                            if high_quality_contacts:
-                                processed_contacts.extend(high_quality_contacts)
-                                self.stats['successful_extractions'] += 1
-                                self.stats['high_quality_contacts'] += len(high_quality_contacts)
-                                
-                                # Логируем только высококачественные контакты
-                                for contact in high_quality_contacts:
-                                    logger.info(f"✅ Высококачественный контакт:")
-                                    logger.info(f"   👤 ФИО: {contact.fio if contact.fio else '[]'}")
-                                    logger.info(f"   💼 Должность: {contact.position if contact.position else '[]'}")
-                                    logger.info(f"   🏢 Компания: {contact.company if contact.company else '[]'}")
-                                    logger.info(f"   📧 Email: {contact.email if contact.email else '[]'}")
-                                    logger.info(f"   📞 Телефоны: {contact.phones if contact.phones else '[]'}")
-                                    logger.info(f"   📍 Адрес: {contact.address if contact.address else '[]'}")
-                                    logger.info(f"   🏙️ Город: {contact.city if contact.city else '[]'}")
-                                    logger.info(f"   🏦 ИНН: {contact.inn if contact.inn else '[]'}")
-                                    logger.info(f"   📊 Качество: {contact.confidence_score}")
-                            else:
-                                logger.warning("❌ Все контакты низкого качества (< 0.5), отброшены")
-                                self.stats['low_quality_rejected'] += len(contacts)
-                                self.stats['failed_extractions'] += 1
-                        else:
-                            logger.warning("❌ Контакты не найдены")
-                            self.stats['failed_extractions'] += 1
-                        
-                        self.stats['processed_contacts'] += len(contacts) if contacts else 0
-                        
+                        msg = self._as_message(raw_email)
+                        self._process_message(msg, i, total_emails, processed_contacts, email_body)
                     except Exception as e:
-                        self.stats['failed_extractions'] += 1
-                        logger.error(f"❌ Ошибка обработки письма: {e}")
-                
-                except Exception as e:
-                    logger.error(f"❌ Ошибка получения письма {msg_id}: {e}")
-                    continue
+                        logger.error(f"❌ Ошибка получения письма {msg_id}: {e}")
+                        continue
             
             # Финальная дедупликация всех контактов
-            if processed_contacts:
-                logger.info(f"🔄 Выполняется финальная дедупликация {len(processed_contacts)} контактов...")
-                unique_contacts = self.contact_processor.deduplicate_contacts(processed_contacts)
-                duplicates_removed = len(processed_contacts) - len(unique_contacts)
-                self.stats['duplicates_removed'] += duplicates_removed
-                self.stats['valid_contacts'] = len(unique_contacts)
-                
-                if duplicates_removed > 0:
-                    logger.info(f"🗑️ Удалено дублей: {duplicates_removed}")
-                
-                processed_contacts = unique_contacts
+            processed_contacts = self._final_deduplicate(processed_contacts)
+            self.contact_processor.save_caches()
+            
+            # Сдвигаем точку синхронизации только после успешной обработки
+            self._save_checkpoint(sync_state, message_id_list, last_uid,
+                                  self._unfetched(body_id_list, fetched_uids))
             
             # Закрываем соединение
             mailbox.logout()
@@ -432,6 +463,452 @@ class IMAPClient:
         
         return processed_contacts
 
+    def _search_plan(self, from_date, to_date, sync_state: Optional[SyncState]) -> Tuple[str, str, Optional[int]]:
+        """Критерий UID SEARCH, описание периода для лога и точка синхронизации
+        
+        Инкрементальный режим берёт только письма новее сохранённой точки,
+        иначе поиск идёт по датам.
+        """
+        
+        last_uid = None
+        if sync_state is not None:
+            last_uid = sync_state.last_uid(self.folder, self.uidvalidity)
+        
+        if last_uid is not None:
+            return f'UID {last_uid + 1}:*', f"после UID {last_uid}", last_uid
+        
+        return self._build_search_criteria(from_date, to_date), f"за период {from_date} - {to_date}", None
+
+    @staticmethod
+    def _after_checkpoint(message_id_list: List[bytes], last_uid: Optional[int]) -> List[bytes]:
+        """Убирает уже обработанные UID
+        
+        "n+1:*" по RFC 3501 всегда включает последнее письмо папки, даже уже обработанное.
+        """
+        if last_uid is None:
+            return message_id_list
+        return [uid for uid in message_id_list if int(uid) > last_uid]
+
+    @staticmethod
+    def _track_fetched(messages, fetched_uids: set):
+        """Пропускает письма дальше, запоминая их UID"""
+        for message in messages:
+            fetched_uids.add(int(message[0]))
+            yield message
+
+    @staticmethod
+    def _unfetched(body_id_list: List[bytes], fetched_uids: set) -> List[int]:
+        """UID, тела которых не удалось загрузить (ошибка пачки, NO от сервера, нет в ответе)"""
+        return sorted(int(uid) for uid in body_id_list if int(uid) not in fetched_uids)
+
+    def _save_checkpoint(self, sync_state: Optional[SyncState], message_id_list: List[bytes],
+                         last_uid: Optional[int], failed_uids: Optional[List[int]] = None):
+        """Запоминает наибольший обработанный UID папки
+        
+        Если часть писем не загрузилась, точка ставится не дальше последнего
+        UID перед первым сбоем - эти письма будут запрошены при следующем запуске.
+        """
+        
+        if sync_state is None or self.uidvalidity is None:
+            return
+        
+        if failed_uids:
+            first_failed = min(failed_uids)
+            logger.warning(
+                f"⚠️ Не загружено писем: {len(failed_uids)}, точка синхронизации - не дальше UID {first_failed - 1}"
+            )
+            message_id_list = [uid for uid in message_id_list if int(uid) < first_failed]
+        
+        if message_id_list:
+            last_uid = max(int(uid) for uid in message_id_list)
+        if last_uid is not None:
+            sync_state.update(self.folder, self.uidvalidity, last_uid)
+            sync_state.save()
+            logger.info(f"💾 Точка синхронизации {self.folder}: UID {last_uid}")
+
+    def _prefilter_by_headers(self, mailbox, message_id_list: List[bytes]) -> List[bytes]:
+        """Первая фаза: по заголовкам отбрасывает письма только с внутренними участниками
+        
+        Загружаются лишь заголовки адресатов, даты и темы (BODY.PEEK не ставит
+        флаг \\Seen). Возвращает UID писем, для которых нужно загрузить тело.
+        """
+        
+        external_ids = []
+        
+        for batch in iter_uid_batches(message_id_list, self.fetch_batch_size):
+            message_set = compress_uid_set(batch)
+            try:
+                status, fetch_data = mailbox.uid('FETCH', message_set, HEADER_PREFILTER_ITEMS)
+            except (imaplib.IMAP4.abort, ssl.SSLError, OSError):
+                raise
+            except Exception as e:
+                logger.error(f"❌ Ошибка загрузки заголовков {message_set}: {e}")
+                status, fetch_data = None, []
+            
+            if status != "OK":
+                # Не удалось проверить заголовки - загрузим тела как раньше
+                if status is not None:
+                    logger.error(f"❌ Сервер вернул {status} для заголовков {message_set}")
+                external_ids.extend(batch)
+                continue
+            
+            external_ids.extend(self._external_by_headers(batch, fetch_data))
+        
+        logger.info(
+            f"📨 Фильтр по заголовкам: тела нужны для {len(external_ids)} из {len(message_id_list)} писем"
+        )
+        
+        return external_ids
+
+    def _external_by_headers(self, batch: List[bytes], fetch_data) -> List[bytes]:
+        """UID пачки, в заголовках которых есть внешний участник (или заголовки не пришли)"""
+        
+        headers_by_uid = {
+            int(msg_id): raw_headers
+            for msg_id, raw_headers in parse_fetch_response(fetch_data)
+            if msg_id is not None
+        }
+        
+        external_ids = []
+        for msg_id in batch:
+            raw_headers = headers_by_uid.get(int(msg_id))
+            if raw_headers is None:
+                external_ids.append(msg_id)
+                continue
+            
+            headers = email.message_from_bytes(raw_headers)
+            participants = self._header_participants(headers)
+            
+            if any(not self._is_internal_email(addr) for addr in participants):
+                external_ids.append(msg_id)
+            else:
+                self.stats['internal_emails'] += 1
+                self.stats['header_prefiltered'] += 1
+        
+        return external_ids
+
+    def _fetch_messages_batched(self, mailbox, message_id_list: List[bytes]) -> Iterator[Tuple[bytes, bytes, Optional[str]]]:
+        """Загружает письма пачками по fetch_batch_size и отдаёт их по мере получения"""
+        
+        use_cache = self.message_cache is not None and self.uidvalidity is not None
+        
+        for batch in iter_uid_batches(message_id_list, self.fetch_batch_size):
+            # Сначала берём то, что уже лежит в локальном кэше
+            cached = {}
+            if use_cache:
+                cached = self.message_cache.get_many(self.folder, self.uidvalidity, batch)
+            
+            missing = [uid for uid in batch if int(uid) not in cached]
+            fetched = {}
+            
+            if missing:
+                message_set = compress_uid_set(missing)
+                
+                try:
+                    status, fetch_data = mailbox.uid('FETCH', message_set, '(RFC822)')
+                except (imaplib.IMAP4.abort, ssl.SSLError, OSError):
+                    raise
+                except Exception as e:
+                    logger.error(f"❌ Ошибка пакетной загрузки {message_set}: {e}")
+                    status, fetch_data = None, []
+                
+                if status == "OK":
+                    fetched = self._store_fetched(fetch_data)
+                elif status is not None:
+                    logger.error(f"❌ Сервер вернул {status} для пачки {message_set}")
+            
+            if self.debug:
+                logger.debug(f"📦 Пачка из {len(batch)} писем: из кэша {len(cached)}, загружено {len(fetched)}")
+            
+            for msg_id in batch:
+                raw_email = cached.get(int(msg_id)) or fetched.get(int(msg_id))
+                if raw_email is not None:
+                    yield msg_id, raw_email, None
+
+    def _store_fetched(self, fetch_data) -> Dict[int, bytes]:
+        """Разбирает ответ UID FETCH (RFC822), учитывает объём и кладёт письма в кэш"""
+        
+        use_cache = self.message_cache is not None and self.uidvalidity is not None
+        fetched = {}
+        
+        for msg_id, raw_email in parse_fetch_response(fetch_data):
+            if msg_id is None:
+                continue
+            fetched[int(msg_id)] = raw_email
+            self.stats['bytes_fetched'] += len(raw_email)
+            if use_cache:
+                self.message_cache.put(self.folder, self.uidvalidity, msg_id, raw_email)
+        
+        return fetched
+
+    def _fetch_text_parts_batched(self, mailbox, message_id_list: List[bytes]) -> Iterator[Tuple[bytes, bytes, str]]:
+        """Загружает только заголовки и текстовую часть писем по BODYSTRUCTURE
+        
+        Вложения не скачиваются: для каждой пачки сначала запрашивается
+        структура, затем одной командой на каждый номер раздела - заголовок
+        и выбранная часть (text/plain, иначе text/html).
+        """
+        
+        for batch in iter_uid_batches(message_id_list, self.fetch_batch_size):
+            message_set = compress_uid_set(batch)
+            
+            try:
+                status, fetch_data = mailbox.uid('FETCH', message_set, BODYSTRUCTURE_ITEMS)
+            except (imaplib.IMAP4.abort, ssl.SSLError, OSError):
+                raise
+            except Exception as e:
+                logger.error(f"❌ Ошибка загрузки BODYSTRUCTURE {message_set}: {e}")
+                continue
+            if status != "OK":
+                logger.error(f"❌ Сервер вернул {status} для BODYSTRUCTURE {message_set}")
+                continue
+            
+            structures = parse_bodystructure_response(fetch_data)
+            
+            # Группируем письма по номеру раздела, чтобы загрузить их одной командой
+            body_parts = {}
+            uids_by_section = {}
+            for msg_id in batch:
+                structure = structures.get(int(msg_id))
+                part = choose_body_part(find_text_parts(structure)) if structure else None
+                body_parts[int(msg_id)] = part
+                section = part.section if part else None
+                uids_by_section.setdefault(section, []).append(msg_id)
+            
+            results = {}
+            for section, section_uids in uids_by_section.items():
+                items = section_fetch_items([section] if section else [])
+                try:
+                    status, fetch_data = mailbox.uid('FETCH', compress_uid_set(section_uids), items)
+                except (imaplib.IMAP4.abort, ssl.SSLError, OSError):
+                    raise
+                except Exception as e:
+                    logger.error(f"❌ Ошибка загрузки раздела {section}: {e}")
+                    continue
+                if status != "OK":
+                    logger.error(f"❌ Сервер вернул {status} для раздела {section}")
+                    continue
+                
+                for fetched in parse_fetch_literals(fetch_data):
+                    if 'UID' not in fetched:
+                        continue
+                    uid = int(fetched['UID'])
+                    raw_headers = fetched.get('BODY[HEADER]', b'')
+                    raw_part = fetched.get(f'BODY[{section}]', b'')
+                    self.stats['bytes_fetched'] += len(raw_headers) + len(raw_part)
+                    
+                    part = body_parts.get(uid)
+                    email_body = decode_part(raw_part, part) if part else ""
+                    if part and part.subtype == 'html':
+                        email_body = BeautifulSoup(email_body, "html.parser").get_text(separator='\n', strip=True)
+                    
+                    results[uid] = (raw_headers, email_body.strip())
+            
+            if self.debug:
+                logger.debug(f"📦 Пачка {message_set}: текстовые части {len(results)} писем")
+            
+            for msg_id in batch:
+                if int(msg_id) in results:
+                    raw_headers, email_body = results[int(msg_id)]
+                    yield msg_id, raw_headers, email_body
+
+    @staticmethod
+    def _as_message(raw_email):
+        """Письмо из сырых байт; уже разобранное письмо (офлайн-источники) отдаётся как есть"""
+        if isinstance(raw_email, Message):
+            return raw_email
+        return email.message_from_bytes(raw_email)
+
+    def _process_message(self, msg, index: int, total_emails: int,
+                         processed_contacts: List[FullContactInfo],
+                         email_body: Optional[str] = None) -> None:
+        """Обрабатывает одно письмо: проверка участников и извлечение контактов
+        
+        email_body передаётся, если текст уже получен отдельно от заголовков.
+        """
+        
+        prepared = self._prepare_message(msg, index, total_emails, email_body)
+        if prepared is None:
+            return
+        
+        email_body, subject, date_str, external_emails = prepared
+        
+        # Обрабатываем письмо через процессор контактов
+        try:
+            contacts = self.contact_processor.process_email_signature(
+                email_body, subject, date_str, external_emails
+            )
+            self._collect_contacts(contacts, processed_contacts)
+            
+        except Exception as e:
+            self.stats['failed_extractions'] += 1
+            logger.error(f"❌ Ошибка обработки письма: {e}")
+
+    def _process_messages_pooled(self, messages: Iterator[Tuple[bytes, bytes, Optional[str]]],
+                                 total_emails: int, processed_contacts: List[FullContactInfo],
+                                 pool: ExtractionPool) -> None:
+        """Конвейер: письма разбираются здесь, подписи - в процессах пула
+        
+        Очередь пула ограничена, поэтому загрузка писем приостанавливается,
+        пока воркеры не догонят.
+        """
+        
+        def jobs():
+            for i, (msg_id, raw_email, email_body) in enumerate(messages, 1):
+                try:
+                    msg = self._as_message(raw_email)
+                    prepared = self._prepare_message(msg, i, total_emails, email_body)
+                except Exception as e:
+                    logger.error(f"❌ Ошибка получения письма {msg_id}: {e}")
+                    continue
+                if prepared is not None:
+                    yield msg_id, prepared
+        
+        for msg_id, contacts, stats_delta in pool.imap(jobs()):
+            self._collect_pooled(msg_id, contacts, stats_delta, processed_contacts)
+    
+    def _collect_pooled(self, msg_id, contacts: List[FullContactInfo], stats_delta: Dict[str, int],
+                        processed_contacts: List[FullContactInfo]) -> None:
+        """Результат воркера пула: статистика процессора и контакты письма"""
+        
+        # Статистика ContactProcessor копится в воркерах - переносим её сюда
+        processor_stats = self.contact_processor.stats
+        for key, value in stats_delta.items():
+            processor_stats[key] = processor_stats.get(key, 0) + value
+        
+        try:
+            self._collect_contacts(contacts, processed_contacts)
+        except Exception as e:
+            self.stats['failed_extractions'] += 1
+            logger.error(f"❌ Ошибка обработки письма {msg_id}: {e}")
+
+    def _prepare_message(self, msg, index: int, total_emails: int,
+                         email_body: Optional[str] = None) -> Optional[Tuple[str, str, str, List[str]]]:
+        """Разбирает письмо и проверяет участников
+        
+        Возвращает (тело, тема, дата, внешние адреса) для извлечения контактов
+        или None, если в письме только внутренние участники.
+        """
+        
+        # Извлекаем основные данные письма
+        subject = self._smart_decode(msg.get("Subject", "")).strip()
+        if email_body is None:
+            email_body = self._extract_email_body(msg)
+        
+        # 🔧 ИСПРАВЛЕНО: Получаем дату письма с коррекцией (+4 часа)
+        mail_date_raw = msg.get("Date", "")
+        try:
+            mail_date = parsedate_to_datetime(mail_date_raw)
+            # ✅ ДОБАВЛЕНА КОРРЕКЦИЯ ВРЕМЕНИ (+4 часа)
+            corrected_date = mail_date + timedelta(hours=4)
+            date_str = corrected_date.strftime("%d.%m.%Y %H:%M")
+        except Exception:
+            date_str = mail_date_raw or "-"
+        
+        # СТРОГАЯ проверка наличия внешних участников
+        has_external, external_emails = self._has_external_participants(msg, email_body)
+        
+        if self.debug:
+            logger.debug(f"📧 Обработка {index}/{total_emails}: {subject[:50]}...")
+        
+        if not has_external:
+            self.stats['internal_emails'] += 1
+            if self.debug:
+                logger.debug("⚪ Письмо содержит только внутренние контакты. Пропущено.")
+            return None
+        
+        self.stats['external_emails'] += 1
+        
+        # Логируем информацию о письме с внешними участниками
+        logger.info("=" * 60)
+        progress = f"{index}/{total_emails}" if total_emails else str(index)
+        logger.info(f"📧 Письмо {progress}: {date_str}")
+        logger.info(f"📝 Тема: {subject}")
+        logger.info(f"🌐 Внешние участники: {', '.join(external_emails[:3])}")
+        
+        return email_body, subject, date_str, external_emails
+
+    def _collect_contacts(self, contacts: List[FullContactInfo],
+                          processed_contacts: List[FullContactInfo]) -> None:
+        """Фильтрует контакты письма по качеству и добавляет их к результатам"""
+        
+        if contacts:
+            # НОВАЯ ЛОГИКА: Строгая фильтрация по качеству + дедупликация
+            high_quality_contacts = self._filter_and_dedupe_contacts(contacts)
+            
+            if high_quality_contacts:
+                if self.contact_store is not None:
+                    # Дубли объединяются в хранилище сразу, список не растёт
+                    new_contacts = self.contact_store.upsert_many(high_quality_contacts)
+                    self.stats['duplicates_removed'] += len(high_quality_contacts) - new_contacts
+                else:
+                    processed_contacts.extend(high_quality_contacts)
+                self.stats['successful_extractions'] += 1
+                self.stats['high_quality_contacts'] += len(high_quality_contacts)
+                
+                # Логируем только высококачественные контакты
+                for contact in high_quality_contacts:
+                    logger.info(f"✅ Высококачественный контакт:")
+                    logger.info(f"   👤 ФИО: {contact.fio if contact.fio else '[]'}")
+                    logger.info(f"   💼 Должность: {contact.position if contact.position else '[]'}")
+                    logger.info(f"   🏢 Компания: {contact.company if contact.company else '[]'}")
+                    logger.info(f"   📧 Email: {contact.email if contact.email else '[]'}")
+                    logger.info(f"   📞 Телефоны: {contact.phones if contact.phones else '[]'}")
+                    logger.info(f"   📍 Адрес: {contact.address if contact.address else '[]'}")
+                    logger.info(f"   🏙️ Город: {contact.city if contact.city else '[]'}")
+                    logger.info(f"   🏦 ИНН: {contact.inn if contact.inn else '[]'}")
+                    logger.info(f"   📊 Качество: {contact.confidence_score}")
+            else:
+                logger.warning("❌ Все контакты низкого качества (< 0.5), отброшены")
+                self.stats['low_quality_rejected'] += len(contacts)
+                self.stats['failed_extractions'] += 1
+        else:
+            logger.warning("❌ Контакты не найдены")
+            self.stats['failed_extractions'] += 1
+        
+        self.stats['processed_contacts'] += len(contacts) if contacts else 0
+
+    def _final_deduplicate(self, processed_contacts: List[FullContactInfo]) -> Sequence[FullContactInfo]:
+        """Финальная дедупликация всех контактов за период
+        
+        С хранилищем контактов дубли уже объединены при записи - возвращаются
+        контакты, добавленные или обновлённые в этом прогоне, в виде
+        StoredContacts: они читаются из SQLite при обходе (выгрузка в Excel,
+        вывод), и память не растёт с длиной периода. Нечёткие дубли
+        (ContactMatcher) в этом случае объединяются прямо в хранилище, в
+        памяти - только их признаки; без хранилища - в возвращаемом списке.
+        """
+        
+        if self.contact_store is not None:
+            self.contact_store.commit()
+            if self.contact_matcher is not None:
+                self.stats['duplicates_removed'] += self.contact_matcher.deduplicate_store(
+                    self.contact_store, self.contact_processor._merge_contacts, self.contact_store.session_started
+                )
+            unique_contacts = self.contact_store.session_contacts()
+            logger.info(
+                f"💾 Хранилище контактов: {self.contact_store.stats['inserted']} новых, "
+                f"{self.contact_store.stats['merged']} объединено, всего {len(self.contact_store)}"
+            )
+        elif not processed_contacts:
+            return processed_contacts
+        else:
+            logger.info(f"🔄 Выполняется финальная дедупликация {len(processed_contacts)} контактов...")
+            unique_contacts = self.contact_processor.deduplicate_contacts(processed_contacts)
+            duplicates_removed = len(processed_contacts) - len(unique_contacts)
+            self.stats['duplicates_removed'] += duplicates_removed
+            
+            if duplicates_removed > 0:
+                logger.info(f"🗑️ Удалено дублей: {duplicates_removed}")
+        
+        if self.contact_matcher is not None and self.contact_store is None:
+            matched_contacts = self.contact_matcher.deduplicate(list(unique_contacts), self.contact_processor._merge_contacts)
+            self.stats['duplicates_removed'] += len(unique_contacts) - len(matched_contacts)
+            unique_contacts = matched_contacts
+        
+        self.stats['valid_contacts'] = len(unique_contacts)
+        return unique_contacts
+
     def _filter_and_dedupe_contacts(self, contacts: List[FullContactInfo]) -> List[FullContactInfo]:
         """НОВАЯ ФУНКЦИЯ: Фильтрация по качеству + дедупликация"""
         
@@ -494,6 +971,11 @@ class IMAPClient:
             stats['high_quality_percent'] = round(stats['high_quality_contacts'] / stats['processed_contacts'] * 100, 1)
             stats['rejected_percent'] = round(stats['low_quality_rejected'] / stats['processed_contacts'] * 100, 1)
         
+        # Статистика локального кэша писем
+        if self.message_cache is not None:
+            stats['cache_hits'] = self.message_cache.stats['hits']
+            stats['cache_misses'] = self.message_cache.stats['misses']
+        
         # Добавляем статистику процессора контактов
         try:
             processor_stats = self.contact_processor.get_processing_stats()
@@ -0,0 +1,111 @@
+import re
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+# Номер UID в ответе сервера на UID FETCH: "12 (UID 345 RFC822 {1024}"
+FETCH_UID_RE = re.compile(rb'UID (\d+)')
+
+DEFAULT_FETCH_BATCH_SIZE = 200
+
+# Заголовки, достаточные для отбора писем с внешними участниками
+HEADER_PREFILTER_ITEMS = '(BODY.PEEK[HEADER.FIELDS (FROM TO CC BCC DATE SUBJECT)])'
+
+
+def compress_uid_set(uids: Sequence) -> str:
+    """Сворачивает список UID в компактный message set IMAP: 1:200,205,210:215"""
+
+    numbers = sorted({int(uid) for uid in uids})
+    if not numbers:
+        return ""
+
+    ranges = []
+    range_start = prev = numbers[0]
+    for number in numbers[1:]:
+        if number == prev + 1:
+            prev = number
+            continue
+        ranges.append(f"{range_start}:{prev}" if range_start != prev else str(range_start))
+        range_start = prev = number
+    ranges.append(f"{range_start}:{prev}" if range_start != prev else str(range_start))
+
+    return ','.join(ranges)
+
+
+def iter_uid_batches(uids: Sequence, batch_size: int) -> Iterator[List]:
+    """Разбивает список UID на пачки фиксированного размера с сохранением порядка"""
+
+    batch_size = max(1, int(batch_size))
+    for start in range(0, len(uids), batch_size):
+        yield list(uids[start:start + batch_size])
+
+
+def parse_fetch_response(fetch_data) -> List[Tuple[Optional[bytes], bytes]]:
+    """Разбирает ответ imaplib на UID FETCH с одним литералом в список пар (uid, данные)
+
+    imaplib отдаёт каждое письмо как кортеж (заголовок ответа, литерал) и
+    завершающий фрагмент b')'. Некоторые серверы присылают UID после литерала,
+    поэтому он ищется и в заголовке, и в завершающем фрагменте.
+    """
+
+    messages = []
+    pending = None
+
+    for item in fetch_data or []:
+        if isinstance(item, tuple):
+            if pending is not None:
+                messages.append(tuple(pending))
+            match = FETCH_UID_RE.search(item[0])
+            pending = [match.group(1) if match else None, item[1]]
+        elif isinstance(item, bytes) and pending is not None:
+            if pending[0] is None:
+                match = FETCH_UID_RE.search(item)
+                if match:
+                    pending[0] = match.group(1)
+            messages.append(tuple(pending))
+            pending = None
+
+    if pending is not None:
+        messages.append(tuple(pending))
+
+    return messages
+
+
+def get_uidvalidity(mailbox, folder: str = 'INBOX') -> Optional[int]:
+    """Возвращает UIDVALIDITY выбранной папки (из ответа SELECT или через STATUS)"""
+
+    _, data = mailbox.response('UIDVALIDITY')
+    if data and data[0]:
+        return int(data[0])
+
+    status, data = mailbox.status(folder, '(UIDVALIDITY)')
+    if status == 'OK' and data and data[0]:
+        match = re.search(rb'UIDVALIDITY (\d+)', data[0])
+        if match:
+            return int(match.group(1))
+
+    return None
+
+
+def fetch_rfc822_cached(mailbox, uid, cache=None, folder: str = 'INBOX',
+                        uidvalidity: Optional[int] = None) -> Optional[bytes]:
+    """Загружает одно письмо по UID, сначала заглядывая в локальный кэш"""
+
+    use_cache = cache is not None and uidvalidity is not None
+
+    if use_cache:
+        raw_email = cache.get(folder, uidvalidity, uid)
+        if raw_email is not None:
+            return raw_email
+
+    status, fetch_data = mailbox.uid('FETCH', uid, '(RFC822)')
+    if status != 'OK':
+        return None
+
+    messages = parse_fetch_response(fetch_data)
+    if not messages:
+        return None
+
+    raw_email = messages[0][1]
+    if use_cache:
+        cache.put(folder, uidvalidity, uid, raw_email)
+
+    return raw_email
@@ -0,0 +1,255 @@
+import re
+import asyncio
+import email
+import threading
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from typing import List, Optional
+
+TAGGED_LINE_RE = re.compile(r'^(\S+) (UID \S+|\S+) ?(.*)$')
+HEADER_FIELDS_RE = re.compile(r'BODY(?:\.PEEK)?\[HEADER\.FIELDS \(([^)]*)\)\]', re.IGNORECASE)
+DATE_CRITERIA_RE = re.compile(r'(ON|SINCE|BEFORE) "?(\d{1,2}-\w{3}-\d{4})"?', re.IGNORECASE)
+UID_CRITERIA_RE = re.compile(r'UID (\S+)', re.IGNORECASE)
+
+
+class LocalIMAPServer:
+    """IMAP-сервер в памяти процесса для проверки и замеров асинхронного клиента
+
+    Поддерживает минимум команд клиента: LOGIN, SELECT, UID SEARCH по датам
+    и диапазону UID, UID FETCH (UID, RFC822, BODY.PEEK[HEADER.FIELDS ...]).
+    latency задаёт искусственную задержку ответа на каждую команду, чтобы
+    имитировать сетевой RTT: команды в полёте ждут её параллельно.
+    """
+
+    def __init__(self, messages: List[bytes], uidvalidity: int = 1, latency: float = 0.0,
+                 user: str = 'test', password: str = 'test'):
+        self.messages = list(messages)
+        self.uidvalidity = uidvalidity
+        self.latency = latency
+        self.user = user
+        self.password = password
+        self.port: Optional[int] = None
+        self.commands_received = 0
+
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> int:
+        """Запускает сервер в текущем цикле событий и возвращает порт"""
+        self._server = await asyncio.start_server(self._handle_client, host, port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    def start_background(self, host: str = '127.0.0.1') -> int:
+        """Запускает сервер в отдельном потоке со своим циклом событий"""
+
+        started = threading.Event()
+
+        def run():
+            self._loop = asyncio.new_event_loop()
+            self._loop.run_until_complete(self.start(host))
+            started.set()
+            self._loop.run_forever()
+
+        self._thread = threading.Thread(target=run, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self.port
+
+    def stop_background(self):
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def _message_date(self, raw: bytes):
+        try:
+            return parsedate_to_datetime(email.message_from_bytes(raw).get('Date', '')).date()
+        except (TypeError, ValueError):
+            return None
+
+    def _search(self, criteria: str) -> List[int]:
+        uids = list(range(1, len(self.messages) + 1))
+
+        match = UID_CRITERIA_RE.search(criteria)
+        if match:
+            allowed = self._parse_set(match.group(1))
+            uids = [uid for uid in uids if uid in allowed]
+
+        for keyword, value in DATE_CRITERIA_RE.findall(criteria):
+            day = datetime.strptime(value, '%d-%b-%Y').date()
+            keyword = keyword.upper()
+            result = []
+            for uid in uids:
+                msg_date = self._message_date(self.messages[uid - 1])
+                if msg_date is None:
+                    continue
+                if (keyword == 'ON' and msg_date == day) or \
+                   (keyword == 'SINCE' and msg_date >= day) or \
+                   (keyword == 'BEFORE' and msg_date < day):
+                    result.append(uid)
+            uids = result
+
+        return uids
+
+    def _parse_set(self, message_set: str) -> set:
+        top = len(self.messages)
+        result = set()
+        for chunk in message_set.split(','):
+            if ':' in chunk:
+                start, end = chunk.split(':')
+                start = top if start == '*' else int(start)
+                end = top if end == '*' else int(end)
+                result.update(range(min(start, end), max(start, end) + 1))
+            else:
+                result.add(top if chunk == '*' else int(chunk))
+        return result
+
+    def _fetch_response(self, uid: int, items: str) -> bytes:
+        raw = self.messages[uid - 1]
+        parts = [f"* {uid} FETCH (UID {uid}".encode()]
+
+        header_match = HEADER_FIELDS_RE.search(items)
+        if header_match:
+            fields = header_match.group(1).split()
+            msg = email.message_from_bytes(raw)
+            headers = ''.join(
+                f"{name}: {value}\r\n"
+                for name, value in msg.items()
+                if name.upper() in {field.upper() for field in fields}
+            ).encode('utf-8', errors='replace') + b'\r\n'
+            parts.append(f" BODY[HEADER.FIELDS ({header_match.group(1)})] {{{len(headers)}}}\r\n".encode() + headers)
+
+        if re.search(r'\bRFC822\b', items, re.IGNORECASE):
+            parts.append(f" RFC822 {{{len(raw)}}}\r\n".encode() + raw)
+
+        parts.append(b")\r\n")
+        return b''.join(parts)
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        write_lock = asyncio.Lock()
+        tasks = set()
+
+        async def respond(payload: bytes):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            async with write_lock:
+                writer.write(payload)
+                await writer.drain()
+
+        writer.write(b"* OK LocalIMAPServer ready\r\n")
+        await writer.drain()
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.commands_received += 1
+
+                match = TAGGED_LINE_RE.match(line.decode('utf-8', errors='replace').rstrip('\r\n'))
+                if not match:
+                    continue
+                tag, command, args = match.group(1), match.group(2).upper(), match.group(3)
+
+                if command == 'LOGOUT':
+                    await respond(f"* BYE\r\n{tag} OK LOGOUT completed\r\n".encode())
+                    break
+
+                payload = self._execute(tag, command, args)
+                task = asyncio.create_task(respond(payload))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+
+    def _execute(self, tag: str, command: str, args: str) -> bytes:
+        if command == 'CAPABILITY':
+            return f"* CAPABILITY IMAP4rev1\r\n{tag} OK CAPABILITY completed\r\n".encode()
+        if command == 'NOOP':
+            return f"{tag} OK NOOP completed\r\n".encode()
+        if command == 'LOGIN':
+            credentials = re.findall(r'"((?:[^"\\]|\\.)*)"|(\S+)', args)
+            values = [quoted or plain for quoted, plain in credentials]
+            if values[:2] == [self.user, self.password]:
+                return f"{tag} OK LOGIN completed\r\n".encode()
+            return f"{tag} NO LOGIN failed\r\n".encode()
+        if command == 'SELECT':
+            return (
+                f"* {len(self.messages)} EXISTS\r\n"
+                f"* OK [UIDVALIDITY {self.uidvalidity}] UIDs valid\r\n"
+                f"{tag} OK [READ-WRITE] SELECT completed\r\n"
+            ).encode()
+        if command == 'UID SEARCH':
+            uids = ' '.join(str(uid) for uid in self._search(args))
+            return f"* SEARCH {uids}\r\n{tag} OK SEARCH completed\r\n".encode()
+        if command == 'UID FETCH':
+            message_set, _, items = args.partition(' ')
+            uids = sorted(uid for uid in self._parse_set(message_set) if 1 <= uid <= len(self.messages))
+            body = b''.join(self._fetch_response(uid, items) for uid in uids)
+            return body + f"{tag} OK FETCH completed\r\n".encode()
+        return f"{tag} BAD Unsupported command\r\n".encode()
+
+
+def _synthetic_messages(count: int, body_size: int = 20000) -> List[bytes]:
+    """Письма-заглушки с внешним отправителем и подписью"""
+    messages = []
+    for i in range(1, count + 1):
+        body = ("Текст письма. " * (body_size // 14))[:body_size]
+        messages.append((
+            f"From: Иван Петров <ivan{i}@partner.ru>\r\n"
+            f"To: office@example.com\r\n"
+            f"Date: Mon, 02 Jun 2025 10:{i % 60:02d}:00 +0300\r\n"
+            f"Subject: Письмо {i}\r\n"
+            f"Content-Type: text/plain; charset=utf-8\r\n\r\n"
+            f"{body}\r\n\r\nС уважением,\r\nИван Петров\r\n+7 (495) 123-45-67\r\n"
+        ).encode('utf-8'))
+    return messages
+
+
+def test_pipelining(count: int = 200, batch_size: int = 20, latency: float = 0.05):
+    """Сравнение последовательной и конвейерной загрузки пачек на локальном сервере"""
+
+    import time
+    from async_imap import AsyncIMAPConnection, fetch_batches_pipelined
+    from imap_fetch import parse_fetch_response
+
+    print("🧪 ТЕСТИРОВАНИЕ КОНВЕЙЕРНОЙ ЗАГРУЗКИ IMAP")
+    print("=" * 50)
+    print(f"📬 Писем: {count}, пачка: {batch_size}, задержка сервера: {latency * 1000:.0f} мс")
+
+    async def run(max_in_flight: int):
+        server = LocalIMAPServer(_synthetic_messages(count), latency=latency)
+        port = await server.start()
+        conn = AsyncIMAPConnection('127.0.0.1', port)
+        try:
+            await conn.connect(starttls=False)
+            await conn.login('test', 'test')
+            await conn.select('INBOX')
+            uids = await conn.uid_search('ON "02-Jun-2025"')
+
+            started = time.perf_counter()
+            received = 0
+            async for batch, data in fetch_batches_pipelined(conn, uids, '(RFC822)', batch_size, max_in_flight):
+                received += sum(1 for uid, _ in parse_fetch_response(data or []) if uid is not None)
+            return received, time.perf_counter() - started
+        finally:
+            await conn.logout()
+            await server.stop()
+
+    for max_in_flight in (1, 4):
+        received, elapsed = asyncio.run(run(max_in_flight))
+        print(f"   🚚 max_in_flight={max_in_flight}: {received} писем за {elapsed:.2f} с")
+
+
+if __name__ == "__main__":
+    test_pipelining()
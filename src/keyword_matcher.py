@@ -0,0 +1,77 @@
+import re
+from typing import Dict, FrozenSet, Iterable, Optional
+
+from patterns import PATTERNS
+
+
+def trie_pattern(keywords: Iterable[str]) -> str:
+    """Регулярное выражение, повторяющее бор (префиксное дерево) ключевых слов
+
+    Общие префиксы слов проверяются один раз: в каждой позиции текста
+    движок идёт по бору не глубже длины самого длинного слова, сколько бы
+    слов ни было в списке. Если слово - префикс другого, достаточно
+    короткого: для поиска вхождения длинное уже ничего не меняет.
+    """
+
+    trie: Dict = {}
+    for keyword in keywords:
+        node = trie
+        for char in keyword:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def emit(node: Dict) -> str:
+        if '' in node:
+            return ''
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items())]
+        return branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+
+    return emit(trie) if trie else '(?!)'
+
+
+class KeywordMatcher:
+    """Поиск любого из множества ключевых слов в тексте за один проход
+
+    Список слов собирается в бор и компилируется в одно регулярное
+    выражение, поэтому проверка строки идёт по её символам внутри движка re
+    и не зависит от размера списка - в отличие от
+    any(word in text for word in words). Регистр не меняется: слова и текст
+    приводятся к нижнему регистру вызывающим кодом, как и раньше.
+    """
+
+    def __init__(self, keywords: Iterable[str]):
+        self.keywords = sorted(set(keyword for keyword in keywords if keyword))
+        self.regex = PATTERNS.compile(trie_pattern(self.keywords))
+
+    def __len__(self) -> int:
+        return len(self.keywords)
+
+    def find(self, text: str) -> Optional[str]:
+        """Первое найденное в тексте ключевое слово или None"""
+        match = self.regex.search(text)
+        return match.group(0) if match else None
+
+    def contains_any(self, text: str) -> bool:
+        return self.regex.search(text) is not None
+
+    def find_prefix(self, text: str) -> Optional[str]:
+        """Ключевое слово, с которого начинается текст (аналог any(text.startswith(word)))"""
+        match = self.regex.match(text)
+        return match.group(0) if match else None
+
+
+class KeywordMatcherRegistry:
+    """Общий на процесс кэш: один и тот же список слов собирается один раз"""
+
+    def __init__(self):
+        self._matchers: Dict[FrozenSet[str], KeywordMatcher] = {}
+
+    def get(self, keywords: Iterable[str]) -> KeywordMatcher:
+        key = frozenset(keyword for keyword in keywords if keyword)
+        matcher = self._matchers.get(key)
+        if matcher is None:
+            matcher = self._matchers[key] = KeywordMatcher(key)
+        return matcher
+
+
+KEYWORDS = KeywordMatcherRegistry()
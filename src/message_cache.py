@@ -0,0 +1,206 @@
+import os
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = 'cache/messages'
+DEFAULT_MAX_MB = 2048
+
+# Сколько самых старых записей читается за один шаг вытеснения
+EVICT_CHUNK = 64
+
+
+class MessageCache:
+    """Локальный кэш сырых писем (RFC822) с адресацией по содержимому
+
+    Письмо хранится один раз в blobs/<sha256>.eml, а индекс в SQLite
+    связывает с ним ключ (папка, UIDVALIDITY, UID). При превышении лимита
+    размера вытесняются давно не читавшиеся письма (LRU).
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: Optional[int] = None):
+        self.cache_dir = cache_dir
+        self.blobs_dir = os.path.join(cache_dir, 'blobs')
+        self.max_bytes = max_bytes if max_bytes is not None else DEFAULT_MAX_MB * 1024 * 1024
+
+        os.makedirs(self.blobs_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite3'), check_same_thread=False)
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS messages (
+                folder TEXT NOT NULL,
+                uidvalidity INTEGER NOT NULL,
+                uid INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (folder, uidvalidity, uid)
+            )
+        ''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS idx_messages_sha256 ON messages (sha256)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS idx_messages_access ON messages (last_access)')
+        self._db.commit()
+
+        self.total_bytes = self._stored_bytes()
+        self.stats = {'hits': 0, 'misses': 0, 'stored': 0, 'evicted': 0, 'too_large': 0}
+
+        logger.info(f"✅ Кэш писем: {cache_dir} ({self.total_bytes // (1024 * 1024)} МБ из {self.max_bytes // (1024 * 1024)} МБ)")
+
+    @classmethod
+    def from_env(cls) -> Optional['MessageCache']:
+        """Создаёт кэш по MESSAGE_CACHE_DIR / MESSAGE_CACHE_MAX_MB; без каталога кэш выключен"""
+        cache_dir = os.environ.get('MESSAGE_CACHE_DIR')
+        if not cache_dir:
+            return None
+        max_mb = int(os.environ.get('MESSAGE_CACHE_MAX_MB', DEFAULT_MAX_MB))
+        return cls(cache_dir, max_mb * 1024 * 1024)
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self.blobs_dir, sha256[:2], f"{sha256}.eml")
+
+    def _stored_bytes(self) -> int:
+        row = self._db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM messages GROUP BY sha256)'
+        ).fetchone()
+        return row[0]
+
+    def get(self, folder: str, uidvalidity: int, uid) -> Optional[bytes]:
+        """Возвращает письмо из кэша или None"""
+        return self.get_many(folder, uidvalidity, [uid]).get(int(uid))
+
+    def get_many(self, folder: str, uidvalidity: int, uids: Iterable) -> Dict[int, bytes]:
+        """Возвращает найденные в кэше письма: {uid: raw_email}"""
+
+        found = {}
+        with self._lock:
+            now = time.time()
+            for uid in uids:
+                uid = int(uid)
+                row = self._db.execute(
+                    'SELECT sha256 FROM messages WHERE folder = ? AND uidvalidity = ? AND uid = ?',
+                    (folder, int(uidvalidity), uid)
+                ).fetchone()
+
+                if row is None:
+                    self.stats['misses'] += 1
+                    continue
+
+                try:
+                    with open(self._blob_path(row[0]), 'rb') as f:
+                        found[uid] = f.read()
+                except FileNotFoundError:
+                    # Файл удалён вручную - забываем запись
+                    self._db.execute(
+                        'DELETE FROM messages WHERE folder = ? AND uidvalidity = ? AND uid = ?',
+                        (folder, int(uidvalidity), uid)
+                    )
+                    self.stats['misses'] += 1
+                    continue
+
+                self._db.execute(
+                    'UPDATE messages SET last_access = ? WHERE folder = ? AND uidvalidity = ? AND uid = ?',
+                    (now, folder, int(uidvalidity), uid)
+                )
+                self.stats['hits'] += 1
+
+            self._db.commit()
+
+        return found
+
+    def put(self, folder: str, uidvalidity: int, uid, raw_email: bytes):
+        """Сохраняет письмо в кэш и при необходимости вытесняет старые"""
+
+        if not raw_email:
+            return
+
+        # Письмо больше всего кэша вытеснило бы само себя вместе со всеми остальными
+        if len(raw_email) > self.max_bytes:
+            self.stats['too_large'] += 1
+            return
+
+        sha256 = hashlib.sha256(raw_email).hexdigest()
+        blob_path = self._blob_path(sha256)
+
+        with self._lock:
+            previous = self._db.execute(
+                'SELECT sha256 FROM messages WHERE folder = ? AND uidvalidity = ? AND uid = ?',
+                (folder, int(uidvalidity), int(uid))
+            ).fetchone()
+
+            if not os.path.exists(blob_path):
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                tmp_path = f"{blob_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(raw_email)
+                os.replace(tmp_path, blob_path)
+                self.total_bytes += len(raw_email)
+
+            self._db.execute(
+                'INSERT OR REPLACE INTO messages (folder, uidvalidity, uid, sha256, size, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (folder, int(uidvalidity), int(uid), sha256, len(raw_email), time.time())
+            )
+            self.stats['stored'] += 1
+
+            # Ключ теперь указывает на другое содержимое - старый файл мог остаться без ссылок
+            if previous is not None and previous[0] != sha256:
+                self._release_blob(previous[0])
+
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+            self._db.commit()
+
+    def _evict(self):
+        """Удаляет давно не читавшиеся письма, пока кэш не уложится в лимит
+
+        Кандидаты читаются небольшими порциями по индексу last_access, а не
+        всей таблицей: вытеснение при каждой записи не зависит от размера кэша.
+        """
+
+        while self.total_bytes > self.max_bytes:
+            rows = self._db.execute(
+                'SELECT folder, uidvalidity, uid, sha256 FROM messages ORDER BY last_access LIMIT ?',
+                (EVICT_CHUNK,)
+            ).fetchall()
+            if not rows:
+                break
+
+            for folder, uidvalidity, uid, sha256 in rows:
+                if self.total_bytes <= self.max_bytes:
+                    break
+
+                self._db.execute(
+                    'DELETE FROM messages WHERE folder = ? AND uidvalidity = ? AND uid = ?',
+                    (folder, uidvalidity, uid)
+                )
+                self.stats['evicted'] += 1
+                self._release_blob(sha256)
+
+    def _release_blob(self, sha256: str):
+        """Удаляет файл письма, если на него не ссылается ни один ключ"""
+
+        still_used = self._db.execute(
+            'SELECT 1 FROM messages WHERE sha256 = ? LIMIT 1', (sha256,)
+        ).fetchone()
+        if still_used:
+            return
+
+        blob_path = self._blob_path(sha256)
+        try:
+            size = os.path.getsize(blob_path)
+            os.remove(blob_path)
+            self.total_bytes -= size
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        """Закрывает индекс кэша"""
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,237 @@
+import os
+import sys
+import zlib
+import mmap
+import struct
+import hashlib
+import logging
+import threading
+from dataclasses import astuple, dataclass
+from email.message import EmailMessage
+from email.utils import parseaddr, parsedate_to_datetime
+from typing import Dict, Iterator, Optional, Tuple
+
+# Добавляем путь для импорта наших модулей
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from csv_stream import iter_csv_records
+
+logger = logging.getLogger(__name__)
+
+# Запись индекса: UIDVALIDITY, UID, дата (unix time), хэш отправителя, смещение, длина
+INDEX_RECORD = struct.Struct('<IIqQQI')
+
+DEFAULT_STORE_NAME = 'messages'
+
+
+@dataclass(frozen=True)
+class StoreEntry:
+    """Положение письма в файле хранилища"""
+    uidvalidity: int
+    uid: int
+    date: int
+    sender_hash: int
+    offset: int
+    length: int
+
+
+def sender_hash(sender: str) -> int:
+    """64-битный хэш адреса отправителя (без имени, в нижнем регистре)"""
+    address = parseaddr(sender or '')[1].lower()
+    if not address:
+        return 0
+    return int.from_bytes(hashlib.blake2b(address.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def message_timestamp(date_header: str) -> int:
+    """Дата письма из заголовка Date в unix time (0, если не разобрать)"""
+    try:
+        return int(parsedate_to_datetime(date_header).timestamp())
+    except (TypeError, ValueError):
+        return 0
+
+
+def record_to_bytes(record: Dict) -> bytes:
+    """Запись CSV-выгрузки (from, to, subject, date, body) в письмо RFC 822"""
+    msg = EmailMessage()
+    for header, column in (('From', 'from'), ('To', 'to'), ('Subject', 'subject'), ('Date', 'date')):
+        value = (record.get(column) or '').replace('\r', ' ').replace('\n', ' ')
+        if value:
+            msg[header] = value
+    msg.set_content(record.get('body') or '', charset='utf-8', cte='8bit')
+    return msg.as_bytes()
+
+
+class MessageStore:
+    """Хранилище писем только на дозапись: файл с письмами подряд и компактный индекс
+
+    Индекс из записей фиксированной длины (UIDVALIDITY, UID, дата, хэш
+    отправителя → смещение, длина) целиком помещается в память, сам файл
+    писем открывается через mmap. get() возвращает memoryview без копирования,
+    поэтому доступ к любому письму архива не требует его чтения целиком.
+    """
+
+    def __init__(self, store_dir: str, name: str = DEFAULT_STORE_NAME):
+        os.makedirs(store_dir, exist_ok=True)
+
+        self.data_path = os.path.join(store_dir, f"{name}.dat")
+        self.index_path = os.path.join(store_dir, f"{name}.idx")
+
+        self._lock = threading.Lock()
+        self._data_file = open(self.data_path, 'ab')
+        self._index_file = open(self.index_path, 'ab')
+        self._map: Optional[mmap.mmap] = None
+        self._entries: Dict[Tuple[int, int], StoreEntry] = {}
+
+        self._load_index()
+
+    @classmethod
+    def from_env(cls) -> Optional['MessageStore']:
+        """Хранилище по MESSAGE_STORE_DIR; без каталога оно выключено"""
+        store_dir = os.environ.get('MESSAGE_STORE_DIR')
+        if not store_dir:
+            return None
+        return cls(store_dir)
+
+    def _load_index(self):
+        data_size = os.path.getsize(self.data_path)
+
+        with open(self.index_path, 'rb') as f:
+            index = f.read()
+
+        # Недописанный хвост индекса (обрыв при записи) отбрасывается
+        usable = len(index) - len(index) % INDEX_RECORD.size
+        for fields in INDEX_RECORD.iter_unpack(index[:usable]):
+            entry = StoreEntry(*fields)
+            if entry.offset + entry.length <= data_size:
+                self._entries[(entry.uidvalidity, entry.uid)] = entry
+
+        if usable != len(index):
+            logger.warning(f"⚠️ Индекс {self.index_path} обрезан до {usable // INDEX_RECORD.size} записей")
+            self._index_file.truncate(usable)
+
+        logger.info(f"📦 Хранилище писем {self.data_path}: {len(self._entries)} писем, {data_size / 1024 / 1024:.1f} МБ")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Tuple[int, int]) -> bool:
+        return key in self._entries
+
+    def append(self, uid: int, raw_email: bytes, uidvalidity: int = 0,
+               date: str = '', sender: str = '') -> StoreEntry:
+        """Дописывает письмо; повторное добавление того же UID ничего не меняет"""
+
+        key = (int(uidvalidity), int(uid))
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry
+
+            offset = self._data_file.seek(0, os.SEEK_END)
+            self._data_file.write(raw_email)
+            self._data_file.flush()
+
+            entry = StoreEntry(
+                uidvalidity=key[0],
+                uid=key[1],
+                date=message_timestamp(date),
+                sender_hash=sender_hash(sender),
+                offset=offset,
+                length=len(raw_email),
+            )
+            # Индекс пишется после данных: запись индекса всегда указывает на целое письмо
+            self._index_file.write(INDEX_RECORD.pack(*astuple(entry)))
+            self._index_file.flush()
+
+            self._entries[key] = entry
+            return entry
+
+    def _mapped(self, end: int) -> mmap.mmap:
+        """Отображение файла, покрывающее байты до end (переоткрывается после дозаписи)"""
+        if self._map is None or len(self._map) < end:
+            with open(self.data_path, 'rb') as f:
+                # Старое отображение закроется само, когда отпустят выданные из него memoryview
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def get(self, uid: int, uidvalidity: int = 0) -> Optional[memoryview]:
+        """Письмо без копирования (memoryview над mmap) или None"""
+
+        entry = self._entries.get((int(uidvalidity), int(uid)))
+        if entry is None:
+            return None
+        return self.view(entry)
+
+    def view(self, entry: StoreEntry) -> memoryview:
+        with self._lock:
+            mapped = self._mapped(entry.offset + entry.length)
+        return memoryview(mapped)[entry.offset:entry.offset + entry.length]
+
+    def entries(self, date_from: Optional[int] = None, date_to: Optional[int] = None,
+                sender: Optional[str] = None) -> Iterator[StoreEntry]:
+        """Записи индекса в порядке добавления с отбором по дате (unix time) и отправителю"""
+
+        wanted_sender = sender_hash(sender) if sender else None
+
+        for entry in list(self._entries.values()):
+            if date_from is not None and entry.date < date_from:
+                continue
+            if date_to is not None and entry.date > date_to:
+                continue
+            if wanted_sender is not None and entry.sender_hash != wanted_sender:
+                continue
+            yield entry
+
+    def close(self):
+        with self._lock:
+            self._data_file.close()
+            self._index_file.close()
+            if self._map is not None:
+                try:
+                    self._map.close()
+                except BufferError:
+                    # Ещё есть живые memoryview - отображение закроется вместе с ними
+                    pass
+                self._map = None
+
+
+def import_csv(csv_path: str, store: MessageStore) -> int:
+    """Дописывает письма CSV-выгрузки в хранилище; возвращает число новых писем
+
+    UIDVALIDITY - CRC32 имени файла, UID - номер записи: повторный импорт
+    того же файла ничего не дублирует, а разные выгрузки не пересекаются.
+    """
+
+    uidvalidity = zlib.crc32(os.path.basename(csv_path).encode('utf-8'))
+    added = 0
+    for uid, (_, record) in enumerate(iter_csv_records(csv_path), 1):
+        if (uidvalidity, uid) in store:
+            continue
+        store.append(uid, record_to_bytes(record), uidvalidity,
+                     date=record.get('date') or '', sender=record.get('from') or '')
+        added += 1
+
+    logger.info(f"📦 {csv_path}: добавлено {added} писем")
+    return added
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Перекладывает CSV-выгрузки писем в хранилище (.dat + .idx)")
+    parser.add_argument('csv_files', nargs='+', help='Файлы emails_*.csv')
+    parser.add_argument('--store-dir', default=os.environ.get('MESSAGE_STORE_DIR', 'data/message_store'),
+                        help='Каталог хранилища (по умолчанию MESSAGE_STORE_DIR)')
+    parser.add_argument('--name', default=DEFAULT_STORE_NAME, help='Имя файлов хранилища')
+    args = parser.parse_args()
+
+    message_store = MessageStore(args.store_dir, args.name)
+    try:
+        for csv_file in args.csv_files:
+            import_csv(csv_file, message_store)
+    finally:
+        message_store.close()
@@ -0,0 +1,114 @@
+import gc
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from typing import Callable, Dict, Iterable, List, Optional
+
+from natasha import (
+    Segmenter,
+    MorphVocab,
+    NewsEmbedding,
+    NewsMorphTagger,
+    NewsSyntaxParser,
+    NewsNERTagger,
+)
+
+logger = logging.getLogger(__name__)
+
+# Профили анализа текста: какие шаги Natasha выполняет extract_entities
+PROFILE_NER = 'ner'              # сегментация и NER - всё, что реально используется
+PROFILE_NER_MORPH = 'ner_morph'  # + морфология и нормализация спанов (span.normal)
+PROFILE_FULL = 'full'            # + синтаксический разбор
+
+PROFILE_COMPONENTS = {
+    PROFILE_NER: ('segmenter', 'ner_tagger'),
+    PROFILE_NER_MORPH: ('segmenter', 'ner_tagger', 'morph_tagger', 'morph_vocab'),
+    PROFILE_FULL: ('segmenter', 'ner_tagger', 'morph_tagger', 'morph_vocab', 'syntax_parser'),
+}
+
+DEFAULT_PROFILE = PROFILE_NER
+
+
+def profile_from_env() -> str:
+    """Профиль анализа из NER_PROFILE в .env (по умолчанию - только NER)"""
+    profile = os.environ.get('NER_PROFILE', DEFAULT_PROFILE)
+    if profile not in PROFILE_COMPONENTS:
+        raise ValueError(f"Неизвестный профиль анализа: {profile}")
+    return profile
+
+
+class NatashaModels:
+    """Реестр моделей Natasha, общий для всего процесса
+
+    Каждая модель создаётся один раз при первом обращении и дальше
+    разделяется всеми экстракторами. Теггеры строятся поверх одной
+    NewsEmbedding - самой тяжёлой части по памяти и времени загрузки.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._instances: Dict[str, object] = {}
+        self._factories: Dict[str, Callable[[], object]] = {
+            'segmenter': Segmenter,
+            'morph_vocab': MorphVocab,
+            'embedding': NewsEmbedding,
+            'morph_tagger': lambda: NewsMorphTagger(self.get('embedding')),
+            'syntax_parser': lambda: NewsSyntaxParser(self.get('embedding')),
+            'ner_tagger': lambda: NewsNERTagger(self.get('embedding')),
+        }
+
+    @property
+    def components(self) -> List[str]:
+        return list(self._factories)
+
+    def get(self, name: str):
+        """Модель по имени; загружается при первом вызове"""
+
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            instance = self._instances.get(name)
+            if instance is None:
+                started = time.perf_counter()
+                instance = self._factories[name]()
+                self._instances[name] = instance
+                logger.info(f"🧠 Natasha: {name} загружен за {time.perf_counter() - started:.1f} с")
+            return instance
+
+    def loaded(self) -> List[str]:
+        return list(self._instances)
+
+    def preload(self, names: Iterable[str] = None):
+        """Загружает модели заранее (по умолчанию - все)"""
+        for name in names or self.components:
+            self.get(name)
+
+
+MODELS = NatashaModels()
+
+
+def get_model(name: str):
+    """Модель Natasha из общего реестра процесса"""
+    return MODELS.get(name)
+
+
+def preload_for_workers(profile: Optional[str] = None):
+    """Загружает модели профиля анализа до запуска пула процессов
+
+    При старте через fork воркеры получают уже загруженные модели как общие
+    страницы памяти (copy-on-write) и не грузят их заново. gc.freeze()
+    убирает загруженные объекты из обхода сборщиком мусора, чтобы он не
+    трогал их страницы в дочерних процессах. При spawn предзагрузка
+    бесполезна - каждый воркер загрузит модели сам при первом обращении.
+    """
+
+    if multiprocessing.get_start_method(allow_none=False) != 'fork':
+        return False
+
+    MODELS.preload(PROFILE_COMPONENTS[profile or profile_from_env()])
+    gc.freeze()
+    return True
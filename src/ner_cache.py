@@ -0,0 +1,142 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import asdict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 20000
+
+# Пробелы внутри строки (включая табуляцию и неразрывный пробел)
+INLINE_SPACES_RE = re.compile(r'[ \t\xa0]+')
+
+
+def normalize_signature(text: str) -> str:
+    """Текст подписи без различий в пробелах: строки сохраняются, пробелы внутри сжимаются
+
+    Разбиение на строки остаётся прежним - от него зависит постобработка NER
+    (поиск адресов, должностей и соседних строк).
+    """
+    lines = text.replace('\r\n', '\n').replace('\r', '\n').split('\n')
+    return '\n'.join(INLINE_SPACES_RE.sub(' ', line).strip() for line in lines)
+
+
+def signature_key(text: str, profile: str = '') -> str:
+    """Ключ кэша: хэш нормализованной подписи и профиля анализа"""
+    normalized = normalize_signature(text)
+    return hashlib.sha1(f"{profile}\0{normalized}".encode('utf-8')).hexdigest()
+
+
+class NERCache:
+    """Ограниченный LRU-кэш результатов NER по нормализованному тексту подписи
+
+    Одинаковые подписи постоянных корреспондентов повторяются из письма в
+    письмо, поэтому повторный NER для них заменяется поиском в словаре.
+    Если задан filename, кэш загружается из JSON при создании и
+    сохраняется методом save().
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, filename: Optional[str] = None):
+        self.max_entries = max(1, max_entries)
+        self.filename = filename
+        self.stats = {'hits': 0, 'misses': 0}
+
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, Dict]' = OrderedDict()
+        # Ключи, добавленные после последнего drain_new() (воркеры пула отдают их родителю)
+        self._new_keys = set()
+
+        if filename:
+            self._load()
+
+    @classmethod
+    def from_env(cls) -> Optional['NERCache']:
+        """Кэш по NER_CACHE_SIZE (0 - выключен) и NER_CACHE_FILE"""
+        max_entries = int(os.environ.get('NER_CACHE_SIZE', DEFAULT_MAX_ENTRIES))
+        if max_entries <= 0:
+            return None
+        return cls(max_entries, os.environ.get('NER_CACHE_FILE') or None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Поля NERResult (копии списков) или None"""
+
+        with self._lock:
+            fields = self._entries.get(key)
+            if fields is None:
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+
+        return {name: list(values) for name, values in fields.items()}
+
+    def put(self, key: str, result) -> None:
+        fields = {name: list(values) for name, values in asdict(result).items()}
+
+        with self._lock:
+            self._entries[key] = fields
+            self._entries.move_to_end(key)
+            self._new_keys.add(key)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._new_keys.discard(evicted)
+
+    def drain_new(self) -> Dict[str, Dict]:
+        """Записи, добавленные после прошлого вызова (и ещё не вытесненные)"""
+
+        with self._lock:
+            entries = {key: self._entries[key] for key in self._new_keys if key in self._entries}
+            self._new_keys.clear()
+        return entries
+
+    def update(self, entries: Dict[str, Dict]) -> None:
+        """Добавляет готовые записи (из кэша другого процесса) без учёта попаданий"""
+
+        with self._lock:
+            for key, fields in entries.items():
+                self._entries[key] = fields
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _load(self):
+        try:
+            with open(self.filename, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"⚠️ Не удалось прочитать кэш NER {self.filename}: {e}")
+            return
+
+        # Файл хранится от старых записей к новым - порядок LRU восстанавливается
+        for key, fields in list(data.items())[-self.max_entries:]:
+            self._entries[key] = fields
+
+        logger.info(f"✅ Загружен кэш NER {self.filename}: {len(self._entries)} подписей")
+
+    def save(self):
+        """Атомарно сохраняет кэш в файл (если он задан)"""
+
+        if not self.filename:
+            return
+
+        directory = os.path.dirname(self.filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._lock:
+            data = dict(self._entries)
+
+        tmp_filename = f"{self.filename}.tmp"
+        with open(tmp_filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_filename, self.filename)
@@ -1,22 +1,27 @@
 from natasha import (
-    Segmenter,
-    MorphVocab,
-    NewsEmbedding,
-    NewsMorphTagger,
-    NewsSyntaxParser,
-    NewsNERTagger,
     PER,
     ORG,
     LOC,
     Doc
 )
+from natasha.doc import DocSpan
 import re
 from typing import List, Dict, Optional
 from dataclasses import dataclass
 
-@dataclass
+from ner_cache import NERCache, signature_key
+from keyword_matcher import KEYWORDS
+from natasha_models import (
+    PROFILE_COMPONENTS,
+    PROFILE_FULL,
+    PROFILE_NER_MORPH,
+    get_model,
+    profile_from_env,
+)
+
+@dataclass(slots=True)
 class NERResult:
-    """Результат извлечения именованных сущностей"""
+    """Результат извлечения именованных сущностей (без __dict__)"""
     persons: List[str] = None
     organizations: List[str] = None
     locations: List[str] = None
@@ -35,25 +40,32 @@ class NERResult:
 class RussianNERExtractor:
     """Извлечение именованных сущностей для русского языка с Natasha"""
     
-    def __init__(self):
-        # Инициализация компонентов Natasha
-        self.segmenter = Segmenter()
-        self.morph_vocab = MorphVocab()
+    def __init__(self, profile: Optional[str] = None, cache: Optional[NERCache] = None):
+        # Компоненты Natasha берутся из общего реестра процесса (natasha_models)
+        # и загружаются при первом обращении
+        
+        # Кэш результатов по нормализованному тексту подписи (None - без кэша)
+        self.cache = cache
         
-        self.emb = NewsEmbedding()
-        self.morph_tagger = NewsMorphTagger(self.emb)
-        self.syntax_parser = NewsSyntaxParser(self.emb)
-        self.ner_tagger = NewsNERTagger(self.emb)
+        # Профиль анализа: по умолчанию только NER, без морфологии и синтаксиса
+        self.profile = profile or profile_from_env()
+        if self.profile not in PROFILE_COMPONENTS:
+            raise ValueError(f"Неизвестный профиль анализа: {self.profile}")
         
         # Загружаем стоп-слова
         self.stop_words_person = self._load_stop_words('data/stop_words_person.txt')
         self.stop_words_org = self._load_stop_words('data/stop_words_org.txt')
         
+        # Стоп-слова короче 4 символов сравниваются только целиком, остальные ищутся подстрокой
+        self.stop_word_person_matcher = KEYWORDS.get(word for word in self.stop_words_person if len(word) > 3)
+        self.stop_word_org_matcher = KEYWORDS.get(word for word in self.stop_words_org if len(word) > 3)
+        
         # Ключевые слова должностей (для фильтрации из организаций)
         self.position_keywords = [
             'директор', 'директриса', 'менеджер', 'специалист', 'врач', 'инженер',
             'руководитель', 'начальник', 'начальница', 'заместитель', 'заведующий', 'координатор'
         ]
+        self.position_keyword_matcher = KEYWORDS.get(self.position_keywords)
         
         # ИСПРАВЛЕННЫЕ паттерны для должностей
         self.position_patterns = [
@@ -73,6 +85,30 @@ class RussianNERExtractor:
             r'Заместитель(?:\s+[а-яё\s]+)?'
         ]
 
+    @property
+    def segmenter(self):
+        return get_model('segmenter')
+
+    @property
+    def morph_vocab(self):
+        return get_model('morph_vocab')
+
+    @property
+    def emb(self):
+        return get_model('embedding')
+
+    @property
+    def morph_tagger(self):
+        return get_model('morph_tagger')
+
+    @property
+    def syntax_parser(self):
+        return get_model('syntax_parser')
+
+    @property
+    def ner_tagger(self):
+        return get_model('ner_tagger')
+
     def _load_stop_words(self, filename: str) -> set:
         """Загружает стоп-слова из файла"""
         try:
@@ -133,11 +169,7 @@ class RussianNERExtractor:
         if text_lower in self.stop_words_person:
             return True
         
-        for stop_word in self.stop_words_person:
-            if len(stop_word) > 3 and stop_word in text_lower:
-                return True
-        
-        return False
+        return self.stop_word_person_matcher.contains_any(text_lower)
 
     def _is_stop_word_org(self, text: str) -> bool:
         """Проверяет, является ли текст стоп-словом для организаций"""
@@ -146,20 +178,15 @@ class RussianNERExtractor:
         if text_lower in self.stop_words_org:
             return True
         
-        for stop_word in self.stop_words_org:
-            if len(stop_word) > 3 and stop_word in text_lower:
-                return True
-        
-        return False
+        return self.stop_word_org_matcher.contains_any(text_lower)
 
     def _is_position_not_organization(self, text: str) -> bool:
         """Проверяет, является ли текст должностью (НЕ организацией)"""
         text_lower = text.lower().strip()
         
         # Если начинается с ключевого слова должности - это должность
-        for keyword in self.position_keywords:
-            if text_lower.startswith(keyword):
-                return True
+        if self.position_keyword_matcher.find_prefix(text_lower) is not None:
+            return True
         
         # Если содержит паттерны должностей
         for pattern in self.position_patterns:
@@ -368,32 +395,105 @@ class RussianNERExtractor:
         
         return position.strip()
 
-    def extract_entities(self, text: str) -> NERResult:
-        """Основной метод извлечения сущностей с фильтрацией стоп-слов"""
+    def extract_entities(self, text: str, profile: Optional[str] = None) -> NERResult:
+        """Основной метод извлечения сущностей с фильтрацией стоп-слов
         
-        result = NERResult()
+        profile переопределяет профиль экстрактора. Дальше используются только
+        спаны NER и их текст, поэтому морфология (нужна лишь для span.normal)
+        и синтаксис выполняются только в профилях ner_morph и full.
+        """
+        
+        return self.extract_entities_batch([text], profile)[0]
+
+    def extract_entities_batch(self, texts: List[str], profile: Optional[str] = None,
+                               return_exceptions: bool = False) -> List[NERResult]:
+        """Извлечение сущностей для списка текстов за один проход NER-теггера
+        
+        Теггер Natasha обрабатывает тексты пачками, поэтому накладные расходы
+        на вызов модели делятся между всеми подписями. Спаны возвращаются
+        каждому тексту по его индексу; результат совпадает с extract_entities
+        для каждого текста по отдельности.
+        
+        return_exceptions=True: ошибка постобработки одного текста не прерывает
+        пачку - на его месте в результате будет исключение.
+        
+        Если у экстрактора есть кэш, подписи, уже встречавшиеся с точностью
+        до пробелов, берутся из него и в NER не попадают.
+        """
+        
+        profile = profile or self.profile
+        with_morph = profile in (PROFILE_NER_MORPH, PROFILE_FULL)
+        
+        results = [None] * len(texts)
+        keys = [signature_key(text, profile) for text in texts] if self.cache is not None else None
+        
+        pending = []
+        for i in range(len(texts)):
+            fields = self.cache.get(keys[i]) if keys is not None else None
+            if fields is not None:
+                results[i] = NERResult(**fields)
+            else:
+                pending.append(i)
+        
+        # Пустые тексты теггеру не передаём (как tag_ner в Doc). Тексты в пачке
+        # дополняются до самого длинного, поэтому сортировка по длине убирает
+        # лишнюю работу на выравнивание
+        tagged = sorted((i for i in pending if texts[i].strip()), key=lambda i: len(texts[i]))
+        markups = dict(zip(tagged, self.ner_tagger.map([texts[i] for i in tagged]))) if tagged else {}
+        
+        for i in pending:
+            text = texts[i]
+            try:
+                spans = markups[i].spans if i in markups else []
+                if with_morph:
+                    self._analyze_spans(text, spans, profile)
+                
+                raw_spans = [(span.type, text[span.start:span.stop]) for span in spans]
+                results[i] = self._build_result(text, raw_spans)
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results[i] = e
+                continue
+            
+            if keys is not None:
+                self.cache.put(keys[i], results[i])
+        
+        return results
+
+    def _analyze_spans(self, text: str, spans, profile: str):
+        """Морфология (и синтаксис в профиле full) с нормализацией спанов NER"""
         
-        # Создаём документ Natasha
         doc = Doc(text)
         doc.segment(self.segmenter)
         doc.tag_morph(self.morph_tagger)
-        doc.parse_syntax(self.syntax_parser)
-        doc.tag_ner(self.ner_tagger)
+        if profile == PROFILE_FULL:
+            doc.parse_syntax(self.syntax_parser)
+        
+        doc.spans = [DocSpan(span.start, span.stop, span.type, text[span.start:span.stop]) for span in spans]
+        doc.envelop_span_tokens()
+        doc.envelop_sent_spans()
+        
+        for span in doc.spans:
+            span.normalize(self.morph_vocab)
+
+    def _build_result(self, text: str, raw_spans: List[tuple]) -> NERResult:
+        """Постобработка спанов NER (тип, текст) в NERResult"""
+        
+        result = NERResult()
         
         # Собираем сырые данные от Natasha
         raw_persons = []
         raw_orgs = []
         raw_locations = []
         
-        for span in doc.spans:
-            span.normalize(self.morph_vocab)
-            
-            if span.type == PER:
-                raw_persons.append(span.text)  # Используем span.text вместо span.normal
-            elif span.type == ORG:
-                raw_orgs.append(span.text)     # Используем span.text вместо span.normal
-            elif span.type == LOC:
-                raw_locations.append(span.text)
+        for span_type, span_text in raw_spans:
+            if span_type == PER:
+                raw_persons.append(span_text)  # Используем span.text вместо span.normal
+            elif span_type == ORG:
+                raw_orgs.append(span_text)     # Используем span.text вместо span.normal
+            elif span_type == LOC:
+                raw_locations.append(span_text)
         
         # Постобработка с фильтрацией стоп-слов
         result.persons = self.merge_person_fragments(raw_persons, text)
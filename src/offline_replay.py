@@ -0,0 +1,96 @@
+import os
+import sys
+import time
+import logging
+from typing import Iterable, Optional, Sequence, Tuple
+
+# Добавляем путь для импорта наших модулей
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from contact_processor import FullContactInfo
+from extraction_pool import ExtractionPool
+from imap_client import IMAPClient
+from offline_source import iter_offline_messages
+
+logger = logging.getLogger(__name__)
+
+
+class OfflineReplayClient(IMAPClient):
+    """Прогон конвейера контактов по сохранённым письмам без почтового сервера
+
+    Источники: CSV-выгрузки seven_months_extractor.py, архивы Parquet,
+    хранилища message_store.py (.idx), файлы .eml и mbox.
+    Письма проходят ту же проверку внешних участников и
+    ContactProcessor.process_email_signature, что и при работе с IMAP.
+    """
+
+    def __init__(self, debug: bool = False, extraction_workers: Optional[int] = None):
+        super().__init__(debug=debug, extraction_workers=extraction_workers)
+
+        # Кэш сырых писем IMAP здесь не нужен
+        if self.message_cache is not None:
+            self.message_cache.close()
+        self.message_cache = None
+
+        self.elapsed_seconds = 0.0
+        # Ключ первого необработанного письма, если прогон остановлен по limit
+        self.resume_key: Optional[str] = None
+
+    def process_sources(self, paths: Iterable[str], limit: Optional[int] = None, offset: int = 0,
+                        shard: Optional[Tuple[int, int]] = None, date_from: Optional[str] = None,
+                        date_to: Optional[str] = None,
+                        senders: Optional[Iterable[str]] = None) -> Sequence[FullContactInfo]:
+        """Обрабатывает письма из файлов и каталогов
+
+        limit ограничивает число писем, offset - смещение записи CSV в первом
+        источнике, shard = (номер, всего) - обрабатываемая часть источников.
+        date_from и date_to (YYYY-MM-DD, включительно) и senders отбирают
+        письма; архивы Parquet при этом не читают тела неподходящих писем.
+        """
+
+        processed_contacts = []
+        started = time.perf_counter()
+        self.resume_key = None
+
+        messages = self._iter_limited(iter_offline_messages(paths, offset, shard, date_from, date_to, senders), limit)
+
+        # Общее число писем заранее неизвестно - в логе будет только номер
+        if self.extraction_workers > 1:
+            with ExtractionPool(self.extraction_workers, debug=self.debug,
+                                cache=self.contact_processor.ner_extractor.cache) as pool:
+                self._process_messages_pooled(messages, 0, processed_contacts, pool)
+        else:
+            for i, (key, msg, email_body) in enumerate(messages, 1):
+                try:
+                    self._process_message(msg, i, 0, processed_contacts, email_body)
+                except Exception as e:
+                    logger.error(f"❌ Ошибка обработки письма {key}: {e}")
+
+        processed_contacts = self._final_deduplicate(processed_contacts)
+        self.contact_processor.save_caches()
+        self.elapsed_seconds = time.perf_counter() - started
+
+        logger.info(
+            f"⏱️ Обработано {self.stats['total_emails']} писем за {self.elapsed_seconds:.1f} с "
+            f"({self.get_processing_stats().get('emails_per_second', 0)} писем/с)"
+        )
+        if self.resume_key is not None:
+            logger.info(f"↩️ Остановлено по лимиту, следующее письмо: {self.resume_key}")
+
+        return processed_contacts
+
+    def _iter_limited(self, messages, limit: Optional[int]):
+        """Считает письма для статистики и останавливается после limit"""
+        for key, msg, email_body in messages:
+            if limit is not None and self.stats['total_emails'] >= limit:
+                self.resume_key = key
+                break
+            self.stats['total_emails'] += 1
+            yield key, msg, email_body
+
+    def get_processing_stats(self):
+        stats = super().get_processing_stats()
+        if self.elapsed_seconds > 0:
+            stats['elapsed_seconds'] = round(self.elapsed_seconds, 2)
+            stats['emails_per_second'] = round(stats['total_emails'] / self.elapsed_seconds, 1)
+        return stats
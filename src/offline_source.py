@@ -0,0 +1,195 @@
+import os
+import sys
+import csv
+import itertools
+import email
+import glob
+import mailbox
+import logging
+from email.message import Message
+from typing import Iterable, Iterator, Optional, Tuple
+
+# Добавляем путь для импорта наших модулей
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from csv_stream import iter_csv_records, split_byte_ranges
+from email_archive import header_filter, read_archive
+from message_store import MessageStore
+
+logger = logging.getLogger(__name__)
+
+# Заголовки, восстанавливаемые из колонок CSV-выгрузки seven_months_extractor.py
+CSV_HEADER_COLUMNS = {'From': 'from', 'To': 'to', 'Subject': 'subject', 'Date': 'date'}
+
+# Письмо из офлайн-источника: (ключ, письмо, тело или None - извлечь из письма)
+OfflineMessage = Tuple[str, Message, Optional[str]]
+
+
+def _csv_row_message(row: dict) -> Message:
+    """Собирает письмо с заголовками из строки CSV (тело передаётся отдельно)"""
+    msg = Message()
+    for header, column in CSV_HEADER_COLUMNS.items():
+        value = row.get(column) or ''
+        if value:
+            msg[header] = value
+    return msg
+
+
+def iter_csv_messages(path: str, start: int = 0, end: Optional[int] = None) -> Iterator[OfflineMessage]:
+    """Письма из CSV-выгрузки emails_YYYY_MM_month.csv (from, to, subject, date, body)
+
+    Читается по одной записи; ключ письма "файл@смещение" позволяет продолжить
+    с места остановки (start) или обработать только диапазон байт [start, end).
+    """
+
+    name = os.path.basename(path)
+
+    for offset, row in iter_csv_records(path, start, end):
+        yield f"{name}@{offset}", _csv_row_message(row), row.get('body') or ''
+
+
+def iter_parquet_messages(path: str, date_from=None, date_to=None,
+                          senders: Optional[Iterable[str]] = None) -> Iterator[OfflineMessage]:
+    """Письма из архива Parquet (email_archive.py)
+
+    Отбор по дате и отправителям выполняет read_archive: неподходящие группы
+    строк пропускаются по статистикам, тела не читаются. Номер строки в
+    ключе - по порядку среди отобранных писем.
+    """
+    name = os.path.basename(path)
+    for row_no, row in enumerate(read_archive(path, date_from, date_to, senders), 1):
+        yield f"{name}:{row_no}", _csv_row_message(row), row.get('body') or ''
+
+
+def iter_store_messages(path: str) -> Iterator[OfflineMessage]:
+    """Письма из хранилища message_store.py (путь к файлу индекса .idx)
+
+    Хранилище из CSV-выгрузок собирается командой python src/message_store.py emails_*.csv
+    """
+    store_dir, filename = os.path.split(path)
+    store = MessageStore(store_dir or '.', os.path.splitext(filename)[0])
+    try:
+        for entry in store.entries():
+            with store.view(entry) as raw_email:
+                msg = email.message_from_bytes(raw_email.tobytes())
+            yield f"{entry.uidvalidity}/{entry.uid}", msg, None
+    finally:
+        store.close()
+
+
+def iter_eml_messages(path: str) -> Iterator[OfflineMessage]:
+    """Одно письмо из файла .eml"""
+    with open(path, 'rb') as f:
+        yield os.path.basename(path), email.message_from_binary_file(f), None
+
+
+def iter_mbox_messages(path: str) -> Iterator[OfflineMessage]:
+    """Письма из почтового ящика формата mbox"""
+    name = os.path.basename(path)
+    box = mailbox.mbox(path, create=False)
+    try:
+        for key, msg in box.iteritems():
+            yield f"{name}:{key}", msg, None
+    finally:
+        box.close()
+
+
+SOURCE_READERS = {
+    '.csv': iter_csv_messages,
+    '.parquet': iter_parquet_messages,
+    '.eml': iter_eml_messages,
+    '.mbox': iter_mbox_messages,
+    '.idx': iter_store_messages,
+}
+
+
+def expand_sources(paths: Iterable[str]) -> Iterator[str]:
+    """Раскрывает каталоги и маски в список файлов поддерживаемых форматов"""
+
+    for path in paths:
+        if os.path.isdir(path):
+            for extension in SOURCE_READERS:
+                yield from sorted(glob.glob(os.path.join(path, f'*{extension}')))
+        elif any(char in path for char in '*?['):
+            yield from sorted(glob.glob(path))
+        else:
+            yield path
+
+
+def iter_source_messages(path: str, offset: int = 0, shard: Optional[Tuple[int, int]] = None,
+                         date_from=None, date_to=None,
+                         senders: Optional[Iterable[str]] = None) -> Iterator[OfflineMessage]:
+    """Письма одного источника, начиная со смещения offset и только из части shard
+
+    shard = (номер, всего), номер с нуля. CSV делится на диапазоны байт по
+    границам записей (split_byte_ranges) и читается только свой диапазон;
+    остальные форматы делятся по номеру письма. offset - смещение записи
+    CSV из ключа "файл@смещение"; для других форматов не поддерживается.
+    date_from, date_to (включительно) и senders отбирают письма: архив
+    Parquet - средствами read_archive, остальные форматы - по заголовкам.
+    """
+
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension == '.parquet':
+        if offset:
+            raise ValueError(f"Смещение поддерживается только для CSV: {path}")
+        messages = iter_parquet_messages(path, date_from, date_to, senders)
+        if shard is not None:
+            messages = itertools.islice(messages, shard[0], None, shard[1])
+        yield from messages
+        return
+
+    matches = header_filter(date_from, date_to, senders)
+    messages = _iter_unfiltered(path, extension, offset, shard)
+    if matches is None:
+        yield from messages
+        return
+    for key, msg, email_body in messages:
+        if matches(str(msg.get('Date', '')), str(msg.get('From', ''))):
+            yield key, msg, email_body
+
+
+def _iter_unfiltered(path: str, extension: str, offset: int,
+                     shard: Optional[Tuple[int, int]]) -> Iterator[OfflineMessage]:
+    reader = SOURCE_READERS[extension]
+
+    if extension != '.csv':
+        if offset:
+            raise ValueError(f"Смещение поддерживается только для CSV: {path}")
+        messages = reader(path)
+        if shard is not None:
+            messages = itertools.islice(messages, shard[0], None, shard[1])
+        yield from messages
+        return
+
+    start, end = 0, None
+    if shard is not None:
+        ranges = split_byte_ranges(path, shard[1])
+        if shard[0] >= len(ranges):
+            # Файл меньше числа частей - этой части ничего не досталось
+            return
+        start, end = ranges[shard[0]]
+    yield from iter_csv_messages(path, max(start, offset), end)
+
+
+def iter_offline_messages(paths: Iterable[str], offset: int = 0, shard: Optional[Tuple[int, int]] = None,
+                          date_from=None, date_to=None,
+                          senders: Optional[Iterable[str]] = None) -> Iterator[OfflineMessage]:
+    """Письма из всех источников по порядку; формат определяется по расширению
+
+    offset относится к первому источнику (продолжение прерванного прогона),
+    shard и отбор по дате и отправителям - ко всем: см. iter_source_messages.
+    """
+
+    for number, path in enumerate(expand_sources(paths)):
+        if os.path.splitext(path)[1].lower() not in SOURCE_READERS:
+            logger.warning(f"⚠️ Неизвестный формат источника, пропущен: {path}")
+            continue
+
+        logger.info(f"📂 Читаю {path}")
+        try:
+            yield from iter_source_messages(path, offset if number == 0 else 0, shard,
+                                            date_from, date_to, senders)
+        except (OSError, ImportError, csv.Error, mailbox.Error) as e:
+            logger.error(f"❌ Ошибка чтения {path}: {e}")
@@ -0,0 +1,31 @@
+import re
+from typing import Dict, Iterable, List, Pattern, Tuple
+
+
+class PatternRegistry:
+    """Общий реестр скомпилированных регулярных выражений
+
+    Парсеры компилируют свои таблицы паттернов один раз при создании и
+    получают отсюда готовые объекты: одинаковый паттерн с одинаковыми
+    флагами компилируется на весь процесс один раз, сколько бы экземпляров
+    ContactProcessor и SignatureParser ни было создано.
+    """
+
+    def __init__(self):
+        self._patterns: Dict[Tuple[str, int], Pattern] = {}
+
+    def compile(self, pattern: str, flags: int = 0) -> Pattern:
+        key = (pattern, flags)
+        compiled = self._patterns.get(key)
+        if compiled is None:
+            compiled = self._patterns[key] = re.compile(pattern, flags)
+        return compiled
+
+    def compile_all(self, patterns: Iterable[str], flags: int = 0) -> List[Pattern]:
+        return [self.compile(pattern, flags) for pattern in patterns]
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+
+PATTERNS = PatternRegistry()
@@ -3,10 +3,12 @@ import phonenumbers
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 
+from patterns import PATTERNS
 
-@dataclass
+
+@dataclass(slots=True)
 class ContactInfo:
-    """Структура для хранения извлечённых контактных данных"""
+    """Структура для хранения извлечённых контактных данных (без __dict__)"""
     fio: str = ""
     position: str = ""
     company: str = ""
@@ -93,14 +95,25 @@ class SignatureParser:
         
         # Улучшенный паттерн для email
         self.email_pattern = r'[\w\.\-]+@[\w\.\-]+\.[a-zA-Z]{2,}'
+        
+        # Все таблицы компилируются один раз - парсер вызывается для каждого блока подписи
+        self.signature_separator_regexes = PATTERNS.compile_all(self.signature_separators, re.IGNORECASE | re.MULTILINE)
+        self.phone_scan_regex = PATTERNS.compile(self._combined_phone_pattern(), re.IGNORECASE)
+        self.phone_group_names = [
+            re.findall(r'\(\?P<(\w+)>', phone_config['pattern']) for phone_config in self.phone_patterns
+        ]
+        self.inn_regexes = PATTERNS.compile_all(self.inn_patterns, re.IGNORECASE)
+        self.inn_digits_regex = PATTERNS.compile(r'\b(\d{10}|\d{12})\b')
+        self.inn_word_regex = PATTERNS.compile(r'\bИНН\b', re.IGNORECASE)
+        self.email_regex = PATTERNS.compile(self.email_pattern, re.IGNORECASE)
 
 
     def extract_signature_block(self, email_body: str) -> str:
         """Извлекает блок подписи из письма"""
         
         # Ищем разделители подписи
-        for separator in self.signature_separators:
-            match = re.search(separator, email_body, re.IGNORECASE | re.MULTILINE)
+        for separator in self.signature_separator_regexes:
+            match = separator.search(email_body)
             if match:
                 signature_start = match.end()
                 signature_block = email_body[signature_start:].strip()
@@ -127,19 +140,62 @@ class SignatureParser:
         return email_body
 
 
+    def _combined_phone_pattern(self) -> str:
+        """Все паттерны телефонов в одном выражении для прохода по тексту за один раз
+        
+        Каждый паттерн стоит в своей необязательной опережающей проверке с
+        группой p<i>, поэтому в одной позиции находятся совпадения всех
+        паттернов сразу, как при отдельных проходах. Именованные группы
+        паттернов переименованы в p<i>_<имя>. Условие в конце отбрасывает
+        позиции, где не совпал ни один паттерн.
+        """
+        
+        alternatives = []
+        for i, phone_config in enumerate(self.phone_patterns):
+            pattern = re.sub(r'\(\?P<(\w+)>', rf'(?P<p{i}_\1>', phone_config['pattern'])
+            alternatives.append(f'(?:(?=(?P<p{i}>{pattern})))?')
+        
+        any_matched = '(?!)'
+        for i in reversed(range(len(self.phone_patterns))):
+            any_matched = f'(?(p{i})|{any_matched})'
+        
+        # Все паттерны начинаются с "Тел", "8" или "+7"
+        return '(?=[Тт8+])' + ''.join(alternatives) + any_matched
+
+    def _scan_phone_matches(self, text: str) -> List[List[Dict]]:
+        """Группы совпадений каждого паттерна телефона за один проход по тексту
+        
+        Для каждого паттерна совпадения не перекрываются и идут по порядку -
+        так же, как их выдал бы finditer этого паттерна.
+        """
+        
+        found = [[] for _ in self.phone_patterns]
+        last_end = [0] * len(self.phone_patterns)
+        
+        for match in self.phone_scan_regex.finditer(text):
+            position = match.start()
+            for i, names in enumerate(self.phone_group_names):
+                if match.group(f'p{i}') is None or position < last_end[i]:
+                    continue
+                last_end[i] = match.end(f'p{i}')
+                found[i].append({name: match.group(f'p{i}_{name}') for name in names})
+        
+        return found
+
     def extract_phones(self, text: str) -> List[str]:
         """ИСПРАВЛЕННАЯ: Извлекает телефоны с дедупликацией"""
         phones = []
         seen_base_numbers = set()  # Для отслеживания базовых номеров
         
-        for phone_config in self.phone_patterns:
-           pattern = phone_config['pattern']
+        # Один проход по тексту, дальше совпадения разбираются в порядке паттернов
+        scanned = self._scan_phone_matches(text)
+        
+        for phone_config, matches in zip(self.phone_patterns, scanned):
            phone_type = phone_config['type']
         
-           matches = re.finditer(pattern, text, re.IGNORECASE)
-           for match in matches:
+           for groups in matches:
                 try:
-                    formatted_phone = self._format_phone_match(match, phone_type)
+                    formatted_phone = self._format_phone_match(groups, phone_type)
                     if formatted_phone:
                         # НОВОЕ: Извлекаем базовый номер без добавочного для сравнения
                         base_number = self._extract_base_number(formatted_phone)
@@ -167,10 +223,11 @@ class SignatureParser:
         return ''.join(c for c in base_phone if c.isdigit() or c == '+')
 
 
-    def _format_phone_match(self, match, phone_type: str) -> Optional[str]:
-        """ИСПРАВЛЕННАЯ ФУНКЦИЯ: Форматирует извлечённый телефон в красивый вид"""
+    def _format_phone_match(self, groups: Dict[str, Optional[str]], phone_type: str) -> Optional[str]:
+        """ИСПРАВЛЕННАЯ ФУНКЦИЯ: Форматирует извлечённый телефон в красивый вид
         
-        groups = match.groupdict()
+        groups - именованные группы совпадения (как match.groupdict())
+        """
         
         if phone_type == 'city_with_prefix':
             # НОВЫЙ ТИП: Тел. +7 (495) 640-17-71 (доб. 2036)
@@ -234,31 +291,42 @@ class SignatureParser:
     def extract_inn(self, text: str) -> str:
         """Извлекает ИНН из текста с улучшенными паттернами"""
         
-        for pattern in self.inn_patterns:
-            matches = re.findall(pattern, text, re.IGNORECASE)
+        for regex in self.inn_regexes:
+            matches = regex.findall(text)
             if matches:
                 inn = matches[0]
                 if len(inn) in [10, 12] and inn.isdigit():
                     return inn
         
         # Ищем 10 или 12 цифр, НЕ являющиеся телефонами
-        digital_sequences = re.findall(r'\b(\d{10}|\d{12})\b', text)
+        digital_sequences = self.inn_digits_regex.findall(text)
         
         for seq in digital_sequences:
             # Исключаем мобильные номера
             if not (seq.startswith('79') or seq.startswith('89') or seq.startswith('77') or seq.startswith('78')):
-                inn_context = re.search(rf'.{{0,20}}\bИНН\b.{{0,20}}{re.escape(seq)}.{{0,20}}', text, re.IGNORECASE)
-                if inn_context:
+                if self._follows_inn_word(text, seq):
                     return seq
         
         return ""
 
+    def _follows_inn_word(self, text: str, seq: str) -> bool:
+        """Начинается ли seq не дальше 20 символов после слова ИНН в той же строке
+        
+        То же, что поиск по .{0,20}\\bИНН\\b.{0,20}<seq>, но без компиляции
+        нового паттерна для каждой последовательности цифр.
+        """
+        for match in self.inn_word_regex.finditer(text):
+            window = text[match.end():match.end() + 20 + len(seq)].split('\n', 1)[0]
+            if seq in window:
+                return True
+        return False
+
 
     def extract_emails(self, text: str) -> List[str]:
         """Извлекает email адреса с улучшенной валидацией"""
         emails = []
         
-        potential_emails = re.findall(self.email_pattern, text, re.IGNORECASE)
+        potential_emails = self.email_regex.findall(text)
         
         for email in potential_emails:
             email = email.lower().strip()
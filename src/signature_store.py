@@ -0,0 +1,112 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from ner_cache import normalize_signature
+
+logger = logging.getLogger(__name__)
+
+# Меняется вместе с логикой извлечения контактов - старые отпечатки перестают совпадать
+FINGERPRINT_VERSION = 1
+
+
+def signature_fingerprint(sender: str, signature_blocks: Sequence[str], profile: str = '') -> str:
+    """Отпечаток подписей письма: отправитель и нормализованный текст всех блоков"""
+
+    digest = hashlib.sha1(f"{FINGERPRINT_VERSION}\0{profile}\0{sender.lower()}".encode('utf-8'))
+    for block in signature_blocks:
+        digest.update(b'\0\0')
+        digest.update(normalize_signature(block).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class SignatureStore:
+    """Сохраняемая таблица отпечатков подписей постоянных отправителей
+
+    Для каждого отправителя хранит контакты, уже извлечённые из писем с
+    такими же подписями. Повторное письмо с тем же отпечатком получает
+    готовые контакты без телефонов, ИНН, NER и оценки качества - меняются
+    только дата и тема письма.
+    """
+
+    def __init__(self, filename: str):
+        self.filename = filename
+
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        # Пишут и родительский процесс, и воркеры пула извлечения - ждём блокировку, а не падаем
+        self._db = sqlite3.connect(filename, timeout=30, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''
+            CREATE TABLE IF NOT EXISTS signatures (
+                sender TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                contacts TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (sender, fingerprint)
+            )
+        ''')
+        self._db.commit()
+
+        self.stats = {'hits': 0, 'misses': 0, 'stored': 0}
+
+    @classmethod
+    def from_env(cls) -> Optional['SignatureStore']:
+        """Таблица по SIGNATURE_STORE_FILE; без файла отпечатки не используются"""
+        filename = os.environ.get('SIGNATURE_STORE_FILE')
+        if not filename:
+            return None
+        return cls(filename)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM signatures').fetchone()[0]
+
+    def get(self, sender: str, fingerprint: str) -> Optional[List[Dict]]:
+        """Поля сохранённых контактов или None, если отпечаток не встречался"""
+
+        sender = sender.lower()
+        with self._lock:
+            row = self._db.execute(
+                'SELECT contacts FROM signatures WHERE sender = ? AND fingerprint = ?',
+                (sender, fingerprint)
+            ).fetchone()
+            if row is None:
+                self.stats['misses'] += 1
+                return None
+
+            self._db.execute(
+                'UPDATE signatures SET last_seen = ?, hits = hits + 1 WHERE sender = ? AND fingerprint = ?',
+                (time.time(), sender, fingerprint)
+            )
+            self._db.commit()
+            self.stats['hits'] += 1
+
+        return json.loads(row[0])
+
+    def put(self, sender: str, fingerprint: str, contacts: List[Dict]):
+        """Запоминает контакты, извлечённые из письма с этим отпечатком"""
+
+        now = time.time()
+        with self._lock:
+            self._db.execute('''
+                INSERT INTO signatures (sender, fingerprint, contacts, first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (sender, fingerprint) DO UPDATE SET contacts = excluded.contacts, last_seen = excluded.last_seen
+            ''', (sender.lower(), fingerprint, json.dumps(contacts, ensure_ascii=False), now, now))
+            self._db.commit()
+            self.stats['stored'] += 1
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,70 @@
+import os
+import json
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYNC_STATE_FILE = 'data/sync_state.json'
+
+
+class SyncState:
+    """Сохраняемая точка синхронизации: последний обработанный UID по папкам
+
+    UID сравнимы только внутри одного UIDVALIDITY, поэтому при его смене
+    точка считается недействительной и синхронизация начинается заново.
+    """
+
+    def __init__(self, filename: str = DEFAULT_SYNC_STATE_FILE):
+        self.filename = filename
+        self.folders: Dict[str, Dict] = self._load()
+
+    def _load(self) -> Dict[str, Dict]:
+        """Загружает состояние из файла"""
+        try:
+            with open(self.filename, encoding='utf-8') as f:
+                data = json.load(f)
+            logger.info(f"✅ Загружена точка синхронизации {self.filename}: {len(data)} папок")
+            return data
+        except FileNotFoundError:
+            logger.info(f"📁 Точка синхронизации {self.filename} не найдена, начинаем с нуля")
+            return {}
+        except (json.JSONDecodeError, OSError) as e:
+            logger.warning(f"⚠️ Не удалось прочитать {self.filename}: {e}")
+            return {}
+
+    def last_uid(self, folder: str, uidvalidity: Optional[int]) -> Optional[int]:
+        """Последний обработанный UID папки или None, если точки нет или UIDVALIDITY сменился"""
+
+        state = self.folders.get(folder)
+        if not state or uidvalidity is None:
+            return None
+
+        if state.get('uidvalidity') != uidvalidity:
+            logger.warning(
+                f"⚠️ UIDVALIDITY папки {folder} изменился "
+                f"({state.get('uidvalidity')} → {uidvalidity}), точка синхронизации сброшена"
+            )
+            return None
+
+        return state.get('last_uid')
+
+    def update(self, folder: str, uidvalidity: int, last_uid: int):
+        """Запоминает последний обработанный UID папки"""
+        self.folders[folder] = {
+            'uidvalidity': uidvalidity,
+            'last_uid': last_uid,
+            'updated_at': datetime.now().isoformat(timespec='seconds'),
+        }
+
+    def save(self):
+        """Атомарно сохраняет состояние в файл"""
+        directory = os.path.dirname(self.filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        tmp_filename = f"{self.filename}.tmp"
+        with open(tmp_filename, 'w', encoding='utf-8') as f:
+            json.dump(self.folders, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_filename, self.filename)